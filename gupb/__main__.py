@@ -9,13 +9,20 @@ import os
 import pathlib
 import pkgutil
 import sys
-from typing import Any, Union
+from typing import Any, Optional, Union
 
 import click
 import questionary
 
 from gupb import controller
+from gupb import profiler
 from gupb import runner
+from gupb.logger import binary
+from gupb.logger import core as logger_core
+from gupb.logger import index
+from gupb.logger import sinks
+
+LOG_FORMATS: tuple[str, ...] = ('json', 'binary')
 
 # noinspection PyUnresolvedReferences
 @lru_cache()
@@ -133,7 +140,7 @@ def configuration_inquiry(initial_config: dict[str, Any]) -> dict[str, Any]:
     return answers
 
 
-def configure_logging(log_directory: str) -> None:
+def configure_logging(log_directory: str, log_format: str = 'json') -> None:
     logging_dir_path = pathlib.Path(log_directory)
     logging_dir_path.mkdir(parents=True, exist_ok=True)
     logging_dir_path.chmod(0o777)
@@ -142,7 +149,7 @@ def configure_logging(log_directory: str) -> None:
     verbose_logger = logging.getLogger('verbose')
     verbose_logger.propagate = False
     verbose_file_path = logging_dir_path / f'gupb__{time}.log'
-    verbose_file_handler = logging.FileHandler(verbose_file_path.as_posix())
+    verbose_file_handler = sinks.BatchedFileHandler(verbose_file_path.as_posix())
     verbose_formatter = logging.Formatter(
         '%(asctime)s | %(levelname)s | %(module)s.%(funcName)s:%(lineno)d | %(message)s'
     )
@@ -150,10 +157,18 @@ def configure_logging(log_directory: str) -> None:
     verbose_logger.addHandler(verbose_file_handler)
     verbose_logger.setLevel(logging.DEBUG)
 
+    if log_format == 'binary':
+        binary_file_path = logging_dir_path / f'gupb__{time}.bin'
+        logger_core.EVENT_BUS.subscribe(binary.BinaryLogWriter(binary_file_path.as_posix()))
+        return
+
     json_logger = logging.getLogger('json')
     json_logger.propagate = False
     json_file_path = logging_dir_path / f'gupb__{time}.json'
-    json_file_handler = logging.FileHandler(json_file_path.as_posix())
+    json_file_handler = sinks.BatchedFileHandler(
+        json_file_path.as_posix(),
+        indexer=index.LogIndexer(index.index_path(json_file_path.as_posix())),
+    )
     json_formatter = logging.Formatter(
         '{"time_stamp": "%(asctime)s",'
         ' "severity": "%(levelname)s",'
@@ -164,6 +179,7 @@ def configure_logging(log_directory: str) -> None:
     json_file_handler.setFormatter(json_formatter)
     json_logger.addHandler(json_file_handler)
     json_logger.setLevel(logging.DEBUG)
+    logger_core.EVENT_BUS.subscribe(logger_core.log_json)
 
 
 @click.command()
@@ -173,13 +189,46 @@ def configure_logging(log_directory: str) -> None:
               is_flag=True, help="Whether to configure the runner interactively on start.")
 @click.option('-l', '--log_directory', default='results',
               type=click.Path(exists=False), help="The path to log storage directory.")
-def main(config_path: str, inquiry: bool, log_directory: str) -> None:
-    configure_logging(log_directory)
+@click.option('-f', '--log_format', default='json',
+              type=click.Choice(LOG_FORMATS), help="The format of the event log.")
+@click.option('--profile', 'profiler_name', default=None,
+              type=click.Choice(profiler.PROFILERS), help="Profile the games with cProfile or a sampling profiler.")
+@click.option('--profile-out', default=None,
+              type=click.Path(), help="The path prefix of profile files, by default in the log storage directory.")
+@click.option('--profile-split', default=None,
+              type=click.Choice(profiler.SPLITS), help="Write a separate profile for each game or controller.")
+@click.option('--profile-interval', default=profiler.DEFAULT_SAMPLING_INTERVAL * 1000,
+              type=click.FloatRange(min=0.1), help="The sampling interval in milliseconds.")
+def main(
+        config_path: str,
+        inquiry: bool,
+        log_directory: str,
+        log_format: str,
+        profiler_name: Optional[str],
+        profile_out: Optional[str],
+        profile_split: Optional[str],
+        profile_interval: float,
+) -> None:
+    configure_logging(log_directory, log_format)
     current_config = load_initial_config(config_path)
     current_config = configuration_inquiry(current_config) if inquiry else current_config
-    game_runner = runner.Runner(current_config)
-    game_runner.run()
+    if profiler_name is None:
+        game_runner = runner.Runner(current_config)
+        game_runner.run()
+        game_runner.print_scores()
+        return
+    if 'workers' in current_config and current_config['workers'] > 1:
+        click.echo("Profiled games are played in a single process.")
+        current_config['workers'] = 1
+    profile_out = profile_out if profile_out else os.path.join(
+        log_directory, f"gupb__{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}"
+    )
+    with profiler.profiled(profiler_name, profile_out, profile_split, profile_interval / 1000) as written:
+        game_runner = runner.Runner(current_config)
+        game_runner.run()
     game_runner.print_scores()
+    for path in written:
+        click.echo(f"Profile written to {path}.")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import sys
+from typing import Optional
+
+import click
+
+from gupb.benchmarks import macro
+from gupb.benchmarks import micro
+
+
+@click.group()
+def main() -> None:
+    pass
+
+
+@main.command(name='macro')
+@click.option('-a', '--arena', 'arena_names', multiple=True,
+              help="Arenas to play on, all arenas in resources/arenas by default.")
+@click.option('-c', '--champions', 'champion_counts', multiple=True, type=click.IntRange(min=1),
+              default=macro.DEFAULT_CHAMPION_COUNTS, show_default=True, help="Numbers of champions to play with.")
+@click.option('-g', '--games', 'games_no', default=macro.DEFAULT_GAMES, show_default=True,
+              type=click.IntRange(min=1), help="Games played in each case.")
+@click.option('-s', '--seed', default=macro.DEFAULT_SEED, show_default=True, help="Seed of the games.")
+@click.option('-o', '--output', default=None, type=click.Path(), help="Save the results as a JSON baseline.")
+@click.option('-b', '--baseline', 'baseline_path', default=None, type=click.Path(exists=True),
+              help="Compare the results with a JSON baseline.")
+@click.option('-t', '--threshold', default=macro.DEFAULT_THRESHOLD, show_default=True,
+              type=click.FloatRange(min=0.0), help="Relative change reported as a regression.")
+@click.option('--in-process', is_flag=True, help="Play all cases in this process, sharing the peak memory.")
+def run_macro(
+        arena_names: tuple[str, ...],
+        champion_counts: tuple[int, ...],
+        games_no: int,
+        seed: int,
+        output: Optional[str],
+        baseline_path: Optional[str],
+        threshold: float,
+        in_process: bool,
+) -> None:
+    """ Plays seeded headless games of random controllers and reports their throughput. """
+    current = macro.Baseline(seed)
+    for result in macro.run_cases(macro.plan_cases(arena_names, champion_counts, games_no), seed, not in_process):
+        click.echo(macro.describe(result))
+        current.results.append(result)
+    if output:
+        macro.save_baseline(current, output)
+    if baseline_path:
+        report_regressions(macro.load_baseline(baseline_path), current, threshold)
+
+
+@main.command(name='compare')
+@click.argument('baseline_path', type=click.Path(exists=True))
+@click.argument('current_path', type=click.Path(exists=True))
+@click.option('-t', '--threshold', default=macro.DEFAULT_THRESHOLD, show_default=True,
+              type=click.FloatRange(min=0.0), help="Relative change reported as a regression.")
+def run_compare(baseline_path: str, current_path: str, threshold: float) -> None:
+    """ Compares two JSON baselines saved by the macro benchmark. """
+    report_regressions(macro.load_baseline(baseline_path), macro.load_baseline(current_path), threshold)
+
+
+@main.command(name='micro')
+@click.option('-k', '--select', 'patterns', multiple=True,
+              help="Run only benchmarks with names matching these shell patterns, like 'visible_coords/*'.")
+@click.option('-r', '--repeats', default=micro.DEFAULT_REPEATS, show_default=True,
+              type=click.IntRange(min=1), help="Timed rounds of each benchmark.")
+@click.option('-s', '--seed', default=micro.DEFAULT_SEED, show_default=True, help="Seed of the fixtures.")
+@click.option('-o', '--output', default=None, type=click.Path(), help="Save the results as a JSON baseline.")
+@click.option('-b', '--baseline', 'baseline_path', default=None, type=click.Path(exists=True),
+              help="Compare the results with a JSON baseline.")
+@click.option('-t', '--threshold', default=micro.DEFAULT_THRESHOLD, show_default=True,
+              type=click.FloatRange(min=0.0), help="Relative slowdown reported as a regression.")
+@click.option('-l', '--list', 'list_only', is_flag=True, help="List the benchmarks without running them.")
+def run_micro(
+        patterns: tuple[str, ...],
+        repeats: int,
+        seed: int,
+        output: Optional[str],
+        baseline_path: Optional[str],
+        threshold: float,
+        list_only: bool,
+) -> None:
+    """ Times single engine operations on fixed fixtures, reporting time and allocations per operation. """
+    benchmarks = micro.select(micro.default_benchmarks(), patterns)
+    if list_only:
+        for benchmark in benchmarks:
+            click.echo(benchmark.name)
+        return
+    current = micro.MicroBaseline(seed)
+    for benchmark in benchmarks:
+        result = micro.measure(benchmark, seed, repeats)
+        click.echo(micro.describe(result))
+        current.results.append(result)
+    if output:
+        micro.save_baseline(current, output)
+    if baseline_path:
+        regressions = micro.compare(micro.load_baseline(baseline_path), current, threshold)
+        for name, before, after in regressions:
+            click.echo(f"Regression: {name}: {before:,.0f} -> {after:,.0f} ns/op ({after / before - 1.0:+.1%}).")
+        if regressions:
+            sys.exit(1)
+        click.echo(f"No regressions beyond {threshold:.0%}.")
+
+
+def report_regressions(baseline: macro.Baseline, current: macro.Baseline, threshold: float) -> None:
+    regressions = macro.compare(baseline, current, threshold)
+    for regression in regressions:
+        click.echo(f"Regression: {regression}.")
+    if regressions:
+        sys.exit(1)
+    click.echo(f"No regressions beyond {threshold:.0%}.")
+
+
+if __name__ == '__main__':
+    main(prog_name='python -m gupb.benchmarks')
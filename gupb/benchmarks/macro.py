@@ -0,0 +1,179 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+import glob
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from typing import Iterable, Optional
+
+from dataclasses_json import DataClassJsonMixin
+import numpy as np
+
+from gupb.controller import random as random_controller
+from gupb.model import arenas
+from gupb.model import games
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_CHAMPION_COUNTS: tuple[int, ...] = (2, 4, 8)
+DEFAULT_GAMES: int = 1
+DEFAULT_SEED: int = 0
+DEFAULT_THRESHOLD: float = 0.1
+
+RATES: tuple[str, ...] = ('games_per_second', 'episodes_per_second', 'actions_per_second')
+
+
+@dataclass(frozen=True)
+class MacroCase(DataClassJsonMixin):
+    arena: str
+    champions: int
+    games: int = DEFAULT_GAMES
+
+    @property
+    def name(self) -> str:
+        return f'{self.arena}/{self.champions}'
+
+
+@dataclass
+class MacroResult(DataClassJsonMixin):
+    arena: str
+    champions: int
+    games: int
+    episodes: int
+    actions: int
+    seconds: float
+    peak_rss: Optional[int]
+
+    @property
+    def name(self) -> str:
+        return f'{self.arena}/{self.champions}'
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds
+
+    @property
+    def episodes_per_second(self) -> float:
+        return self.episodes / self.seconds
+
+    @property
+    def actions_per_second(self) -> float:
+        return self.actions / self.seconds
+
+
+@dataclass
+class Baseline(DataClassJsonMixin):
+    seed: int
+    python: str = field(default_factory=platform.python_version)
+    machine: str = field(default_factory=platform.platform)
+    results: list[MacroResult] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        return self.current / self.baseline - 1.0
+
+    def __str__(self) -> str:
+        return f"{self.name} {self.metric}: {self.baseline:.6g} -> {self.current:.6g} ({self.change:+.1%})"
+
+
+def arena_names() -> list[str]:
+    """ Names of all arenas in `resources/arenas`, from the smallest to the largest one. """
+    paths = glob.glob(os.path.join('resources', 'arenas', '*.gupb'))
+    names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    return sorted(names, key=lambda name: (len(arenas.read_arena_source(name)), name))
+
+
+def plan_cases(
+        names: Optional[Iterable[str]] = None,
+        champion_counts: Iterable[int] = DEFAULT_CHAMPION_COUNTS,
+        games_no: int = DEFAULT_GAMES,
+) -> list[MacroCase]:
+    names = list(names) if names else arena_names()
+    return [MacroCase(name, champions, games_no) for name in names for champions in champion_counts]
+
+
+def peak_rss() -> Optional[int]:
+    """ Peak resident set size of the current process in bytes, if the platform reports it. """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def play_case(case: MacroCase, seed: int = DEFAULT_SEED) -> MacroResult:
+    """ Plays seeded headless games of `RandomController`s and measures their throughput. """
+    arenas.preload([case.arena])
+    controllers = [random_controller.RandomController(f'{i}') for i in range(case.champions)]
+    episodes, actions, seconds = 0, 0, 0.0
+    for game_no, game_seed in enumerate(np.random.SeedSequence([seed, case.champions]).generate_state(case.games)):
+        random.seed(int(game_seed))
+        np.random.seed(int(game_seed))
+        start = time.perf_counter()
+        game = games.Game(game_no, case.arena, controllers)
+        game.run_to_completion()
+        seconds += time.perf_counter() - start
+        episodes += game.episode
+        actions += game.actions_no
+    return MacroResult(case.arena, case.champions, case.games, episodes, actions, seconds, peak_rss())
+
+
+def run_cases(cases: Iterable[MacroCase], seed: int = DEFAULT_SEED, isolated: bool = True) -> Iterable[MacroResult]:
+    """ Plays the cases one by one, each in a fresh process when isolated, so peak memory is measured per case. """
+    for case in cases:
+        if not isolated:
+            yield play_case(case, seed)
+            continue
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            result = pool.apply(play_case, (case, seed))
+            pool.close()
+            pool.join()
+        yield result
+
+
+def compare(baseline: Baseline, current: Baseline, threshold: float = DEFAULT_THRESHOLD) -> list[Regression]:
+    """ Lists rates that dropped and peak memory that grew by more than `threshold` against the baseline. """
+    baseline_results = {result.name: result for result in baseline.results}
+    regressions = []
+    for result in current.results:
+        previous = baseline_results.get(result.name)
+        if previous is None:
+            continue
+        for metric in RATES:
+            before, after = getattr(previous, metric), getattr(result, metric)
+            if after < before * (1.0 - threshold):
+                regressions.append(Regression(result.name, metric, before, after))
+        if previous.peak_rss and result.peak_rss and result.peak_rss > previous.peak_rss * (1.0 + threshold):
+            regressions.append(Regression(result.name, 'peak_rss', previous.peak_rss, result.peak_rss))
+    return regressions
+
+
+def load_baseline(path: str) -> Baseline:
+    with open(path) as file:
+        return Baseline.from_json(file.read())
+
+
+def save_baseline(baseline: Baseline, path: str) -> None:
+    with open(path, 'w') as file:
+        file.write(baseline.to_json(indent=2))
+
+
+def describe(result: MacroResult) -> str:
+    memory = f'{result.peak_rss / 2 ** 20:.1f} MiB' if result.peak_rss else 'unknown'
+    return (
+        f"{result.name:<20} {result.games_per_second:>10.2f} games/s {result.episodes_per_second:>10.1f} episodes/s "
+        f"{result.actions_per_second:>10.1f} actions/s   peak RSS {memory}"
+    )
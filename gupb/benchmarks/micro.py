@@ -0,0 +1,309 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+import fnmatch
+import gc
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Iterable, Optional
+
+from dataclasses_json import DataClassJsonMixin
+import numpy as np
+
+from gupb.controller import random as random_controller
+from gupb.logger import core as logger_core
+from gupb.model import arenas
+from gupb.model import characters
+from gupb.model import coordinates
+from gupb.model import effects
+from gupb.model import weapons
+
+DEFAULT_SEED: int = 0
+DEFAULT_REPEATS: int = 7
+DEFAULT_THRESHOLD: float = 0.1
+ROUND_TARGET_NS: int = 10_000_000
+MAX_CALIBRATED_NUMBER: int = 1_000_000
+MAX_TRACED_OPS: int = 100
+
+FIXTURE_ARENA: str = 'ordinary_chaos'
+LARGE_ARENA: str = 'island'
+WEAPONS: tuple[type[weapons.Weapon], ...] = (
+    weapons.Knife, weapons.Sword, weapons.Bow, weapons.Axe, weapons.Amulet, weapons.Scroll,
+)
+INSTANT_EFFECT_COUNTS: tuple[int, ...] = (1, 16, 64)
+
+Operation = Callable[[], Any]
+
+
+@dataclass(frozen=True)
+class MicroBenchmark:
+    """ An operation prepared by `setup` on fixed fixtures.
+
+    Operations changing their fixture get a fresh one from `setup` before every call and are timed one call at a time,
+    others are called in calibrated loops. `teardown` restores global state changed by `setup`.
+    """
+    name: str
+    setup: Callable[[], Operation]
+    mutating: bool = False
+    teardown: Optional[Callable[[], None]] = None
+
+
+@dataclass
+class MicroResult(DataClassJsonMixin):
+    name: str
+    ns_per_op: float
+    best_ns_per_op: float
+    peak_bytes_per_op: float
+    retained_blocks_per_op: float
+    ops: int
+
+
+@dataclass
+class MicroBaseline(DataClassJsonMixin):
+    seed: int
+    python: str = field(default_factory=platform.python_version)
+    machine: str = field(default_factory=platform.platform)
+    results: list[MicroResult] = field(default_factory=list)
+
+
+def seeded(seed: int = DEFAULT_SEED) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def arena_with_champion(
+        arena_name: str = FIXTURE_ARENA,
+        weapon: Optional[weapons.Weapon] = None,
+        facing: Optional[characters.Facing] = None,
+) -> tuple[arenas.Arena, characters.Champion]:
+    """ A seeded arena with a menhir and a single champion standing in the middle of its empty cells. """
+    arenas.preload([arena_name])
+    arena = arenas.Arena.load(arena_name)
+    arena.spawn_menhir()
+    empty_cells = arena.terrain.empty_cells
+    champion = arena.spawn_champion_at(empty_cells[len(empty_cells) // 2])
+    champion.assign_controller(random_controller.RandomController('Benchmark'))
+    champion.health = sys.maxsize
+    if weapon is not None:
+        champion.weapon = weapon
+    if facing is not None:
+        champion.facing = facing
+    return arena, champion
+
+
+def visible_coords(weapon_type: type[weapons.Weapon], facing: characters.Facing) -> MicroBenchmark:
+    def setup() -> Operation:
+        arena, champion = arena_with_champion(weapon=weapon_type(), facing=facing)
+        return lambda: arena.visible_coords(champion)
+
+    return MicroBenchmark(f'visible_coords/{weapon_type.__name__.lower()}/{facing.name.lower()}', setup)
+
+
+def increase_mist(arena_name: str) -> MicroBenchmark:
+    def setup() -> Operation:
+        arena, _ = arena_with_champion(arena_name)
+        arena.mist_radius = len(arena.mist_rings) // 2 + 1
+        return arena.increase_mist
+
+    return MicroBenchmark(f'increase_mist/{arena_name}', setup, mutating=True)
+
+
+def tile_instant(effects_no: int) -> MicroBenchmark:
+    def setup() -> Operation:
+        arena, champion = arena_with_champion()
+        for _ in range(effects_no):
+            arena.register_effect(effects.WeaponCut(), champion.position)
+        return arena.terrain[champion.position].instant
+
+    return MicroBenchmark(f'tile_instant/{effects_no}_effects', setup, mutating=True)
+
+
+def bow_cut_positions(facing: characters.Facing) -> MicroBenchmark:
+    def setup() -> Operation:
+        arena, champion = arena_with_champion(LARGE_ARENA, weapons.Bow(), facing)
+        return lambda: weapons.Bow.cut_positions(arena.terrain, champion.position, champion.facing)
+
+    return MicroBenchmark(f'bow_cut_positions/{facing.name.lower()}', setup)
+
+
+def tile_description(cached: bool) -> MicroBenchmark:
+    def setup() -> Operation:
+        arena, champion = arena_with_champion(weapon=weapons.Sword())
+        arena.register_effect(effects.Mist(), champion.position)
+        tile = arena.terrain[champion.position]
+        tile.loot = weapons.Axe()
+        if cached:
+            return tile.description
+
+        def described() -> Any:
+            arena.terrain.invalidate_description(*champion.position)
+            return tile.description()
+
+        return described
+
+    return MicroBenchmark(f"tile_description/{'cached' if cached else 'invalidated'}", setup)
+
+
+def arena_load(arena_name: str) -> MicroBenchmark:
+    def setup() -> Operation:
+        arenas.preload([arena_name])
+        return lambda: arenas.Arena.load(arena_name)
+
+    return MicroBenchmark(f'arena_load/{arena_name}', setup)
+
+
+def report_log(json_subscribed: bool) -> MicroBenchmark:
+    json_logger = logging.getLogger('json')
+    saved = {}
+
+    def setup() -> Operation:
+        if not saved:
+            saved.update(
+                handlers=json_logger.handlers, level=json_logger.level, propagate=json_logger.propagate,
+                subscribers=logger_core.EVENT_BUS.subscribers(),
+            )
+        logger_core.EVENT_BUS.clear()
+        if json_subscribed:
+            json_logger.handlers, json_logger.propagate = [logging.NullHandler()], False
+            json_logger.setLevel(logging.DEBUG)
+            logger_core.EVENT_BUS.subscribe(logger_core.log_json)
+        report = arenas.ChampionEnteredTileReport('Benchmark', coordinates.Coords(3, 4))
+        return lambda: report.log(logging.DEBUG)
+
+    def teardown() -> None:
+        json_logger.handlers, json_logger.propagate = saved['handlers'], saved['propagate']
+        json_logger.setLevel(saved['level'])
+        logger_core.EVENT_BUS.clear()
+        for subscriber in saved['subscribers']:
+            logger_core.EVENT_BUS.subscribe(subscriber)
+        saved.clear()
+
+    return MicroBenchmark(f"log/{'json' if json_subscribed else 'unsubscribed'}", setup, teardown=teardown)
+
+
+def default_benchmarks() -> list[MicroBenchmark]:
+    return [
+        *(visible_coords(weapon_type, facing) for weapon_type in WEAPONS for facing in characters.Facing),
+        increase_mist(FIXTURE_ARENA),
+        increase_mist(LARGE_ARENA),
+        *(tile_instant(effects_no) for effects_no in INSTANT_EFFECT_COUNTS),
+        *(bow_cut_positions(facing) for facing in characters.Facing),
+        tile_description(cached=True),
+        tile_description(cached=False),
+        arena_load('mini'),
+        arena_load(FIXTURE_ARENA),
+        arena_load(LARGE_ARENA),
+        report_log(json_subscribed=False),
+        report_log(json_subscribed=True),
+    ]
+
+
+def select(benchmarks: Iterable[MicroBenchmark], patterns: Iterable[str]) -> list[MicroBenchmark]:
+    patterns = list(patterns)
+    if not patterns:
+        return list(benchmarks)
+    return [benchmark for benchmark in benchmarks if any(fnmatch.fnmatch(benchmark.name, p) for p in patterns)]
+
+
+def _time_loop(operation: Operation, number: int) -> int:
+    start = time.perf_counter_ns()
+    for _ in range(number):
+        operation()
+    return time.perf_counter_ns() - start
+
+
+def _calibrate(operation: Operation) -> int:
+    number = 1
+    while number < MAX_CALIBRATED_NUMBER and _time_loop(operation, number) < ROUND_TARGET_NS:
+        number *= 2
+    return number
+
+
+def _round(benchmark: MicroBenchmark, number: int) -> int:
+    """ Nanoseconds taken by `number` calls of the operation, not counting fixture setups of mutating operations. """
+    if not benchmark.mutating:
+        return _time_loop(benchmark.setup(), number)
+    elapsed = 0
+    for _ in range(number):
+        operation = benchmark.setup()
+        start = time.perf_counter_ns()
+        operation()
+        elapsed += time.perf_counter_ns() - start
+    return elapsed
+
+
+def _allocations(benchmark: MicroBenchmark, number: int) -> tuple[float, float]:
+    """ Peak traced bytes of a single call and memory blocks still allocated after `number` calls, per call. """
+    operations = [benchmark.setup() for _ in range(number)] if benchmark.mutating else [benchmark.setup()] * number
+    peaks = []
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        for operation in operations:
+            tracemalloc.reset_peak()
+            traced, _ = tracemalloc.get_traced_memory()
+            operation()
+            peaks.append(tracemalloc.get_traced_memory()[1] - traced)
+    finally:
+        tracemalloc.stop()
+    gc.collect()
+    return statistics.median(peaks), (sys.getallocatedblocks() - blocks_before) / number
+
+
+def measure(benchmark: MicroBenchmark, seed: int = DEFAULT_SEED, repeats: int = DEFAULT_REPEATS) -> MicroResult:
+    """ Times the operation in `repeats` rounds of calibrated length, then measures its allocations separately. """
+    seeded(seed)
+    try:
+        if benchmark.mutating:
+            number = max(1, min(MAX_CALIBRATED_NUMBER, ROUND_TARGET_NS // max(1, _round(benchmark, 1))))
+        else:
+            number = _calibrate(benchmark.setup())
+        rounds = []
+        for _ in range(repeats):
+            seeded(seed)
+            rounds.append(_round(benchmark, number) / number)
+        seeded(seed)
+        peak_bytes, retained_blocks = _allocations(benchmark, min(number, MAX_TRACED_OPS))
+    finally:
+        if benchmark.teardown is not None:
+            benchmark.teardown()
+    return MicroResult(
+        benchmark.name, statistics.median(rounds), min(rounds), peak_bytes, retained_blocks, number * repeats,
+    )
+
+
+def compare(
+        baseline: MicroBaseline,
+        current: MicroBaseline,
+        threshold: float = DEFAULT_THRESHOLD,
+) -> list[tuple[str, float, float]]:
+    """ Lists benchmarks whose median time per operation grew by more than `threshold` against the baseline. """
+    baseline_results = {result.name: result for result in baseline.results}
+    return [
+        (result.name, baseline_results[result.name].ns_per_op, result.ns_per_op)
+        for result in current.results
+        if result.name in baseline_results
+        and result.ns_per_op > baseline_results[result.name].ns_per_op * (1.0 + threshold)
+    ]
+
+
+def load_baseline(path: str) -> MicroBaseline:
+    with open(path) as file:
+        return MicroBaseline.from_json(file.read())
+
+
+def save_baseline(baseline: MicroBaseline, path: str) -> None:
+    with open(path, 'w') as file:
+        file.write(baseline.to_json(indent=2))
+
+
+def describe(result: MicroResult) -> str:
+    return (
+        f"{result.name:<36} {result.ns_per_op:>14,.0f} ns/op (best {result.best_ns_per_op:,.0f})"
+        f" {result.peak_bytes_per_op:>12,.0f} B peak/op {result.retained_blocks_per_op:>8.2f} blocks retained/op"
+    )
@@ -19,5 +19,12 @@ CONFIGURATION = {
     'show_sight': keyboard_controller,
     'runs_no': 2,
     'profiling_metrics': [],
+    'profiling_output': None,
+    'workers': 1,
+    'seed': None,
+    'decision_budget': None,
+    'game_budget': None,
+    'simultaneous_decisions': False,
+    'decision_threads': None,
 }
 
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import copy
+import functools
+import random
+from typing import Any, Optional, Sequence
+
+import gymnasium
+from gymnasium import spaces
+from gymnasium.vector import AsyncVectorEnv, SyncVectorEnv, VectorEnv
+import numpy as np
+
+from gupb import controller
+from gupb.model import arenas
+from gupb.model import characters
+from gupb.model import encoders
+from gupb.model import games
+
+ACTIONS: list[characters.Action] = list(characters.Action)
+DEFAULT_SIGHT_RADIUS: int = 8
+
+
+# noinspection PyUnusedLocal
+class AgentController(controller.Controller):
+    """ Controller of the learning champion, playing the action chosen in the last `GupbEnv.step`. """
+
+    def __init__(self, name: str) -> None:
+        self._name: str = name
+        self.action: characters.Action = characters.Action.DO_NOTHING
+
+    def decide(self, knowledge: characters.ChampionKnowledge) -> characters.Action:
+        return self.action
+
+    def praise(self, score: int) -> None:
+        pass
+
+    def reset(self, game_no: int, arena_description: arenas.ArenaDescription) -> None:
+        pass
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def preferred_tabard(self) -> characters.Tabard:
+        return characters.Tabard.BLUE
+
+
+class GupbEnv(gymnasium.Env):
+    """ A game from the perspective of a single champion, with the other champions driven by the given controllers.
+
+    Observations are windows of the arena centred on the agent, encoded by `encoders.KnowledgeEncoder`, and the reward
+    is the score of the agent, given when it leaves the game.
+    """
+    metadata = {'render_modes': []}
+
+    def __init__(
+            self,
+            arena_names: Sequence[str],
+            opponents: Sequence[controller.Controller],
+            sight_radius: int = DEFAULT_SIGHT_RADIUS,
+            max_steps: Optional[int] = None,
+            agent_name: str = 'Agent',
+    ) -> None:
+        self.arena_names: list[str] = list(arena_names)
+        self.opponents: list[controller.Controller] = list(opponents)
+        self.sight_radius: int = sight_radius
+        self.max_steps: Optional[int] = max_steps
+        self.agent_controller: AgentController = AgentController(agent_name)
+        window = 2 * sight_radius + 1
+        self.observation_space = spaces.Box(0.0, 1.0, (len(encoders.CHANNELS), window, window), np.float32)
+        self.action_space = spaces.Discrete(len(ACTIONS))
+        self.game: Optional[games.Game] = None
+        self.agent: Optional[characters.Champion] = None
+        self.steps: int = 0
+        self._games_played: int = 0
+        self._encoder: Optional[encoders.KnowledgeEncoder] = None
+
+    def reset(
+            self,
+            *,
+            seed: Optional[int] = None,
+            options: Optional[dict[str, Any]] = None,
+    ) -> tuple[np.ndarray, dict[str, Any]]:
+        super().reset(seed=seed)
+        random.seed(int(self.np_random.integers(2 ** 32)))
+        controllers = copy.deepcopy(self.opponents) + [self.agent_controller]
+        random.shuffle(controllers)
+        self.game = games.Game(self._games_played, random.choice(self.arena_names), controllers)
+        self._games_played += 1
+        self._encoder = encoders.KnowledgeEncoder.for_arena(self.game.arena.name, self.sight_radius)
+        self.agent = next(c for c in self.game.champions if c.controller is self.agent_controller)
+        self.steps = 0
+        self._play_until_agent_turn()
+        return self._observe(), self._info()
+
+    def step(self, action: int) -> tuple[np.ndarray, float, bool, bool, dict[str, Any]]:
+        if self.game is None:
+            raise RuntimeError("Attempted to step an environment which was not reset!")
+        self.agent_controller.action = ACTIONS[action]
+        self.game.on_enter_actions_done()
+        self.steps += 1
+        self._play_until_agent_turn()
+        score = self.game.champion_score(self.agent)
+        terminated = score is not None
+        truncated = not terminated and self.max_steps is not None and self.steps >= self.max_steps
+        return self._observe(), float(score) if terminated else 0.0, terminated, truncated, self._info()
+
+    def _play_until_agent_turn(self) -> None:
+        game = self.game
+        while not game.finished and game.champion_score(self.agent) is None:
+            game.arena.trigger_instants()
+            if self.agent.alive and game.action_queue and game.action_queue[-1] is self.agent:
+                return
+            game.on_enter_actions_done()
+
+    def _observe(self) -> np.ndarray:
+        if not self.agent.alive:
+            return np.zeros(self.observation_space.shape, dtype=np.float32)
+        return self._encoder.encode(self.agent.knowledge(), np.empty(self.observation_space.shape, dtype=np.float32))
+
+    def _info(self) -> dict[str, Any]:
+        return {
+            'episode': self.game.episode,
+            'health': self.agent.health,
+            'alive': self.agent.alive,
+            'champions_alive': self.game.arena.no_of_champions_alive,
+        }
+
+
+def make_vector_env(num_envs: int, asynchronous: bool = False, **env_kwargs: Any) -> VectorEnv:
+    """ Runs `num_envs` games in lockstep, in this process or in subprocesses sharing observation buffers. """
+    env_fns = [functools.partial(GupbEnv, **env_kwargs) for _ in range(num_envs)]
+    if asynchronous:
+        return AsyncVectorEnv(env_fns, shared_memory=True)
+    return SyncVectorEnv(env_fns)
+
+
+gymnasium.register(id='Gupb-v0', entry_point='gupb.environment:GupbEnv')
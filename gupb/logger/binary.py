@@ -0,0 +1,299 @@
+from __future__ import annotations
+import atexit
+import dataclasses
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Any, Iterator, NamedTuple, Optional, TextIO
+
+import click
+import numpy as np
+
+from gupb.logger import core as logger_core
+
+RECORD = struct.Struct('<IBBHiii')
+RECORD_DTYPE = np.dtype([
+    ('time', '<u4'),
+    ('type', 'u1'),
+    ('level', 'u1'),
+    ('line', '<u2'),
+    ('values', '<i4', (3,)),
+])
+VALUES_PER_RECORD: int = 3
+CHILD_RECORD: int = 0x80
+RECORDS_PER_WRITE: int = 4096
+NAMES_SUFFIX: str = '.names'
+
+INT, STR, COORDS, REPORTS = 'int', 'str', 'coords', 'reports'
+
+
+class CapturedEvent(NamedTuple):
+    report: logger_core.LoggingMixin
+    level: int
+    created: float
+    line: str
+
+
+class EventType(NamedTuple):
+    name: str
+    fields: list[tuple[str, str]]
+
+
+def call_site(depth: int) -> str:
+    frame = sys._getframe(depth + 1)
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+
+
+def field_kind(value: Any) -> str:
+    if isinstance(value, str):
+        return STR
+    elif isinstance(value, tuple) and len(value) == 2:
+        return COORDS
+    elif isinstance(value, list):
+        return REPORTS
+    elif isinstance(value, int):
+        return INT
+    raise TypeError(f"Values of type {type(value).__name__} cannot be stored in a binary log!")
+
+
+def pack_coords(coords: tuple[int, int]) -> int:
+    packed = (coords[0] & 0xFFFF) << 16 | coords[1] & 0xFFFF
+    return packed - (1 << 32) if packed & 0x80000000 else packed
+
+
+def unpack_coords(packed: int) -> list[int]:
+    x, y = (packed >> 16) & 0xFFFF, packed & 0xFFFF
+    return [x - (1 << 16) if x & 0x8000 else x, y - (1 << 16) if y & 0x8000 else y]
+
+
+class BinaryLogWriter:
+    """ Event bus subscriber writing reports as fixed-width records, readable with `RECORD_DTYPE`.
+
+    Report types, their field layouts, controller and other names, and log call sites are interned into small integer
+    tables kept in an append-only `.names` sidecar of JSON lines. Coordinates are packed into a single value and list
+    fields are stored as a count followed by one child record per element.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        self.file_name: str = file_name
+        self.start_ms: int = int(time.time() * 1000)
+        self._records = open(file_name, 'ab', buffering=0)
+        self._names: TextIO = open(file_name + NAMES_SUFFIX, 'a')
+        self._buffer = bytearray(RECORD.size * RECORDS_PER_WRITE)
+        self._buffered: int = 0
+        self._types: dict[type, tuple[int, list[tuple[str, str]]]] = {}
+        self._strings: dict[str, int] = {}
+        self._lines: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._write_names({'start': self.start_ms})
+        atexit.register(self.close)
+
+    def __call__(self, report: logger_core.LoggingMixin, level: int) -> None:
+        self.write(report, level, time.time(), call_site(1))
+
+    def write(self, report: logger_core.LoggingMixin, level: int, created: float, line: str) -> None:
+        offset = int(created * 1000) - self.start_ms
+        with self._lock:
+            line_id = self._lines.get(line)
+            if line_id is None:
+                line_id = self._lines[line] = len(self._lines)
+                self._write_names({'line': line_id, 'value': line})
+            self._write_report(report, level, max(offset, 0), line_id)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._records.closed:
+                self._flush()
+                self._records.close()
+                self._names.close()
+
+    def _flush(self) -> None:
+        self._names.flush()
+        if self._buffered:
+            self._records.write(self._buffer[:self._buffered * RECORD.size])
+            self._buffered = 0
+
+    def _write_report(self, report: logger_core.LoggingMixin, level: int, offset: int, line_id: int) -> None:
+        type_id, fields = self._event_type(report)
+        values = [0] * VALUES_PER_RECORD
+        children = []
+        for i, (name, kind) in enumerate(fields):
+            value = getattr(report, name)
+            if kind == STR:
+                values[i] = self._string_id(value)
+            elif kind == COORDS:
+                values[i] = pack_coords(value)
+            elif kind == REPORTS:
+                values[i] = len(value)
+                children.extend(value)
+            else:
+                values[i] = value
+        RECORD.pack_into(self._buffer, self._buffered * RECORD.size, offset, type_id, level, line_id, *values)
+        self._buffered += 1
+        if self._buffered == RECORDS_PER_WRITE:
+            self._flush()
+        for child in children:
+            self._write_report(child, level | CHILD_RECORD, offset, line_id)
+
+    def _event_type(self, report: logger_core.LoggingMixin) -> tuple[int, list[tuple[str, str]]]:
+        event_type = self._types.get(type(report))
+        if event_type is None:
+            fields = [(field.name, field_kind(getattr(report, field.name))) for field in dataclasses.fields(report)]
+            if len(fields) > VALUES_PER_RECORD:
+                raise ValueError(f"Report {type(report).__name__} has too many fields for a binary log!")
+            event_type = self._types[type(report)] = len(self._types), fields
+            self._write_names({'type': event_type[0], 'name': type(report).__name__, 'fields': fields})
+        return event_type
+
+    def _string_id(self, value: str) -> int:
+        string_id = self._strings.get(value)
+        if string_id is None:
+            string_id = self._strings[value] = len(self._strings)
+            self._write_names({'name': string_id, 'value': value})
+        return string_id
+
+    def _write_names(self, entry: dict[str, Any]) -> None:
+        self._names.write(json.dumps(entry) + '\n')
+
+
+class EventCapture:
+    def __init__(self) -> None:
+        self.events: list[CapturedEvent] = []
+
+    def __call__(self, report: logger_core.LoggingMixin, level: int) -> None:
+        self.events.append(CapturedEvent(report, level, time.time(), call_site(1)))
+
+
+class NameTables(NamedTuple):
+    start_ms: int
+    types: list[EventType]
+    names: list[str]
+    lines: list[str]
+
+    @staticmethod
+    def load(file_name: str) -> NameTables:
+        start_ms, types, names, lines = 0, {}, {}, {}
+        with open(file_name + NAMES_SUFFIX) as file:
+            for raw_entry in file:
+                try:
+                    entry = json.loads(raw_entry)
+                except json.JSONDecodeError:
+                    break
+                if 'start' in entry:
+                    start_ms = entry['start']
+                elif 'type' in entry:
+                    types[entry['type']] = EventType(entry['name'], [tuple(field) for field in entry['fields']])
+                elif 'line' in entry:
+                    lines[entry['line']] = entry['value']
+                else:
+                    names[entry['name']] = entry['value']
+        return NameTables(
+            start_ms,
+            [types[i] for i in range(len(types))],
+            [names[i] for i in range(len(names))],
+            [lines[i] for i in range(len(lines))],
+        )
+
+
+def read_records(file_name: str) -> np.ndarray:
+    """ Records of a binary log mapped from the file rather than read into memory, up to the last complete one. """
+    count = os.path.getsize(file_name) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    # `_read_entry` indexes record by record, which is much slower on the `np.memmap` subclass than on a view
+    return np.memmap(file_name, dtype=RECORD_DTYPE, mode='r', shape=(count,)).view(np.ndarray)
+
+
+def read_entries(file_name: str) -> Iterator[dict[str, Any]]:
+    """ Yields log entries shaped like the parsed lines of a JSON log. """
+    tables = NameTables.load(file_name)
+    records = read_records(file_name)
+    position = 0
+    while position < len(records):
+        entry, position = _read_entry(records, position, tables)
+        if entry is None:
+            return
+        yield entry
+
+
+def _read_entry(records: np.ndarray, position: int, tables: NameTables) -> tuple[Optional[dict[str, Any]], int]:
+    record = records[position]
+    if int(record['type']) >= len(tables.types) or int(record['line']) >= len(tables.lines):
+        return None, len(records)
+    value, position = _read_value(records, position, tables)
+    if value is None:
+        return None, position
+    created = (tables.start_ms + int(record['time'])) / 1000
+    return {
+        'time_stamp': format_time(created),
+        'severity': logging.getLevelName(int(record['level']) & ~CHILD_RECORD),
+        'line': tables.lines[int(record['line'])],
+        'type': tables.types[int(record['type'])].name,
+        'value': value,
+    }, position
+
+
+def _read_value(records: np.ndarray, position: int, tables: NameTables) -> tuple[Optional[dict[str, Any]], int]:
+    record = records[position]
+    position += 1
+    value = {}
+    for (name, kind), raw in zip(tables.types[int(record['type'])].fields, record['values'].tolist()):
+        if kind == STR:
+            if raw >= len(tables.names):
+                return None, len(records)
+            value[name] = tables.names[raw]
+        elif kind == COORDS:
+            value[name] = unpack_coords(raw)
+        elif kind == REPORTS:
+            if position + raw > len(records):
+                return None, len(records)
+            children = []
+            for _ in range(raw):
+                child, position = _read_value(records, position, tables)
+                if child is None:
+                    return None, position
+                children.append(child)
+            value[name] = children
+        else:
+            value[name] = raw
+    return value, position
+
+
+def format_time(created: float) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created)) + f',{int(round(created * 1000)) % 1000:03d}'
+
+
+def format_entry(entry: dict[str, Any]) -> str:
+    return (
+        f'{{"time_stamp": "{entry["time_stamp"]}",'
+        f' "severity": "{entry["severity"]}",'
+        f' "line": "{entry["line"]}",'
+        f' "type": "{entry["type"]}",'
+        f' "value": {json.dumps(entry["value"])}}}'
+    )
+
+
+def convert(binary_file_name: str, json_file_name: str) -> None:
+    with open(json_file_name, 'w') as file:
+        for entry in read_entries(binary_file_name):
+            file.write(format_entry(entry) + '\n')
+
+
+@click.command()
+@click.argument('binary_file_name', type=click.Path(exists=True))
+@click.argument('json_file_name', required=False, type=click.Path())
+def main(binary_file_name: str, json_file_name: Optional[str]) -> None:
+    convert(binary_file_name, json_file_name if json_file_name else os.path.splitext(binary_file_name)[0] + '.json')
+
+
+if __name__ == '__main__':
+    main(prog_name='python -m gupb.logger.binary')
@@ -1,11 +1,101 @@
+from __future__ import annotations
+import contextlib
+import contextvars
 import json
 import logging
+from typing import Callable, Iterator, Optional
 
 from dataclasses_json import DataClassJsonMixin
 
 json_logger = logging.getLogger('json')
+verbose_logger = logging.getLogger('verbose')
+
+EventHandler = Callable[['LoggingMixin', int], None]
+
+# set while muted code runs, per thread and task, so muting a forked game never silences the game it was forked from
+MUTED: contextvars.ContextVar[bool] = contextvars.ContextVar('muted', default=False)
+
+
+class EventBus:
+    """ Routes reports to the handlers subscribed to their types, so reports nobody listens to are dropped at once. """
+
+    def __init__(self) -> None:
+        self._subscriptions: list[tuple[EventHandler, Optional[tuple[type, ...]]]] = []
+        self._routes: dict[type, tuple[EventHandler, ...]] = {}
+
+    def subscribe(self, handler: EventHandler, *event_types: type) -> None:
+        self._subscriptions.append((handler, event_types if event_types else None))
+        self._routes = {}
+
+    def unsubscribe(self, handler: EventHandler) -> None:
+        self._subscriptions = [subscription for subscription in self._subscriptions if subscription[0] != handler]
+        self._routes = {}
+
+    def subscribed(self, handler: EventHandler) -> bool:
+        return any(subscribed_handler == handler for subscribed_handler, _ in self._subscriptions)
+
+    def subscribers(self) -> list[EventHandler]:
+        return [handler for handler, _ in self._subscriptions]
+
+    def clear(self) -> None:
+        self._subscriptions = []
+        self._routes = {}
+
+    def handlers(self, event_type: type) -> tuple[EventHandler, ...]:
+        if MUTED.get():
+            return ()
+        route = self._routes.get(event_type)
+        if route is None:
+            route = tuple(
+                handler
+                for handler, event_types in self._subscriptions
+                if event_types is None or issubclass(event_type, event_types)
+            )
+            self._routes[event_type] = route
+        return route
+
+    def wants(self, event_type: type) -> bool:
+        """ Whether reports of the type would reach anyone, so hot paths can skip building reports nobody handles. """
+        return len(self.handlers(event_type)) > 0
+
+    def publish(self, event: LoggingMixin, level: int) -> None:
+        for handler in self.handlers(type(event)):
+            handler(event, level)
+
+
+EVENT_BUS = EventBus()
 
 
 class LoggingMixin(DataClassJsonMixin):
     def log(self, level: int) -> None:
-        json_logger.log(level=level, msg=json.dumps(self.to_dict()), extra={'event_type': self.__class__.__name__})
+        for handler in EVENT_BUS.handlers(type(self)):
+            handler(self, level)
+
+
+def log_json(report: LoggingMixin, level: int) -> None:
+    if json_logger.isEnabledFor(level):
+        # the record points to `LoggingMixin.log`, which logged reports itself before they went through the bus
+        json_logger.log(
+            level=level,
+            msg=json.dumps(report.to_dict()),
+            extra={'event_type': report.__class__.__name__},
+            stacklevel=2,
+        )
+
+
+def unmuted(record: logging.LogRecord) -> bool:
+    return not MUTED.get()
+
+
+verbose_logger.addFilter(unmuted)
+json_logger.addFilter(unmuted)
+
+
+@contextlib.contextmanager
+def muted() -> Iterator[None]:
+    """ Drops reports and log records made in the current context only, other threads keep logging. """
+    token = MUTED.set(True)
+    try:
+        yield
+    finally:
+        MUTED.reset(token)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+import json
+import os
+from typing import Any, Iterator, Optional, TextIO
+
+import click
+from dataclasses_json import DataClassJsonMixin
+
+INDEX_SUFFIX: str = '.idx'
+INDEXED_EVENTS: frozenset[str] = frozenset({
+    'GameStartReport',
+    'RandomArenaPickReport',
+    'ChampionSpawnedReport',
+    'ControllerScoreReport',
+    'FinalScoresReport',
+})
+
+
+@dataclass
+class GameIndexEntry(DataClassJsonMixin):
+    game_number: int
+    offset: int
+    arena: Optional[str] = None
+    controllers: list[str] = field(default_factory=list)
+    scores: dict[str, int] = field(default_factory=dict)
+    score_offsets: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return len(self.scores) > 0 and all(name in self.scores for name in self.controllers)
+
+
+class LogIndexer:
+    """ Writes one line per game of a JSON log to a sidecar index, holding the byte offsets of its start and scores.
+
+    An entry is written as soon as every spawned champion got its score, so the index of a log still being written
+    lags behind it by at most one game.
+    """
+
+    def __init__(self, index_file_name: str) -> None:
+        self.index_file_name: str = index_file_name
+        self._index: TextIO = open(index_file_name, 'a')
+        self._game: Optional[GameIndexEntry] = None
+        self._arena: Optional[str] = None
+
+    def observe(self, event_type: str, value: dict[str, Any], offset: int) -> None:
+        if event_type == 'GameStartReport':
+            self._write_game()
+            self._game = GameIndexEntry(value['game_number'], offset, self._arena)
+        elif event_type == 'FinalScoresReport':
+            self._write_game()
+        elif self._game is None:
+            return
+        elif event_type == 'RandomArenaPickReport':
+            self._arena = self._game.arena = value['arena_name']
+        elif event_type == 'ChampionSpawnedReport':
+            self._game.controllers.append(value['controller_name'])
+        elif event_type == 'ControllerScoreReport':
+            self._game.scores[value['controller_name']] = value['score']
+            self._game.score_offsets[value['controller_name']] = offset
+            if self._game.complete:
+                self._write_game()
+
+    def flush(self) -> None:
+        self._index.flush()
+
+    def close(self) -> None:
+        if not self._index.closed:
+            self._write_game()
+            self._index.close()
+
+    def _write_game(self) -> None:
+        if self._game is not None:
+            self._index.write(self._game.to_json() + '\n')
+            self._game = None
+
+
+def index_path(log_path: str) -> str:
+    return log_path + INDEX_SUFFIX
+
+
+def indexed_event_type(line: bytes) -> Optional[str]:
+    start = line.find(b'"type": "')
+    if start < 0:
+        return None
+    start += len(b'"type": "')
+    event_type = line[start:line.find(b'"', start)].decode()
+    return event_type if event_type in INDEXED_EVENTS else None
+
+
+def build_index(log_path: str) -> None:
+    """ Indexes a JSON log offline, for logs written without an index. """
+    temporary_path = index_path(log_path) + '.tmp'
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    indexer = LogIndexer(temporary_path)
+    offset = 0
+    with open(log_path, 'rb') as file:
+        for line in file:
+            event_type = indexed_event_type(line)
+            if event_type is not None and line.endswith(b'\n'):
+                indexer.observe(event_type, json.loads(line)['value'], offset)
+            offset += len(line)
+    indexer.close()
+    os.replace(temporary_path, index_path(log_path))
+
+
+def load_index(log_path: str) -> list[GameIndexEntry]:
+    if not os.path.exists(index_path(log_path)):
+        build_index(log_path)
+    entries = []
+    with open(index_path(log_path)) as file:
+        for line in file:
+            if line.endswith('\n'):
+                entries.append(GameIndexEntry.from_json(line))
+    return entries
+
+
+def select_games(
+        entries: list[GameIndexEntry],
+        controller: Optional[str] = None,
+        arena: Optional[str] = None,
+) -> list[GameIndexEntry]:
+    return [
+        entry
+        for entry in entries
+        if (controller is None or controller in entry.controllers) and (arena is None or entry.arena == arena)
+    ]
+
+
+def read_game(log_path: str, entry: GameIndexEntry) -> Iterator[dict[str, Any]]:
+    with open(log_path, 'rb') as file:
+        file.seek(entry.offset)
+        first = True
+        for line in file:
+            if not line.endswith(b'\n'):
+                return
+            data = json.loads(line)
+            if not first and data['type'] in ('GameStartReport', 'FinalScoresReport'):
+                return
+            first = False
+            yield data
+
+
+def read_games(
+        log_path: str,
+        controller: Optional[str] = None,
+        arena: Optional[str] = None,
+) -> Iterator[tuple[GameIndexEntry, list[dict[str, Any]]]]:
+    for entry in select_games(load_index(log_path), controller, arena):
+        yield entry, list(read_game(log_path, entry))
+
+
+def find_game(log_path: str, game_number: int) -> GameIndexEntry:
+    for entry in load_index(log_path):
+        if entry.game_number == game_number:
+            return entry
+    raise KeyError(f"Game number {game_number} is not in {log_path}!")
+
+
+@click.group()
+def main() -> None:
+    pass
+
+
+@main.command(help="Index JSON logs written without an index.")
+@click.argument('log_paths', nargs=-1, type=click.Path(exists=True))
+def build(log_paths: tuple[str, ...]) -> None:
+    for log_path in log_paths:
+        build_index(log_path)
+
+
+@main.command(help="List the games of a JSON log, optionally only those of a controller or on an arena.")
+@click.argument('log_path', type=click.Path(exists=True))
+@click.option('--controller', default=None, help="The name of a controller playing in the listed games.")
+@click.option('--arena', default=None, help="The name of the arena of the listed games.")
+def games(log_path: str, controller: Optional[str], arena: Optional[str]) -> None:
+    for entry in select_games(load_index(log_path), controller, arena):
+        print(f"{entry.game_number:6} {str(entry.arena):20} offset {entry.offset:12}  {entry.scores}")
+
+
+@main.command(help="Print the log lines of a single game.")
+@click.argument('log_path', type=click.Path(exists=True))
+@click.argument('game_number', type=int)
+def game(log_path: str, game_number: int) -> None:
+    for data in read_game(log_path, find_game(log_path, game_number)):
+        print(json.dumps(data))
+
+
+if __name__ == '__main__':
+    main(prog_name='python -m gupb.logger.index')
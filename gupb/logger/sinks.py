@@ -0,0 +1,184 @@
+from __future__ import annotations
+import codecs
+import json
+import locale
+import logging
+import queue
+import threading
+import time
+from typing import NamedTuple, Optional, Union
+
+from gupb.logger import binary
+from gupb.logger import core as logger_core
+from gupb.logger import index
+
+DEFAULT_BATCH_SIZE: int = 4096
+DEFAULT_BUFFER_SIZE: int = 1 << 20
+SINK_LOGGERS: tuple[str, ...] = ('verbose', 'json')
+
+FLUSH = object()
+STOP = object()
+
+
+class SinkStatistics(NamedTuple):
+    file_name: str
+    records: int
+    bytes: int
+    batches: int
+    seconds: float
+
+    def __str__(self) -> str:
+        records_per_second = self.records / self.seconds if self.seconds else 0.0
+        return (
+            f"{self.file_name}: {self.records} records, {self.bytes / 2 ** 20:.1f} MiB in {self.batches} batches, "
+            f"{records_per_second:.0f} records/s"
+        )
+
+
+class BatchedFileHandler(logging.Handler):
+    """ File handler which collects records into batches, formatted and written by a background thread.
+
+    Records are formatted after `emit` returns, so their arguments should not be mutated after logging. With an
+    `indexer`, the byte offsets of the indexed JSON events are passed to it as they are written. Like in
+    `logging.FileHandler`, records end with `terminator` and are encoded with `encoding`, the locale one by default.
+    """
+
+    terminator: str = '\n'
+
+    def __init__(
+            self,
+            file_name: str,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            buffer_size: int = DEFAULT_BUFFER_SIZE,
+            indexer: Optional[index.LogIndexer] = None,
+            encoding: Optional[str] = None,
+    ) -> None:
+        super().__init__()
+        self.file_name: str = file_name
+        self.encoding: str = encoding if encoding else locale.getpreferredencoding(False)
+        self.batch_size: int = batch_size
+        self.indexer: Optional[index.LogIndexer] = indexer
+        self.records_written: int = 0
+        self.bytes_written: int = 0
+        self.batches_written: int = 0
+        self.writing_time: float = 0.0
+        self._pending: list[logging.LogRecord] = []
+        self._stream = open(file_name, 'ab', buffering=buffer_size)
+        self._offset: int = self._stream.tell()
+        self._encoder = codecs.getincrementalencoder(self.encoding)()
+        if self._offset:
+            # appending, so encodings starting with a byte order mark must not write it again
+            self._encoder.setstate(0)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_batches, name='batched-log-writer', daemon=True)
+        self._writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self._queue.put(self._pending)
+            self._pending = []
+
+    def request_flush(self) -> None:
+        self._hand_over(FLUSH)
+
+    def flush(self) -> None:
+        if self._writer.is_alive():
+            flushed = threading.Event()
+            self._hand_over(flushed)
+            flushed.wait()
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._hand_over(STOP)
+            self._writer.join()
+        if not self._stream.closed:
+            self._stream.close()
+        if self.indexer is not None:
+            self.indexer.close()
+        super().close()
+
+    def statistics(self) -> SinkStatistics:
+        return SinkStatistics(
+            self.file_name,
+            self.records_written,
+            self.bytes_written,
+            self.batches_written,
+            self.writing_time,
+        )
+
+    def _hand_over(self, marker: Union[threading.Event, object]) -> None:
+        self.acquire()
+        try:
+            if self._pending:
+                self._queue.put(self._pending)
+                self._pending = []
+            self._queue.put(marker)
+        finally:
+            self.release()
+
+    def _write_batches(self) -> None:
+        while True:
+            item = self._queue.get()
+            start = time.perf_counter()
+            if isinstance(item, list):
+                self._write_batch(item)
+            else:
+                self._stream.flush()
+                if self.indexer is not None:
+                    self.indexer.flush()
+                if isinstance(item, threading.Event):
+                    item.set()
+            self.writing_time += time.perf_counter() - start
+            if item is STOP:
+                return
+
+    def _write_batch(self, batch: list[logging.LogRecord]) -> None:
+        lines = []
+        for record in batch:
+            try:
+                line = self._encoder.encode(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+                continue
+            lines.append(line)
+            event_type = getattr(record, 'event_type', None)
+            if self.indexer is not None and event_type in index.INDEXED_EVENTS:
+                self.indexer.observe(event_type, json.loads(record.getMessage()), self._offset)
+            self._offset += len(line)
+        chunk = b''.join(lines)
+        self._stream.write(chunk)
+        self.records_written += len(lines)
+        self.bytes_written += len(chunk)
+        self.batches_written += 1
+
+
+def batched_handlers() -> list[BatchedFileHandler]:
+    return [
+        handler
+        for name in SINK_LOGGERS
+        for handler in logging.getLogger(name).handlers
+        if isinstance(handler, BatchedFileHandler)
+    ]
+
+
+def binary_writers() -> list[binary.BinaryLogWriter]:
+    return [
+        handler
+        for handler in logger_core.EVENT_BUS.subscribers()
+        if isinstance(handler, binary.BinaryLogWriter)
+    ]
+
+
+def request_flush() -> None:
+    for handler in batched_handlers():
+        handler.request_flush()
+    for writer in binary_writers():
+        writer.flush()
+
+
+def flush() -> None:
+    for handler in batched_handlers():
+        handler.flush()
+    for writer in binary_writers():
+        writer.flush()
@@ -1,18 +1,26 @@
 from __future__ import annotations
+import contextlib
+import copy
 from dataclasses import dataclass
+import hashlib
+import io
+import json
 import logging
 import os.path
 import random
+import tempfile
 from enum import Enum, member
-from typing import Dict, NamedTuple, Optional
+from typing import Iterable, MutableMapping, NamedTuple, Optional, Union
 
-import bresenham
+import numpy as np
 
 from gupb.logger import core as logger_core
 from gupb.model import characters
 from gupb.model import coordinates
 from gupb.model import effects
+from gupb.model import grids
 from gupb.model import tiles
+from gupb.model import visibility
 from gupb.model import weapons
 
 verbose_logger = logging.getLogger('verbose')
@@ -33,12 +41,31 @@ WEAPON_ENCODING = {
     'C': weapons.Scroll,
 }
 
+# tile types are registered in a fixed order, so type codes stored in compiled arenas mean the same in every process
+for _tile_type in (*TILE_ENCODING.values(), tiles.Menhir):
+    grids.tile_type_code(_tile_type)
+
 FIXED_MENHIRS = {
     'isolated_shrine': coordinates.Coords(9, 9),
     'lone_sanctum': coordinates.Coords(9, 9),
 }
 
-Terrain = Dict[coordinates.Coords, tiles.Tile]
+Terrain = MutableMapping[coordinates.Coords, tiles.Tile]
+
+ARENA_TEMPLATES: dict[str, Arena] = {}
+
+MENHIR_MEASURES_CACHE_SIZE: int = 64
+
+SOURCE_SUFFIX: str = '.gupb'
+COMPILED_SUFFIX: str = '.gupbc'
+METADATA_SUFFIX: str = '.json'
+COMPILED_FORMAT_VERSION: int = 1
+# compiled arenas are cached outside of `resources`, in this directory if set, else as described in `cache_directory`
+COMPILED_CACHE_DIRECTORY: Optional[str] = None
+CACHE_DIRECTORY_VARIABLE: str = 'GUPB_CACHE_DIR'
+TYPES_LAYER: int = 0
+LOOT_LAYER: int = 1
+NO_LOOT: int = 0
 
 
 # noinspection PyMethodParameters
@@ -65,85 +92,76 @@ class ArenaDescription(NamedTuple):
 
 
 class Arena:
-    def __init__(self, name: str, terrain: Terrain) -> None:
+    def __init__(self, name: str, terrain: Union[Terrain, grids.TerrainGrid]) -> None:
         self.name = name
-        self.terrain: Terrain = terrain
+        self.terrain: grids.TerrainGrid = (
+            terrain if isinstance(terrain, grids.TerrainGrid) else grids.TerrainGrid.from_terrain(terrain)
+        )
         self.tiles_with_instant_effects: set[tiles.Tile] = set()
-        self.size: tuple[int, int] = terrain_size(self.terrain)
+        self.visibility = visibility.VisibilityCache(self.terrain)
+        self.size: tuple[int, int] = self.terrain.size
         self.menhir_position: Optional[coordinates.Coords] = None
+        self.menhir_distances: Optional[np.ndarray] = None
+        self.mist_rings: list[tuple[np.ndarray, np.ndarray]] = []
         self.mist_radius = int(self.size[0] * 2 ** 0.5) + 1
         self.no_of_champions_alive: int = 0
+        self._menhir_measures: dict[int, tuple[np.ndarray, list[tuple[np.ndarray, np.ndarray]]]] = {}
 
     @staticmethod
     def load(name: str) -> Arena:
-        terrain = dict()
-        arena_file_path = os.path.join('resources', 'arenas', f'{name}.gupb')
-        with open(arena_file_path) as file:
-            for y, line in enumerate(file.readlines()):
-                for x, character in enumerate(line):
-                    if character != '\n':
-                        position = coordinates.Coords(x, y)
-                        if character in TILE_ENCODING:
-                            terrain[position] = TILE_ENCODING[character]()
-                        elif character in WEAPON_ENCODING:
-                            terrain[position] = tiles.Land()
-                            terrain[position].loot = WEAPON_ENCODING[character]()
+        """ Fresh arena forked from the cached template, sharing its terrain until the game changes it. """
+        return template(name).fork()
+
+    @staticmethod
+    def parse(name: str, lines: list[str]) -> Arena:
+        return Arena.from_compiled(name, compile_source(lines))
+
+    @staticmethod
+    def from_compiled(name: str, compiled: np.ndarray) -> Arena:
+        """ Arena over a compiled grid, whose type codes back the terrain until it is painted over. """
+        terrain = grids.TerrainGrid.from_types(compiled[TYPES_LAYER])
+        weapon_types = list(WEAPON_ENCODING.values())
+        loot = compiled[LOOT_LAYER]
+        for x, y in zip(*np.nonzero(loot)):
+            terrain.set_loot(int(x), int(y), weapon_types[loot[x, y] - 1]())
         return Arena(name, terrain)
 
     def description(self) -> ArenaDescription:
         return ArenaDescription(self.name)
 
+    def fork(self) -> Arena:
+        forked = copy.copy(self)
+        forked.terrain = self.terrain.fork()
+        forked.visibility = self.visibility.fork(forked.terrain)
+        forked.tiles_with_instant_effects = {forked.terrain[tile.position] for tile in self.tiles_with_instant_effects}
+        return forked
+
     def empty_coords(self) -> list[coordinates.Coords]:
-        return sorted(set(coords for coords, tile in self.terrain.items() if tile.empty))
+        return list(self.terrain.empty_cells)
 
     def visible_coords(self, champion: characters.Champion) -> set[coordinates.Coords]:
-        def estimate_border_point() -> tuple[coordinates.Coords, int]:
-            if champion.facing == characters.Facing.UP:
-                return coordinates.Coords(champion.position.x, 0), champion.position[1]
-            elif champion.facing == characters.Facing.RIGHT:
-                return coordinates.Coords(self.size[0] - 1, champion.position.y), self.size[0] - champion.position[0]
-            elif champion.facing == characters.Facing.DOWN:
-                return coordinates.Coords(champion.position.x, self.size[1] - 1), self.size[1] - champion.position.y
-            elif champion.facing == characters.Facing.LEFT:
-                return coordinates.Coords(0, champion.position.y), champion.position[0]
-
-        def champion_left_and_right() -> list[coordinates.Coords]:
-            if champion.facing == characters.Facing.UP or champion.facing == characters.Facing.DOWN:
-                return [
-                    coordinates.Coords(champion.position.x + 1, champion.position.y),
-                    coordinates.Coords(champion.position.x - 1, champion.position.y),
-                ]
-            elif champion.facing == characters.Facing.LEFT or champion.facing == characters.Facing.RIGHT:
-                return [
-                    coordinates.Coords(champion.position.x, champion.position.y + 1),
-                    coordinates.Coords(champion.position.x, champion.position.y - 1),
-                ]
-
-        visible = set()
+        xs, ys = self.visible_cells(champion)
+        visible = set(coordinates.interned_cells(xs, ys))
         visible.add(champion.position)
-        prescience = champion.weapon.prescience(champion.position, champion.facing)
-        if len(prescience) > 0:
-            for coords in prescience:
-                if coords in self.terrain:
-                    visible.add(coords)
-        else:
-            border, distance = estimate_border_point()
-            left = champion.facing.turn_left().value
-            targets = [border + coordinates.Coords(i * left.x, i * left.y) for i in range(-distance, distance + 1)]
-            for coords in targets:
-                ray = bresenham.bresenham(champion.position.x, champion.position.y, coords[0], coords[1])
-                next(ray)
-                for ray_coords in ray:
-                    if ray_coords not in self.terrain:
-                        break
-                    visible.add(ray_coords)
-                    if not self.terrain[ray_coords].transparent:
-                        break
-            visible.update(champion_left_and_right())
         return visible
 
+    def visible_cells(self, champion: characters.Champion) -> tuple[np.ndarray, np.ndarray]:
+        prescience = champion.weapon.prescience(champion.position, champion.facing)
+        if len(prescience) == 0:
+            return self.visibility.visible_cells(champion.position, champion.facing)
+        xs, ys = np.array(prescience, dtype=int).T
+        present = self.terrain.contains(xs, ys)
+        xs = np.concatenate((xs[present], [champion.position.x]))
+        ys = np.concatenate((ys[present], [champion.position.y]))
+        _, unique = np.unique(xs * self.size[1] + ys, return_index=True)
+        return xs[unique], ys[unique]
+
     def visible_tiles(self, champion: characters.Champion) -> dict[coordinates.Coords, tiles.TileDescription]:
-        return {coords: self.terrain[coords].description() for coords in self.visible_coords(champion)}
+        xs, ys = self.visible_cells(champion)
+        present = self.terrain.contains(xs, ys)
+        if not present.all():
+            raise KeyError(list(zip(xs[~present].tolist(), ys[~present].tolist())))
+        return dict(zip(coordinates.interned_cells(xs, ys), self.terrain.descriptions(xs, ys)))
 
     def step(self, champion: characters.Champion, step_direction: StepDirection) -> None:
         new_position = champion.position + step_direction.value(champion.facing).value
@@ -151,8 +169,9 @@ class Arena:
             self.terrain[champion.position].leave(champion)
             champion.position = new_position
             self.terrain[champion.position].enter(champion)
-            verbose_logger.debug(f"Champion {champion.controller.name} entered tile {new_position}.")
-            ChampionEnteredTileReport(champion.controller.name, new_position).log(logging.DEBUG)
+            verbose_logger.debug("Champion %s entered tile %s.", champion.controller.name, new_position)
+            if logger_core.EVENT_BUS.wants(ChampionEnteredTileReport):
+                ChampionEnteredTileReport(champion.controller.name, new_position).log(logging.DEBUG)
 
     def stay(self, champion: characters.Champion) -> None:
         self.terrain[champion.position].stay()
@@ -160,11 +179,12 @@ class Arena:
     def spawn_menhir(self, new_position: Optional[coordinates.Coords] = None) -> None:
         if self.menhir_position:
             self.terrain[self.menhir_position] = tiles.Land()
-        new_position = random.sample(self.empty_coords(), 1)[0] if new_position is None else new_position
+        new_position = random.choice(self.terrain.empty_cells) if new_position is None else new_position
         new_position = FIXED_MENHIRS[self.name] if self.name in FIXED_MENHIRS else new_position
         self.menhir_position = new_position
         self.terrain[self.menhir_position] = tiles.Menhir()
-        verbose_logger.debug(f"Menhir spawned at {self.menhir_position}.")
+        self._measure_menhir_distances()
+        verbose_logger.debug("Menhir spawned at %s.", self.menhir_position)
         MenhirSpawnedReport(self.menhir_position).log(logging.DEBUG)
 
     def spawn_champion_at(self, coords: coordinates.Coords) -> characters.Champion:
@@ -176,17 +196,43 @@ class Arena:
     def increase_mist(self) -> None:
         self.mist_radius -= 1 if self.mist_radius > 0 else self.mist_radius
         if self.mist_radius:
-            verbose_logger.debug(f"Radius of mist-free space decreased to {self.mist_radius}.")
+            verbose_logger.debug("Radius of mist-free space decreased to %d.", self.mist_radius)
             MistRadiusReducedReport(self.mist_radius).log(logging.DEBUG)
-            for coords in self.terrain:
-                distance = int(((coords.x - self.menhir_position.x) ** 2 +
-                                (coords.y - self.menhir_position.y) ** 2) ** 0.5)
-                if distance == self.mist_radius:
+            if self.mist_radius < len(self.mist_rings):
+                misted_xs, misted_ys = self.mist_rings[self.mist_radius]
+                for coords in coordinates.interned_cells(misted_xs, misted_ys):
                     self.register_effect(effects.Mist(), coords)
 
+    def menhir_distance(self, coords: coordinates.Coords) -> int:
+        return int(self.menhir_distances[coords[0], coords[1]])
+
+    def _measure_menhir_distances(self) -> None:
+        cell = coordinates.cell_id(self.menhir_position.x, self.menhir_position.y, self.size[0])
+        measures = self._menhir_measures.get(cell)
+        if measures is None:
+            measures = self._menhir_measures[cell] = self._measure(self.menhir_position)
+            if len(self._menhir_measures) > MENHIR_MEASURES_CACHE_SIZE:
+                del self._menhir_measures[next(iter(self._menhir_measures))]
+        self.menhir_distances, self.mist_rings = measures
+
+    def _measure(
+            self,
+            menhir_position: coordinates.Coords,
+    ) -> tuple[np.ndarray, list[tuple[np.ndarray, np.ndarray]]]:
+        xs, ys = np.indices(self.size)
+        distances = np.sqrt((xs - menhir_position.x) ** 2 + (ys - menhir_position.y) ** 2).astype(int)
+        present_xs, present_ys = np.nonzero(self.terrain.present)
+        cell_rings = distances[present_xs, present_ys]
+        order = np.argsort(cell_rings, kind='stable')
+        bounds = np.searchsorted(cell_rings[order], np.arange(cell_rings.max(initial=-1) + 2))
+        return distances, [
+            (present_xs[order[start:end]], present_ys[order[start:end]])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
     def register_effect(self, effect: effects.Effect, coords: coordinates.Coords) -> None:
         tile = self.terrain[coords]
-        tile.effects.add(effect)
+        self.terrain.add_effect(*tile.position, effect)
         if effect.lifetime() == effects.EffectLifetime.INSTANT:
             self.tiles_with_instant_effects.add(tile)
 
@@ -196,7 +242,162 @@ class Arena:
         self.tiles_with_instant_effects = set()
 
 
+def arena_path(name: str, suffix: str = SOURCE_SUFFIX) -> str:
+    return os.path.join('resources', 'arenas', f'{name}{suffix}')
+
+
+def cache_directory() -> str:
+    """ `COMPILED_CACHE_DIRECTORY` if set, else `$GUPB_CACHE_DIR`, else `gupb` in `$XDG_CACHE_HOME` or `~/.cache`. """
+    if COMPILED_CACHE_DIRECTORY is not None:
+        return COMPILED_CACHE_DIRECTORY
+    if os.environ.get(CACHE_DIRECTORY_VARIABLE):
+        return os.environ[CACHE_DIRECTORY_VARIABLE]
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'gupb')
+
+
+def compiled_arena_path(name: str) -> str:
+    """ Path of a compiled arena in the cache, apart for every directory of sources, e.g. of different checkouts. """
+    sources = os.path.abspath(os.path.dirname(arena_path(name)))
+    sources_key = hashlib.sha1(sources.encode()).hexdigest()[:16]
+    return os.path.join(cache_directory(), 'arenas', sources_key, f'{name}{COMPILED_SUFFIX}')
+
+
+def read_arena_source(name: str) -> list[str]:
+    with open(arena_path(name)) as file:
+        return [line.rstrip('\n') for line in file.readlines()]
+
+
+def compile_source(lines: list[str]) -> np.ndarray:
+    """ Encodes arena text as a `(2, x, y)` uint8 array of tile type codes and of loot, `WEAPON_ENCODING` index + 1. """
+    encoded = np.full((max(len(line) for line in lines), len(lines)), '', dtype='<U1')
+    for y, line in enumerate(lines):
+        encoded[:len(line), y] = list(line)
+    compiled = np.zeros((2,) + encoded.shape, dtype=np.uint8)
+    compiled[TYPES_LAYER] = grids.VOID
+    for character, tile_type in TILE_ENCODING.items():
+        compiled[TYPES_LAYER][encoded == character] = grids.tile_type_code(tile_type)
+    for i, character in enumerate(WEAPON_ENCODING, start=1):
+        weapon_mask = encoded == character
+        compiled[TYPES_LAYER][weapon_mask] = grids.tile_type_code(tiles.Land)
+        compiled[LOOT_LAYER][weapon_mask] = i
+    return compiled
+
+
+def compiled_metadata(compiled: np.ndarray, source: bytes, mtime_ns: int) -> dict:
+    types = compiled[TYPES_LAYER]
+    return {
+        'version': COMPILED_FORMAT_VERSION,
+        'source_mtime_ns': mtime_ns,
+        'source_sha1': hashlib.sha1(source).hexdigest(),
+        'size': list(types.shape),
+        'tile_types': grids.TYPE_NAMES[:int(types[types != grids.VOID].max(initial=0)) + 1],
+        'weapons': list(WEAPON_ENCODING),
+        'cells': int(np.count_nonzero(types != grids.VOID)),
+        'loot': int(np.count_nonzero(compiled[LOOT_LAYER])),
+    }
+
+
+def load_compiled(name: str) -> np.ndarray:
+    """ Memory-maps the compiled arena from the cache, compiling it first if the source changed since.
+
+    The source is considered changed when its modification time differs and its SHA-1 does too. Compiled files are
+    replaced atomically, so processes loading the same arena at once never read a partial file. If the compiled file
+    cannot be written, the freshly compiled array is used in memory.
+    """
+    source_path = arena_path(name)
+    compiled_path = compiled_arena_path(name)
+    metadata_path = compiled_path + METADATA_SUFFIX
+    mtime_ns = os.stat(source_path).st_mtime_ns
+    metadata = read_compiled_metadata(metadata_path)
+    if metadata is not None and metadata['source_mtime_ns'] == mtime_ns and os.path.exists(compiled_path):
+        return map_compiled(compiled_path)
+    with open(source_path, 'rb') as file:
+        source = file.read()
+    if metadata is not None and metadata['source_sha1'] == hashlib.sha1(source).hexdigest() and \
+            os.path.exists(compiled_path):
+        metadata['source_mtime_ns'] = mtime_ns
+        write_atomically(metadata_path, json.dumps(metadata, indent=2).encode())
+        return map_compiled(compiled_path)
+    compiled = compile_source(source.decode().splitlines())
+    try:
+        os.makedirs(os.path.dirname(compiled_path), exist_ok=True)
+        buffer = io.BytesIO()
+        np.save(buffer, compiled)
+        write_atomically(compiled_path, buffer.getvalue())
+        write_atomically(metadata_path, json.dumps(compiled_metadata(compiled, source, mtime_ns), indent=2).encode())
+    except OSError as e:
+        verbose_logger.warning(f"Compiled arena {compiled_path} could not be written: {repr(e)}.")
+        return compiled
+    return map_compiled(compiled_path)
+
+
+def map_compiled(path: str) -> np.ndarray:
+    # a plain array over the mapping, indexing `np.memmap` itself goes through Python on every access
+    return np.load(path, mmap_mode='r').view(np.ndarray)
+
+
+def read_compiled_metadata(path: str) -> Optional[dict]:
+    """ Metadata of a compiled arena, or None if it is missing or was written by another format or tile registry. """
+    try:
+        with open(path) as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if metadata.get('version') != COMPILED_FORMAT_VERSION or metadata.get('weapons') != list(WEAPON_ENCODING):
+        return None
+    if metadata.get('tile_types') != grids.TYPE_NAMES[:len(metadata.get('tile_types', []))]:
+        return None
+    return metadata
+
+
+def write_atomically(path: str, content: bytes) -> None:
+    """ Writes a temporary file unique to this call next to `path`, then renames it, so concurrent writers never mix. """
+    descriptor, temporary_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                                  dir=os.path.dirname(path))
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_path)
+        raise
+
+
+def preload(names: Iterable[str]) -> None:
+    for name in names:
+        template(name)
+
+
+def template(name: str) -> Arena:
+    """ Parsed arena shared by all games played on it in this process; it is only ever forked, never played on.
+
+    Forks share its terrain arrays, tile descriptions, fields of view and mist rings, while copying the cell state.
+    It is loaded from the memory-mapped compiled file of the arena.
+    """
+    arena = ARENA_TEMPLATES.get(name)
+    if arena is None:
+        arena = Arena.from_compiled(name, load_compiled(name))
+        xs, ys = np.nonzero(arena.terrain.present)
+        arena.terrain.descriptions(xs, ys)
+        ARENA_TEMPLATES[name] = arena
+    return arena
+
+
+def invalidate(names: Optional[Iterable[str]] = None) -> None:
+    """ Drops cached templates of the given arenas, or of all of them, e.g. after their files changed.
+
+    Knowledge encoders are cached for any arena, so all of them are dropped.
+    """
+    from gupb.model import encoders
+    for name in list(ARENA_TEMPLATES if names is None else names):
+        ARENA_TEMPLATES.pop(name, None)
+    encoders.KnowledgeEncoder.for_arena.cache_clear()
+
+
 def terrain_size(terrain: Terrain) -> tuple[int, int]:
+    if isinstance(terrain, grids.TerrainGrid):
+        return terrain.size
     estimated_x_size, estimated_y_size = max(terrain)
     return estimated_x_size + 1, estimated_y_size + 1
 
@@ -1,4 +1,6 @@
 from __future__ import annotations
+from concurrent import futures
+import copy
 from dataclasses import dataclass
 from enum import Enum
 from functools import partial
@@ -12,6 +14,8 @@ from gupb.model import arenas
 from gupb.model import coordinates
 from gupb.model import consumables
 from gupb.model import tiles
+from gupb.model import profiling
+from gupb.model import watchdogs
 from gupb.model import weapons
 
 verbose_logger = logging.getLogger('verbose')
@@ -72,6 +76,13 @@ class Champion:
         self.previous_facing: Facing = self.facing
         self.previous_position: coordinates.Coords = self.position
         self.time_idle: int = 0
+        self.watchdog: Optional[watchdogs.DecisionWatchdog] = None
+
+    def fork(self, arena: arenas.Arena) -> Champion:
+        forked = copy.copy(self)
+        forked.arena = arena
+        forked.weapon = copy.copy(self.weapon)
+        return forked
 
     def assign_controller(self, assigned_controller: controller.Controller) -> None:
         self.controller = assigned_controller
@@ -83,13 +94,14 @@ class Champion:
     def verbose_name(self) -> str:
         return self.controller.name if self.controller else "NULL_CONTROLLER"
 
-    def act(self) -> None:
+    def act(self, decision: Optional[futures.Future] = None) -> None:
         if self.alive:
-            verbose_logger.debug(f"Champion {self.verbose_name()} starts acting.")
+            verbose_logger.debug("Champion %s starts acting.", self.verbose_name())
             self.store_previous_state()
-            action = self.pick_action()
-            verbose_logger.debug(f"Champion {self.verbose_name()} picked action {action}.")
-            ChampionPickedActionReport(self.verbose_name(), action.name).log(logging.DEBUG)
+            action = self.pick_action(decision)
+            verbose_logger.debug("Champion %s picked action %s.", self.verbose_name(), action)
+            if logger_core.EVENT_BUS.wants(ChampionPickedActionReport):
+                ChampionPickedActionReport(self.verbose_name(), action.name).log(logging.DEBUG)
             action(self)
             self.arena.stay(self)
             self.assess_idle_penalty()
@@ -104,40 +116,56 @@ class Champion:
         else:
             self.time_idle = 0
         if self.time_idle >= PENALISED_IDLE_TIME:
-            verbose_logger.debug(f"Champion {self.verbose_name()} penalised for idle time.")
+            verbose_logger.debug("Champion %s penalised for idle time.", self.verbose_name())
             IdlePenaltyReport(self.verbose_name()).log(logging.DEBUG)
             self.damage(IDLE_DAMAGE_PENALTY)
 
+    def knowledge(self) -> ChampionKnowledge:
+        visible_tiles = self.arena.visible_tiles(self)
+        return ChampionKnowledge(self.position, self.arena.no_of_champions_alive, visible_tiles)
+
+    def decide(self, knowledge: ChampionKnowledge) -> Action:
+        token = profiling.CONTROLLER.set(self.controller.name)
+        try:
+            if self.watchdog:
+                return self.watchdog.decide(self.controller, knowledge)
+            return self.controller.decide(knowledge)
+        finally:
+            profiling.CONTROLLER.reset(token)
+
     # noinspection PyBroadException
-    def pick_action(self) -> Action:
+    def pick_action(self, decision: Optional[futures.Future] = None) -> Action:
         if self.controller:
-            visible_tiles = self.arena.visible_tiles(self)
-            knowledge = ChampionKnowledge(self.position, self.arena.no_of_champions_alive, visible_tiles)
             try:
-                action = self.controller.decide(knowledge)
+                action = decision.result() if decision is not None else self.decide(self.knowledge())
                 if action is None:
-                    verbose_logger.warning(f"Controller {self.verbose_name()} returned a non-action.")
+                    verbose_logger.warning("Controller %s returned a non-action.", self.verbose_name())
                     controller.ControllerExceptionReport(self.verbose_name(), "a non-action returned").log(logging.WARN)
                     return Action.DO_NOTHING
                 return action
             except Exception as e:
-                verbose_logger.warning(f"Controller {self.verbose_name()} throw an unexpected exception: {repr(e)}. {e.__traceback__}")
+                verbose_logger.warning(
+                    "Controller %s throw an unexpected exception: %r. %s", self.verbose_name(), e, e.__traceback__)
                 controller.ControllerExceptionReport(self.verbose_name(), repr(e)).log(logging.WARN)
                 return Action.DO_NOTHING
         else:
-            verbose_logger.warning(f"Controller {self.verbose_name()} was non-existent.")
+            verbose_logger.warning("Controller %s was non-existent.", self.verbose_name())
             controller.ControllerExceptionReport(self.verbose_name(), "controller non-existent").log(logging.WARN)
             return Action.DO_NOTHING
 
     def turn_left(self) -> None:
         self.facing = self.facing.turn_left()
-        verbose_logger.debug(f"Champion {self.controller.name} is now facing {self.facing}.")
-        ChampionFacingReport(self.controller.name, self.facing.value).log(logging.DEBUG)
+        self.arena.terrain.invalidate_description(*self.position)
+        verbose_logger.debug("Champion %s is now facing %s.", self.controller.name, self.facing)
+        if logger_core.EVENT_BUS.wants(ChampionFacingReport):
+            ChampionFacingReport(self.controller.name, self.facing.value).log(logging.DEBUG)
 
     def turn_right(self) -> None:
         self.facing = self.facing.turn_right()
-        verbose_logger.debug(f"Champion {self.controller.name} is now facing {self.facing}.")
-        ChampionFacingReport(self.controller.name, self.facing.value).log(logging.DEBUG)
+        self.arena.terrain.invalidate_description(*self.position)
+        verbose_logger.debug("Champion %s is now facing %s.", self.controller.name, self.facing)
+        if logger_core.EVENT_BUS.wants(ChampionFacingReport):
+            ChampionFacingReport(self.controller.name, self.facing.value).log(logging.DEBUG)
 
     def step_forward(self) -> None:
         self.arena.step(self, arenas.StepDirection.FORWARD)
@@ -153,8 +181,10 @@ class Champion:
 
     def attack(self) -> None:
         self.weapon.cut(self.arena, self.position, self.facing)
-        verbose_logger.debug(f"Champion {self.controller.name} attacked with its {self.weapon.description().name}.")
-        ChampionAttackReport(self.controller.name, self.weapon.description().name).log(logging.DEBUG)
+        self.arena.terrain.invalidate_description(*self.position)
+        verbose_logger.debug("Champion %s attacked with its %s.", self.controller.name, self.weapon.description().name)
+        if logger_core.EVENT_BUS.wants(ChampionAttackReport):
+            ChampionAttackReport(self.controller.name, self.weapon.description().name).log(logging.DEBUG)
 
     def do_nothing(self) -> None:
         pass
@@ -162,8 +192,11 @@ class Champion:
     def damage(self, wounds: int) -> None:
         self.health -= wounds
         self.health = self.health if self.health > 0 else 0
-        verbose_logger.debug(f"Champion {self.controller.name} took {wounds} wounds, it has now {self.health} hp left.")
-        ChampionWoundsReport(self.controller.name, wounds, self.health).log(logging.DEBUG)
+        self.arena.terrain.invalidate_description(*self.position)
+        verbose_logger.debug(
+            "Champion %s took %d wounds, it has now %d hp left.", self.controller.name, wounds, self.health)
+        if logger_core.EVENT_BUS.wants(ChampionWoundsReport):
+            ChampionWoundsReport(self.controller.name, wounds, self.health).log(logging.DEBUG)
         if not self.alive:
             self.die()
 
@@ -171,7 +204,7 @@ class Champion:
         self.arena.terrain[self.position].character = None
         self.arena.terrain[self.position].consumable = consumables.Potion()
         self.arena.terrain[self.position].loot = self.weapon if self.weapon.droppable() else None
-        verbose_logger.debug(f"Champion {self.controller.name} died.")
+        verbose_logger.debug("Champion %s died.", self.controller.name)
         ChampionDeathReport(self.controller.name).log(logging.DEBUG)
 
         die_callable = getattr(self.controller, "die", None)
@@ -1,21 +1,73 @@
+import threading
 from typing import NamedTuple
 
+import numpy as np
+
 Coords = NamedTuple('Coords', [('x', int), ('y', int)])
 
+MAX_INTERNED_EXTENT: int = 256
+
+# flyweight coordinates of cells within a square of the given extent, indexed by `y * extent + x`; the extent and the
+# table are replaced together in a single assignment, so a reader on another thread never pairs a table with a wrong one
+INTERNED: tuple[int, list[Coords]] = (0, [])
+
+_RESERVE_LOCK = threading.Lock()
+
+
+def reserve(size: tuple[int, int]) -> None:
+    """ Interns coordinates of every cell of an arena of the given size, up to `MAX_INTERNED_EXTENT` on a side. """
+    global INTERNED
+    extent = min(max(size), MAX_INTERNED_EXTENT)
+    with _RESERVE_LOCK:
+        old_extent, old_table = INTERNED
+        if extent > old_extent:
+            INTERNED = (extent, [
+                old_table[y * old_extent + x] if x < old_extent and y < old_extent else Coords(x, y)
+                for y in range(extent) for x in range(extent)
+            ])
+
+
+def interned(x: int, y: int) -> Coords:
+    extent, table = INTERNED
+    if 0 <= x < extent and 0 <= y < extent and type(x) is int and type(y) is int:
+        return table[y * extent + x]
+    return Coords(x, y)
+
+
+def interned_cells(xs: np.ndarray, ys: np.ndarray) -> list[Coords]:
+    """ Coordinates of cells given by arrays of non-negative coordinates, interned if all are within the table. """
+    extent, table = INTERNED
+    if len(xs) and (xs.max() >= extent or ys.max() >= extent):
+        return [Coords(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    return list(map(table.__getitem__, (ys * extent + xs).tolist()))
+
+
+def cell_id(x: int, y: int, width: int) -> int:
+    return y * width + x
+
 
+# `interned` is inlined in the arithmetic on purpose, coordinates are added in the hottest loops of the engine
 def add_coords(self: Coords, other: Coords) -> Coords:
-    return Coords(self[0] + other[0], self[1] + other[1])
+    x, y = self[0] + other[0], self[1] + other[1]
+    extent, table = INTERNED
+    if 0 <= x < extent and 0 <= y < extent and type(x) is int and type(y) is int:
+        return table[y * extent + x]
+    return Coords(x, y)
 
 
 def sub_coords(self: Coords, other: Coords) -> Coords:
-    return Coords(self[0] - other[0], self[1] - other[1])
+    x, y = self[0] - other[0], self[1] - other[1]
+    extent, table = INTERNED
+    if 0 <= x < extent and 0 <= y < extent and type(x) is int and type(y) is int:
+        return table[y * extent + x]
+    return Coords(x, y)
 
 
 def mul_coords(self: Coords, other) -> Coords:
     if isinstance(other, int):
-        return Coords(self[0] * other, self[1] * other)
+        return interned(self[0] * other, self[1] * other)
     elif isinstance(other, float):
-        return Coords(int(self[0] * other), int(self[1] * other))
+        return interned(int(self[0] * other), int(self[1] * other))
     else:
         raise NotImplementedError
 
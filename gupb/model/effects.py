@@ -59,7 +59,7 @@ class Mist(Effect):
     @staticmethod
     def stay(champion: characters.Champion) -> None:
         if champion:
-            verbose_logger.debug(f"Champion {champion.controller.name} was damaged by deadly mist.")
+            verbose_logger.debug("Champion %s was damaged by deadly mist.", champion.controller.name)
             ChampionDamagedByMistReport(champion.controller.name, MIST_DAMAGE).log(logging.DEBUG)
             champion.damage(MIST_DAMAGE)
 
@@ -74,7 +74,7 @@ class WeaponCut(Effect):
 
     def instant(self, champion: characters.Champion) -> None:
         if champion:
-            verbose_logger.debug(f"Champion {champion.controller.name} was damaged by weapon cut.")
+            verbose_logger.debug("Champion %s was damaged by weapon cut.", champion.controller.name)
             ChampionDamagedByWeaponCutReport(champion.controller.name, self.damage).log(logging.DEBUG)
             champion.damage(self.damage)
 
@@ -91,7 +91,7 @@ class Fire(Effect):
     @staticmethod
     def burn(champion: characters.Champion) -> None:
         if champion:
-            verbose_logger.debug(f"Champion {champion.controller.name} was damaged by fire.")
+            verbose_logger.debug("Champion %s was damaged by fire.", champion.controller.name)
             ChampionDamagedByFireReport(champion.controller.name, FIRE_DAMAGE).log(logging.DEBUG)
             champion.damage(FIRE_DAMAGE)
 
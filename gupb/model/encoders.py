@@ -0,0 +1,138 @@
+from __future__ import annotations
+import functools
+import itertools
+from typing import Optional, Sequence
+
+import numpy as np
+
+from gupb.model import arenas
+from gupb.model import characters
+from gupb.model import tiles
+
+TERRAIN_TYPES: tuple[str, ...] = ('land', 'sea', 'wall', 'forest', 'menhir')
+WEAPON_NAMES: tuple[str, ...] = ('knife', 'sword', 'axe', 'bow_loaded', 'bow_unloaded', 'amulet', 'scroll')
+CONSUMABLE_NAMES: tuple[str, ...] = ('potion',)
+EFFECT_TYPES: tuple[str, ...] = ('mist', 'weaponcut', 'fire')
+FACINGS: tuple[characters.Facing, ...] = tuple(characters.Facing)
+
+CHANNELS: tuple[str, ...] = (
+    'visible',
+    *(f'terrain:{name}' for name in TERRAIN_TYPES),
+    *(f'loot:{name}' for name in WEAPON_NAMES),
+    *(f'consumable:{name}' for name in CONSUMABLE_NAMES),
+    'champion',
+    'enemy',
+    'health',
+    *(f'facing:{facing.name.lower()}' for facing in FACINGS),
+    *(f'weapon:{name}' for name in WEAPON_NAMES),
+    *(f'effect:{name}' for name in EFFECT_TYPES),
+)
+CHANNEL_INDEX: dict[str, int] = {name: i for i, name in enumerate(CHANNELS)}
+ENEMY_CHANNEL: int = CHANNEL_INDEX['enemy']
+
+MAX_CACHED_DESCRIPTIONS: int = 1 << 16
+
+
+def tile_features(description: tiles.TileDescription) -> np.ndarray:
+    features = np.zeros(len(CHANNELS), dtype=np.float32)
+    features[CHANNEL_INDEX['visible']] = 1.0
+    features[CHANNEL_INDEX[f'terrain:{description.type}']] = 1.0
+    if description.loot:
+        features[CHANNEL_INDEX[f'loot:{description.loot.name}']] = 1.0
+    if description.consumable:
+        features[CHANNEL_INDEX[f'consumable:{description.consumable.name}']] = 1.0
+    if description.character:
+        features[CHANNEL_INDEX['champion']] = 1.0
+        features[ENEMY_CHANNEL] = 1.0
+        # potions heal past the starting health, which is where the observation space ends
+        health = description.character.health / characters.CHAMPION_STARTING_HP
+        features[CHANNEL_INDEX['health']] = min(max(health, 0.0), 1.0)
+        features[CHANNEL_INDEX[f'facing:{description.character.facing.name.lower()}']] = 1.0
+        features[CHANNEL_INDEX[f'weapon:{description.character.weapon.name}']] = 1.0
+    for effect in description.effects:
+        features[CHANNEL_INDEX[f'effect:{effect.type}']] = 1.0
+    return features
+
+
+class KnowledgeEncoder:
+    """ Writes `ChampionKnowledge` into float32 arrays shaped `(len(CHANNELS), height, width)`, indexed `[c, y, x]`.
+
+    With a `sight_radius` the array is a window centred on the champion, otherwise it covers the whole arena.
+    Tile descriptions are shared by all tiles of the same content, so the features of each distinct description are
+    computed once and looked up afterwards; the champion itself is not marked as an enemy.
+    """
+
+    def __init__(self, size: tuple[int, int], sight_radius: Optional[int] = None) -> None:
+        self.size: tuple[int, int] = size
+        self.sight_radius: Optional[int] = sight_radius
+        if sight_radius is None:
+            self.shape: tuple[int, int, int] = (len(CHANNELS), size[1], size[0])
+        else:
+            self.shape = (len(CHANNELS), 2 * sight_radius + 1, 2 * sight_radius + 1)
+        self.buffer: np.ndarray = np.zeros(self.shape, dtype=np.float32)
+        self._rows: dict[tiles.TileDescription, int] = {}
+        self._table: np.ndarray = np.zeros((64, len(CHANNELS)), dtype=np.float32)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def for_arena(arena_name: str, sight_radius: Optional[int] = None) -> KnowledgeEncoder:
+        return KnowledgeEncoder(arenas.Arena.load(arena_name).terrain.size, sight_radius)
+
+    def encode(self, knowledge: characters.ChampionKnowledge, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = self.buffer if out is None else out
+        self.encode_batch([knowledge], out[None])
+        return out
+
+    def encode_batch(
+            self,
+            knowledges: Sequence[characters.ChampionKnowledge],
+            out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        out = np.zeros((len(knowledges),) + self.shape, dtype=np.float32) if out is None else out
+        out.fill(0.0)
+        if len(self._rows) >= MAX_CACHED_DESCRIPTIONS:
+            self._rows = {}
+        counts = [len(knowledge.visible_tiles) for knowledge in knowledges]
+        total = sum(counts)
+        if not total:
+            return out
+        coords = np.fromiter(
+            itertools.chain.from_iterable(
+                itertools.chain.from_iterable(knowledge.visible_tiles.keys()) for knowledge in knowledges
+            ),
+            dtype=np.int64,
+            count=2 * total,
+        ).reshape(total, 2)
+        descriptions = list(
+            itertools.chain.from_iterable(knowledge.visible_tiles.values() for knowledge in knowledges)
+        )
+        row_list = list(map(self._rows.get, descriptions))
+        if None in row_list:
+            row_list = [self._row(description) for description in descriptions]
+        rows = np.array(row_list, dtype=np.intp)
+        samples = np.repeat(np.arange(len(knowledges)), counts)
+        positions = np.array([knowledge.position for knowledge in knowledges], dtype=np.int64).reshape(-1, 2)
+        xs, ys = coords[:, 0], coords[:, 1]
+        if self.sight_radius is not None:
+            xs = xs - positions[samples, 0] + self.sight_radius
+            ys = ys - positions[samples, 1] + self.sight_radius
+        inside = (xs >= 0) & (xs < self.shape[2]) & (ys >= 0) & (ys < self.shape[1])
+        if not inside.all():
+            samples, xs, ys, rows = samples[inside], xs[inside], ys[inside], rows[inside]
+        out[samples, :, ys, xs] = self._table[rows]
+        own_xs, own_ys = (
+            (positions[:, 0], positions[:, 1]) if self.sight_radius is None
+            else (np.full(len(knowledges), self.sight_radius), np.full(len(knowledges), self.sight_radius))
+        )
+        out[np.arange(len(knowledges)), ENEMY_CHANNEL, own_ys, own_xs] = 0.0
+        return out
+
+    def _row(self, description: tiles.TileDescription) -> int:
+        row = self._rows.get(description)
+        if row is None:
+            row = len(self._rows)
+            if row >= len(self._table):
+                self._table = np.concatenate((self._table, np.zeros_like(self._table)))
+            self._table[row] = tile_features(description)
+            self._rows[description] = row
+        return row
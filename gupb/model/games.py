@@ -1,17 +1,24 @@
 from __future__ import annotations
+from concurrent import futures
+import contextlib
 from dataclasses import dataclass
 import logging
 import random
-from typing import Iterator, NamedTuple, Optional
+from typing import Callable, ContextManager, Iterator, NamedTuple, Optional
 
+import numpy as np
 # noinspection PyPackageRequirements
 import statemachine
+from statemachine import model as statemachine_model
 
 from gupb import controller
 from gupb.logger import core as logger_core
 from gupb.model import arenas
 from gupb.model import characters
 from gupb.model import coordinates
+from gupb.model import profiling
+from gupb.model import randomness
+from gupb.model import watchdogs
 
 verbose_logger = logging.getLogger('verbose')
 
@@ -19,6 +26,19 @@ MIST_TTH_PER_CHAMPION: int = 2
 
 ChampionDeath = NamedTuple('ChampionDeath', [('champion', characters.Champion), ('episode', int)])
 
+Policy = Callable[[characters.ChampionKnowledge], characters.Action]
+
+
+class GameState(NamedTuple):
+    arena: arenas.Arena
+    champions: list[characters.Champion]
+    action_queue: list[characters.Champion]
+    deaths: list[ChampionDeath]
+    episode: int
+    episodes_since_mist_increase: int
+    finished: bool
+    state_value: int
+
 
 class Game(statemachine.StateMachine):
     actions_done = statemachine.State('ActionsDone', value=9, initial=True)
@@ -33,8 +53,16 @@ class Game(statemachine.StateMachine):
             to_spawn: list[controller.Controller],
             menhir_position: Optional[coordinates.Coords] = None,
             initial_champion_positions: Optional[list[coordinates.Coords]] = None,
+            watchdog: Optional[watchdogs.DecisionWatchdog] = None,
+            decision_executor: Optional[futures.Executor] = None,
     ) -> None:
         self.game_no: int = game_no
+        profiling.CURRENT_GAME = game_no
+        self.watchdog: Optional[watchdogs.DecisionWatchdog] = watchdog
+        self.decision_executor: Optional[futures.Executor] = decision_executor
+        self.decisions: Optional[dict[characters.Champion, futures.Future]] = None
+        if self.watchdog:
+            self.watchdog.start_game()
         self.arena: arenas.Arena = arenas.Arena.load(arena_name)
         self.arena.spawn_menhir(menhir_position)
         self._prepare_controllers(to_spawn)
@@ -43,24 +71,74 @@ class Game(statemachine.StateMachine):
         self.action_queue: list[characters.Champion] = []
         self.episode: int = 0
         self.episodes_since_mist_increase: int = 0
+        self.actions_no: int = 0
         self.deaths: list[ChampionDeath] = []
         self.finished = False
+        self.muted = False
         super().__init__()
 
     def on_enter_actions_done(self) -> None:
-        if not self.action_queue:
-            self._environment_action()
-        else:
-            self._champion_action()
+        with self._logging():
+            if not self.action_queue:
+                self._environment_action()
+            else:
+                self._champion_action()
 
     def on_enter_instants_triggered(self):
-        self.arena.trigger_instants()
+        with self._logging():
+            self.arena.trigger_instants()
+
+    def run_to_completion(self) -> None:
+        """ Plays the rest of the game headlessly, making the same moves as cycling to the end without transitions. """
+        with self._logging():
+            if not self.finished and self.current_state_value == self.instants_triggered.value:
+                self.on_enter_actions_done()
+            while not self.finished:
+                self.arena.trigger_instants()
+                self.on_enter_actions_done()
+        self.current_state_value = self.actions_done.value
+
+    def snapshot(self) -> GameState:
+        return copy_state(self._state())
+
+    def restore(self, snapshot: GameState) -> None:
+        self._load_state(copy_state(snapshot))
+
+    def fork(self, policies: Optional[dict[str, Policy]] = None) -> Game:
+        """ Independent, muted copy of the game, with controllers replaced by policies given per controller name.
+
+        The terrain is shared with the original until either game changes it, champions without a policy do nothing.
+        """
+        policies = policies if policies else {}
+        forked = Game.__new__(Game)
+        forked.game_no = self.game_no
+        forked.actions_no = self.actions_no
+        forked.watchdog = None
+        forked.decision_executor = self.decision_executor
+        forked.initial_champion_positions = self.initial_champion_positions
+        forked.muted = True
+        machine_model = statemachine_model.Model()
+        machine_model.state = self.current_state_value
+        statemachine.StateMachine.__init__(forked, machine_model)
+        forked._load_state(self.snapshot())
+        for champion in set(forked.champions + forked.action_queue + [death.champion for death in forked.deaths]):
+            name = champion.controller.name
+            champion.controller = PolicyController(name, policies.get(name, idle), champion.tabard)
+            champion.watchdog = None
+        return forked
 
     def score(self) -> dict[controller.Controller, int]:
         if not self.finished:
             raise RuntimeError("Attempted to score an unfinished game!")
         return {death.champion.controller: score for death, score in zip(self.deaths, self._fibonacci())}
 
+    def champion_score(self, champion: characters.Champion) -> Optional[int]:
+        """ Final score of a champion, known as soon as it leaves the game, even when the game is not finished. """
+        for death, score in zip(self.deaths, self._fibonacci()):
+            if death.champion is champion:
+                return score
+        return None
+
     def _prepare_controllers(self, to_spawn: list[controller.Controller]):
         for controller_to_spawn in to_spawn:
             controller_to_spawn.reset(self.game_no, self.arena.description())
@@ -71,24 +149,26 @@ class Game(statemachine.StateMachine):
     ) -> list[characters.Champion]:
         champions = []
         if self.initial_champion_positions is None:
-            self.initial_champion_positions = random.sample(self.arena.empty_coords(), len(to_spawn))
+            self.initial_champion_positions = random.sample(self.arena.terrain.empty_cells, len(to_spawn))
         if len(to_spawn) != len(self.initial_champion_positions):
             raise RuntimeError("Unable to spawn champions: not enough positions!")  # TODO: remove if works
         for controller_to_spawn, coords in zip(to_spawn, self.initial_champion_positions):
             champion = self.arena.spawn_champion_at(coords)
             champion.assign_controller(controller_to_spawn)
+            champion.watchdog = self.watchdog
             champions.append(champion)
-            verbose_logger.debug(f"{champion.tabard.value} champion for {controller_to_spawn.name}"
-                                 f" spawned at {coords} facing {champion.facing}.")
+            verbose_logger.debug("%s champion for %s spawned at %s facing %s.",
+                                 champion.tabard.value, controller_to_spawn.name, coords, champion.facing)
             ChampionSpawnedReport(controller_to_spawn.name, coords, champion.facing.value).log(logging.DEBUG)
         return champions
 
     def _environment_action(self) -> None:
         self._clean_dead_champions()
         self.action_queue = self.champions.copy()
+        self.decisions = None
         self.episode += 1
         self.episodes_since_mist_increase += 1
-        verbose_logger.debug(f"Starting episode {self.episode}.")
+        verbose_logger.debug("Starting episode %d.", self.episode)
         EpisodeStartReport(self.episode).log(logging.DEBUG)
         if self.episodes_since_mist_increase >= MIST_TTH_PER_CHAMPION * len(self.champions):
             self.arena.increase_mist()
@@ -105,7 +185,7 @@ class Game(statemachine.StateMachine):
                 self.arena.no_of_champions_alive -= 1
         self.champions = alive
         if len(self.champions) == 1:
-            verbose_logger.debug(f"Champion {self.champions[0].controller.name} was the last one standing.")
+            verbose_logger.debug("Champion %s was the last one standing.", self.champions[0].controller.name)
             LastManStandingReport(self.champions[0].controller.name).log(logging.DEBUG)
             champion = self.champions.pop()
             death = ChampionDeath(champion, self.episode)
@@ -118,9 +198,53 @@ class Game(statemachine.StateMachine):
         if not self.champions:
             self.finished = True
 
+    def _state(self) -> GameState:
+        return GameState(
+            self.arena,
+            self.champions,
+            self.action_queue,
+            self.deaths,
+            self.episode,
+            self.episodes_since_mist_increase,
+            self.finished,
+            self.current_state_value,
+        )
+
+    def _load_state(self, state: GameState) -> None:
+        self.arena = state.arena
+        self.champions = state.champions
+        self.action_queue = state.action_queue
+        self.deaths = state.deaths
+        self.episode = state.episode
+        self.episodes_since_mist_increase = state.episodes_since_mist_increase
+        self.finished = state.finished
+        self.current_state_value = state.state_value
+        self.decisions = None
+
+    def _logging(self) -> ContextManager:
+        return logger_core.muted() if self.muted else contextlib.nullcontext()
+
     def _champion_action(self) -> None:
+        if self.decision_executor is not None and self.decisions is None:
+            self.decisions = self._decide_simultaneously()
         champion = self.action_queue.pop()
-        champion.act()
+        self.actions_no += 1
+        champion.act(self.decisions.pop(champion, None) if self.decisions is not None else None)
+
+    def _decide_simultaneously(self) -> dict[characters.Champion, futures.Future]:
+        """ Gathers the knowledge of all champions about to act from the same state and lets them decide concurrently.
+
+        Decisions are then applied one by one in the order of the action queue, just like in the sequential mode.
+        Each decision draws random numbers from its own generators, seeded from the game's generator in the order of
+        the queue, so seeded games play the same whichever decision threads pick the decisions up.
+        """
+        deciding = [champion for champion in self.action_queue if champion.alive and champion.controller]
+        knowledge = [champion.knowledge() for champion in deciding]
+        seeds = [random.getrandbits(32) for _ in deciding]
+        return {
+            champion: self.decision_executor.submit(decide_seeded, champion, champion_knowledge, seed)
+            for champion, champion_knowledge, seed in zip(deciding, knowledge, seeds)
+        }
 
     @staticmethod
     def _fibonacci() -> Iterator[int]:
@@ -133,6 +257,72 @@ class Game(statemachine.StateMachine):
             a, b = b, (a / 2.2) + b
 
 
+def copy_state(state: GameState) -> GameState:
+    arena = state.arena.fork()
+    forks: dict[characters.Champion, characters.Champion] = {}
+
+    def fork_champion(champion: characters.Champion) -> characters.Champion:
+        if champion not in forks:
+            forks[champion] = champion.fork(arena)
+        return forks[champion]
+
+    occupied_xs, occupied_ys = np.nonzero(np.not_equal(arena.terrain.characters, None))
+    for x, y in zip(occupied_xs.tolist(), occupied_ys.tolist()):
+        arena.terrain.characters[x, y] = fork_champion(arena.terrain.characters[x, y])
+    return GameState(
+        arena,
+        [fork_champion(champion) for champion in state.champions],
+        [fork_champion(champion) for champion in state.action_queue],
+        [ChampionDeath(fork_champion(death.champion), death.episode) for death in state.deaths],
+        state.episode,
+        state.episodes_since_mist_increase,
+        state.finished,
+        state.state_value,
+    )
+
+
+def decide_seeded(
+        champion: characters.Champion,
+        knowledge: characters.ChampionKnowledge,
+        seed: int,
+) -> characters.Action:
+    token = profiling.WAITED_FOR.set(True)
+    try:
+        with randomness.seeded(seed):
+            return champion.decide(knowledge)
+    finally:
+        profiling.WAITED_FOR.reset(token)
+
+
+def idle(knowledge: characters.ChampionKnowledge) -> characters.Action:
+    return characters.Action.DO_NOTHING
+
+
+# noinspection PyUnusedLocal
+class PolicyController(controller.Controller):
+    def __init__(self, name: str, policy: Policy, tabard: Optional[characters.Tabard] = None) -> None:
+        self._name: str = name
+        self.policy: Policy = policy
+        self.tabard: Optional[characters.Tabard] = tabard
+
+    def decide(self, knowledge: characters.ChampionKnowledge) -> characters.Action:
+        return self.policy(knowledge)
+
+    def praise(self, score: int) -> None:
+        pass
+
+    def reset(self, game_no: int, arena_description: arenas.ArenaDescription) -> None:
+        pass
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def preferred_tabard(self) -> characters.Tabard:
+        return self.tabard
+
+
 @dataclass(frozen=True)
 class ChampionSpawnedReport(logger_core.LoggingMixin):
     controller_name: str
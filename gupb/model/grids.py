@@ -0,0 +1,331 @@
+from __future__ import annotations
+import copy
+from typing import Iterable, Iterator, MutableMapping, Optional, Sequence, Type
+
+import numpy as np
+import sortedcontainers
+
+from gupb.model import characters
+from gupb.model import consumables
+from gupb.model import coordinates
+from gupb.model import effects
+from gupb.model import tiles
+from gupb.model import weapons
+
+VOID: int = 255
+
+TILE_TYPES: list[Type[tiles.Tile]] = []
+TILE_TYPE_CODES: dict[Type[tiles.Tile], int] = {}
+TYPE_NAMES: list[str] = []
+TYPE_PASSABLE = np.zeros(VOID + 1, dtype=bool)
+TYPE_TRANSPARENT = np.zeros(VOID + 1, dtype=bool)
+TYPE_SOLID = np.zeros(VOID + 1, dtype=bool)
+
+
+def tile_type_code(tile_type: Type[tiles.Tile]) -> int:
+    if tile_type not in TILE_TYPE_CODES:
+        code = len(TILE_TYPES)
+        if code >= VOID:
+            raise RuntimeError("Too many tile types registered!")
+        TILE_TYPES.append(tile_type)
+        TYPE_NAMES.append(tile_type.__name__.lower())
+        TILE_TYPE_CODES[tile_type] = code
+        TYPE_PASSABLE[code] = tile_type.terrain_passable()
+        TYPE_TRANSPARENT[code] = tile_type.terrain_transparent()
+        TYPE_SOLID[code] = tile_type.terrain_solid()
+    return TILE_TYPE_CODES[tile_type]
+
+
+TERRAIN_ARRAYS: tuple[str, ...] = ('types', 'present', 'terrain_passable', 'terrain_transparent', 'terrain_solid')
+
+
+class CellIndex(Sequence[coordinates.Coords]):
+    """ Set of cells with O(1) insertion, removal and random access, so it can be sampled with `random` directly.
+
+    Cells of a grid `width` wide are keyed by their packed ids, `y * width + x`.
+    """
+
+    def __init__(self, width: int, cells: Iterable[coordinates.Coords] = ()) -> None:
+        self.width: int = width
+        self._cells: list[coordinates.Coords] = list(cells)
+        self._positions: dict[int, int] = {
+            coordinates.cell_id(x, y, width): i for i, (x, y) in enumerate(self._cells)
+        }
+
+    def add(self, coords: coordinates.Coords) -> None:
+        cell = coordinates.cell_id(coords[0], coords[1], self.width)
+        if cell not in self._positions:
+            self._positions[cell] = len(self._cells)
+            self._cells.append(coords)
+
+    def discard(self, coords: coordinates.Coords) -> None:
+        position = self._positions.pop(coordinates.cell_id(coords[0], coords[1], self.width), None)
+        if position is not None:
+            last = self._cells.pop()
+            if position < len(self._cells):
+                self._cells[position] = last
+                self._positions[coordinates.cell_id(last[0], last[1], self.width)] = position
+
+    def copy(self) -> CellIndex:
+        index = CellIndex(self.width)
+        index._cells, index._positions = self._cells.copy(), self._positions.copy()
+        return index
+
+    def __contains__(self, coords: object) -> bool:
+        try:
+            x, y = coords
+        except (TypeError, ValueError):
+            return False
+        return 0 <= x < self.width and coordinates.cell_id(x, y, self.width) in self._positions
+
+    def __getitem__(self, i):
+        return self._cells[i]
+
+    def __iter__(self) -> Iterator[coordinates.Coords]:
+        return iter(self._cells)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+
+class TerrainGrid(MutableMapping[coordinates.Coords, 'tiles.Tile']):
+    """ Dense, array-backed terrain of an arena, indexed by `(x, y)`.
+
+    Static properties of the terrain (type, passability, transparency, solidity) and the mutable state of every cell
+    (loot, consumable, occupant and effects) are kept in NumPy arrays. The mapping interface hands out `Tile` views,
+    so the grid can be used wherever a `Coords -> Tile` dictionary was used before.
+    """
+
+    def __init__(self, size: tuple[int, int]) -> None:
+        coordinates.reserve(size)
+        self.size: tuple[int, int] = size
+        self.types = np.full(size, VOID, dtype=np.uint8)
+        self.present = np.zeros(size, dtype=bool)
+        self.terrain_passable = np.zeros(size, dtype=bool)
+        self.terrain_transparent = np.zeros(size, dtype=bool)
+        self.terrain_solid = np.zeros(size, dtype=bool)
+        self.passable = np.zeros(size, dtype=bool)
+        self.transparent = np.zeros(size, dtype=bool)
+        self.loot = np.full(size, None, dtype=object)
+        self.consumables = np.full(size, None, dtype=object)
+        self.characters = np.full(size, None, dtype=object)
+        self.effects = np.full(size, None, dtype=object)
+        self.transparency_version: int = 0
+        self._descriptions = np.full(size, None, dtype=object)
+        self._tiles: dict[coordinates.Coords, tiles.Tile] = {}
+        self._coords: Optional[list[coordinates.Coords]] = None
+        self._empty_cells: Optional[CellIndex] = None
+        self._shares_terrain: bool = False
+
+    @staticmethod
+    def detached(tile_type: Type[tiles.Tile]) -> TerrainGrid:
+        grid = TerrainGrid((1, 1))
+        grid.paint(np.ones((1, 1), dtype=bool), tile_type)
+        return grid
+
+    @staticmethod
+    def from_types(types: np.ndarray) -> TerrainGrid:
+        """ Grid over an array of tile type codes, which is used as is, e.g. memory-mapped, until the grid paints. """
+        grid = TerrainGrid(types.shape)
+        grid.types = types
+        grid.present = np.not_equal(types, VOID)
+        grid.terrain_passable = TYPE_PASSABLE[types]
+        grid.terrain_transparent = TYPE_TRANSPARENT[types]
+        grid.terrain_solid = TYPE_SOLID[types]
+        grid.passable = grid.terrain_passable.copy()
+        grid.transparent = grid.terrain_transparent.copy()
+        grid._shares_terrain = True
+        return grid
+
+    @staticmethod
+    def from_terrain(terrain: MutableMapping[coordinates.Coords, tiles.Tile]) -> TerrainGrid:
+        size = max(x for x, _ in terrain) + 1, max(y for _, y in terrain) + 1
+        grid = TerrainGrid(size)
+        for coords, tile in terrain.items():
+            grid[coords] = tile
+        return grid
+
+    def fork(self) -> TerrainGrid:
+        """ Copy of the grid sharing the terrain arrays until either side paints, with its own cell state. """
+        forked = copy.copy(self)
+        forked.passable, forked.transparent = self.passable.copy(), self.transparent.copy()
+        forked.loot = self.loot.copy()
+        for i in np.flatnonzero(np.not_equal(self.loot, None)).tolist():
+            forked.loot.flat[i] = copy.copy(self.loot.flat[i])
+        forked.consumables = self.consumables.copy()
+        forked.characters = self.characters.copy()
+        forked.effects = self.effects.copy()
+        for i in np.flatnonzero(np.not_equal(self.effects, None)).tolist():
+            forked.effects.flat[i] = self.effects.flat[i].copy()
+        forked._descriptions = self._descriptions.copy()
+        forked._tiles = {}
+        forked._empty_cells = self._empty_cells.copy() if self._empty_cells is not None else None
+        self._shares_terrain = forked._shares_terrain = True
+        return forked
+
+    def paint(self, mask: np.ndarray, tile_type: Type[tiles.Tile]) -> None:
+        self._own_terrain()
+        code = tile_type_code(tile_type)
+        if not (self.present[mask].all() and (self.terrain_transparent[mask] == TYPE_TRANSPARENT[code]).all()):
+            self.transparency_version += 1
+        self.types[mask] = code
+        self.present[mask] = True
+        self.terrain_passable[mask] = TYPE_PASSABLE[code]
+        self.terrain_transparent[mask] = TYPE_TRANSPARENT[code]
+        self.terrain_solid[mask] = TYPE_SOLID[code]
+        self._refresh_dynamic(mask)
+        self._descriptions[mask] = None
+        if self._empty_cells is not None:
+            for x, y in zip(*np.nonzero(mask)):
+                self._update_empty(int(x), int(y))
+        for coords in [coords for coords in self._tiles if mask[coords]]:
+            del self._tiles[coords]
+        self._coords = None
+
+    def tile_type(self, coords: coordinates.Coords) -> Type[tiles.Tile]:
+        return TILE_TYPES[self.types[coords[0], coords[1]]]
+
+    def set_character(self, x: int, y: int, character: Optional[characters.Champion]) -> None:
+        self.characters[x, y] = character
+        self.passable[x, y] = self.terrain_passable[x, y] and character is None
+        self.transparent[x, y] = self.terrain_transparent[x, y] and character is None
+        self._descriptions[x, y] = None
+        self._update_empty(x, y)
+
+    def set_loot(self, x: int, y: int, loot: Optional[weapons.Weapon]) -> None:
+        self.loot[x, y] = loot
+        self._descriptions[x, y] = None
+        self._update_empty(x, y)
+
+    def set_consumable(self, x: int, y: int, consumable: Optional[consumables.Consumable]) -> None:
+        self.consumables[x, y] = consumable
+        self._descriptions[x, y] = None
+
+    def set_effects(self, x: int, y: int, cell_effects: Optional[sortedcontainers.SortedList]) -> None:
+        self.effects[x, y] = cell_effects
+        self._descriptions[x, y] = None
+
+    def add_effect(self, x: int, y: int, effect: effects.Effect) -> None:
+        self.cell_effects(x, y).add(effect)
+        self._descriptions[x, y] = None
+
+    def invalidate_description(self, x: int, y: int) -> None:
+        self._descriptions[x, y] = None
+
+    @property
+    def empty_cells(self) -> CellIndex:
+        if self._empty_cells is None:
+            xs, ys = np.nonzero(self.empty_mask())
+            self._empty_cells = CellIndex(self.size[0], coordinates.interned_cells(xs, ys))
+        return self._empty_cells
+
+    def cell_effects(self, x: int, y: int) -> sortedcontainers.SortedList:
+        cell_effects = self.effects[x, y]
+        if cell_effects is None:
+            cell_effects = sortedcontainers.SortedList()
+            self.effects[x, y] = cell_effects
+        return cell_effects
+
+    def contains(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        inside = (xs >= 0) & (xs < self.size[0]) & (ys >= 0) & (ys < self.size[1])
+        inside[inside] = self.present[xs[inside], ys[inside]]
+        return inside
+
+    def empty_mask(self) -> np.ndarray:
+        return self.terrain_passable & np.equal(self.loot, None) & np.equal(self.characters, None)
+
+    def description(self, x: int, y: int) -> tiles.TileDescription:
+        description = self._descriptions[x, y]
+        if description is None:
+            description = tiles.describe(
+                TYPE_NAMES[self.types[x, y]],
+                self.loot[x, y],
+                self.characters[x, y],
+                self.consumables[x, y],
+                self.effects[x, y],
+            )
+            self._descriptions[x, y] = description
+        return description
+
+    def descriptions(self, xs: np.ndarray, ys: np.ndarray) -> list[tiles.TileDescription]:
+        cached = self._descriptions[xs, ys]
+        for i in np.flatnonzero(np.equal(cached, None)).tolist():
+            cached[i] = self.description(int(xs[i]), int(ys[i]))
+        return cached.tolist()
+
+    def _refresh_dynamic(self, mask: np.ndarray) -> None:
+        unoccupied = np.equal(self.characters[mask], None)
+        self.passable[mask] = self.terrain_passable[mask] & unoccupied
+        self.transparent[mask] = self.terrain_transparent[mask] & unoccupied
+
+    def _own_terrain(self) -> None:
+        if self._shares_terrain:
+            for name in TERRAIN_ARRAYS:
+                setattr(self, name, getattr(self, name).copy())
+            self._shares_terrain = False
+
+    def _update_empty(self, x: int, y: int) -> None:
+        if self._empty_cells is not None:
+            if self.terrain_passable[x, y] and self.loot[x, y] is None and self.characters[x, y] is None:
+                self._empty_cells.add(coordinates.interned(x, y))
+            else:
+                self._empty_cells.discard(coordinates.interned(x, y))
+
+    def _within(self, coords: coordinates.Coords) -> bool:
+        try:
+            x, y = coords
+        except (TypeError, ValueError):
+            return False
+        return 0 <= x < self.size[0] and 0 <= y < self.size[1]
+
+    def __contains__(self, coords: object) -> bool:
+        return self._within(coords) and self.present[coords[0], coords[1]]
+
+    def __getitem__(self, coords: coordinates.Coords) -> tiles.Tile:
+        tile = self._tiles.get(coords)
+        if tile is None:
+            if coords not in self:
+                raise KeyError(coords)
+            x, y = int(coords[0]), int(coords[1])
+            tile = TILE_TYPES[self.types[x, y]](self, coordinates.interned(x, y))
+            self._tiles[tile.position] = tile
+        return tile
+
+    def __setitem__(self, coords: coordinates.Coords, tile: tiles.Tile) -> None:
+        if not self._within(coords):
+            raise KeyError(coords)
+        x, y = int(coords[0]), int(coords[1])
+        loot, consumable, character = tile.loot, tile.consumable, tile.character
+        cell_effects = tile.grid.effects[tile.position]
+        mask = np.zeros(self.size, dtype=bool)
+        mask[x, y] = True
+        self.paint(mask, type(tile))
+        self.loot[x, y] = loot
+        self.consumables[x, y] = consumable
+        self.effects[x, y] = cell_effects
+        self.set_character(x, y, character)
+        tile.attach(self, coordinates.interned(x, y))
+        self._tiles[tile.position] = tile
+
+    def __delitem__(self, coords: coordinates.Coords) -> None:
+        if coords not in self:
+            raise KeyError(coords)
+        x, y = int(coords[0]), int(coords[1])
+        self._own_terrain()
+        self.types[x, y] = VOID
+        self.present[x, y] = False
+        self.transparency_version += 1
+        self.terrain_passable[x, y] = self.terrain_transparent[x, y] = self.terrain_solid[x, y] = False
+        self.loot[x, y] = self.consumables[x, y] = self.effects[x, y] = self._descriptions[x, y] = None
+        self.set_character(x, y, None)
+        self._tiles.pop((x, y), None)
+        self._coords = None
+
+    def __iter__(self) -> Iterator[coordinates.Coords]:
+        if self._coords is None:
+            ys, xs = np.nonzero(self.present.T)
+            self._coords = coordinates.interned_cells(xs, ys)
+        return iter(self._coords)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.present))
@@ -1,27 +1,349 @@
+from __future__ import annotations
+import contextvars
+import functools
+import json
+import threading
 import time
+from typing import Any, Optional
 
-PROFILE_RESULTS = {}
+SUB_BUCKET_BITS = 2
+BUCKETS = 64 << SUB_BUCKET_BITS
+PERCENTILES = (0.5, 0.9, 0.99)
+
+PROFILE_RESULTS: dict[str, FunctionStats] = {}
+
+ENGINE: str = 'engine'
+CONTROLLERS: str = 'controllers'
+LOGGING: str = 'logging'
+RENDERING: str = 'rendering'
+CATEGORIES: tuple[str, ...] = (ENGINE, CONTROLLERS, LOGGING, RENDERING)
+BREAKDOWN_METRIC: str = 'breakdown'
+
+BREAKDOWN: dict[Optional[int], dict[str, int]] = {}
+
+CONTROLLER: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('profiled_controller', default=None)
+# set on decisions made away from the game's thread, which already counts their time as the time it waits for them
+WAITED_FOR: contextvars.ContextVar[bool] = contextvars.ContextVar('profiled_waited_for', default=False)
+CURRENT_GAME: Optional[int] = None
+
+# guards `PROFILE_RESULTS` and `BREAKDOWN`, simultaneous decisions and decision budgets time calls on several threads
+_RESULTS_LOCK = threading.RLock()
+
+
+def bucket_of(value_ns: int) -> int:
+    exponent = value_ns.bit_length()
+    if exponent <= SUB_BUCKET_BITS:
+        return value_ns
+    return (exponent - SUB_BUCKET_BITS) << SUB_BUCKET_BITS | (value_ns >> (exponent - SUB_BUCKET_BITS - 1)) & (
+        (1 << SUB_BUCKET_BITS) - 1)
+
+
+def bucket_upper_bound(bucket: int) -> int:
+    if bucket < 1 << SUB_BUCKET_BITS:
+        return bucket
+    exponent = (bucket >> SUB_BUCKET_BITS) + SUB_BUCKET_BITS
+    mantissa = (1 << SUB_BUCKET_BITS) | bucket & ((1 << SUB_BUCKET_BITS) - 1)
+    return ((mantissa + 1) << (exponent - SUB_BUCKET_BITS - 1)) - 1
+
+
+class Histogram:
+    """ Streaming histogram of nanosecond timings in logarithmic buckets, each split in four linear sub-buckets.
+
+    Memory is fixed, percentiles are exact up to the bucket width, that is to 25% of the value; count, total,
+    minimum and maximum are exact.
+    """
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'buckets')
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.total: int = 0
+        self.minimum: int = 0
+        self.maximum: int = 0
+        self.buckets: list[int] = [0] * BUCKETS
+
+    def record(self, value_ns: int) -> None:
+        if not self.count or value_ns < self.minimum:
+            self.minimum = value_ns
+        if value_ns > self.maximum:
+            self.maximum = value_ns
+        self.count += 1
+        self.total += value_ns
+        self.buckets[bucket_of(value_ns)] += 1
+
+    def merge(self, other: Histogram) -> None:
+        if other.count:
+            self.minimum = min(self.minimum, other.minimum) if self.count else other.minimum
+            self.maximum = max(self.maximum, other.maximum)
+            self.count += other.count
+            self.total += other.total
+            self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+
+    def percentile(self, q: float) -> int:
+        rank, seen = q * self.count, 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(bucket_upper_bound(bucket), self.maximum)
+        return self.maximum
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'total_ns': self.total,
+            'min_ns': self.minimum,
+            'max_ns': self.maximum,
+            'buckets': {str(bucket): count for bucket, count in enumerate(self.buckets) if count},
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> Histogram:
+        histogram = Histogram()
+        histogram.count, histogram.total = data['count'], data['total_ns']
+        histogram.minimum, histogram.maximum = data['min_ns'], data['max_ns']
+        for bucket, count in data['buckets'].items():
+            histogram.buckets[int(bucket)] = count
+        return histogram
+
+
+class GameTotals:
+    __slots__ = ('count', 'total', 'maximum')
+
+    def __init__(self, count: int = 0, total: int = 0, maximum: int = 0) -> None:
+        self.count: int = count
+        self.total: int = total
+        self.maximum: int = maximum
+
+    def record(self, value_ns: int) -> None:
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.maximum:
+            self.maximum = value_ns
+
+    def merge(self, other: GameTotals) -> None:
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+
+class FunctionStats:
+    """ Timings of a profiled function, overall, per controller deciding when it ran, and per game. """
+    __slots__ = ('overall', 'controllers', 'games')
+
+    def __init__(self) -> None:
+        self.overall: Histogram = Histogram()
+        self.controllers: dict[str, Histogram] = {}
+        self.games: dict[int, GameTotals] = {}
+
+    def record(self, value_ns: int, controller_name: Optional[str], game_no: Optional[int]) -> None:
+        self.overall.record(value_ns)
+        if controller_name is not None:
+            histogram = self.controllers.get(controller_name)
+            if histogram is None:
+                histogram = self.controllers[controller_name] = Histogram()
+            histogram.record(value_ns)
+        if game_no is not None:
+            totals = self.games.get(game_no)
+            if totals is None:
+                totals = self.games[game_no] = GameTotals()
+            totals.record(value_ns)
+
+    def merge(self, other: FunctionStats) -> None:
+        self.overall.merge(other.overall)
+        for name, histogram in other.controllers.items():
+            self.controllers.setdefault(name, Histogram()).merge(histogram)
+        for game_no, totals in other.games.items():
+            self.games.setdefault(game_no, GameTotals()).merge(totals)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'overall': self.overall.to_dict(),
+            'controllers': {name: histogram.to_dict() for name, histogram in sorted(self.controllers.items())},
+            'games': {
+                str(game_no): {'count': totals.count, 'total_ns': totals.total, 'max_ns': totals.maximum}
+                for game_no, totals in sorted(self.games.items())
+            },
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> FunctionStats:
+        stats = FunctionStats()
+        stats.overall = Histogram.from_dict(data['overall'])
+        stats.controllers = {name: Histogram.from_dict(histogram) for name, histogram in data['controllers'].items()}
+        stats.games = {
+            int(game_no): GameTotals(totals['count'], totals['total_ns'], totals['max_ns'])
+            for game_no, totals in data['games'].items()
+        }
+        return stats
 
 
 def profile(_func=None, name=None):
     """ Profiling decorator. """
 
     def decorator(func):
-        def wrapper(*args, **kw):
-            start_time = time.time()
-
-            result = func(*args, **kw)
+        key = name if name else func.__qualname__
 
-            elapsed_time = time.time() - start_time
-            key = name if name else func.__qualname__
-            PROFILE_RESULTS.setdefault(key, []).append(elapsed_time)
-            return result
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            start_time = time.perf_counter_ns()
+            try:
+                return func(*args, **kw)
+            finally:
+                elapsed_time = time.perf_counter_ns() - start_time
+                with _RESULTS_LOCK:
+                    _stats(key).record(elapsed_time, CONTROLLER.get(), CURRENT_GAME)
 
         return wrapper
 
     return decorator(_func) if _func else decorator
 
 
+def _stats(key: str) -> FunctionStats:
+    stats = PROFILE_RESULTS.get(key)
+    if stats is None:
+        stats = PROFILE_RESULTS[key] = FunctionStats()
+    return stats
+
+
+class _TimerStack(threading.local):
+    def __init__(self) -> None:
+        self.frames: list[list[int]] = []
+
+
+_TIMER_STACK = _TimerStack()
+_ORIGINALS: dict[tuple[type, str], Any] = {}
+
+
+def _finish_timer(key: str, category: str, elapsed_time: int, frame: list[int], frames: list[list[int]]) -> None:
+    if frames:
+        frames[-1][0] += elapsed_time
+    controller_name, game_no = CONTROLLER.get(), CURRENT_GAME
+    with _RESULTS_LOCK:
+        _stats(key).record(elapsed_time, controller_name, game_no)
+        if WAITED_FOR.get():
+            return
+        game_breakdown = BREAKDOWN.get(game_no)
+        if game_breakdown is None:
+            game_breakdown = BREAKDOWN[game_no] = dict.fromkeys(CATEGORIES, 0)
+        game_breakdown[category] += elapsed_time - frame[0]
+
+
+def timer(func, key: str, category: str):
+    """ Times `func` like `profile` and adds its time, without the time of timers nested in it, to `category`. """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kw):
+        frames, frame = _TIMER_STACK.frames, [0]
+        frames.append(frame)
+        start_time = time.perf_counter_ns()
+        try:
+            return func(*args, **kw)
+        finally:
+            elapsed_time = time.perf_counter_ns() - start_time
+            frames.pop()
+            _finish_timer(key, category, elapsed_time, frame, frames)
+
+    return wrapper
+
+
+def _timer_points() -> list[tuple[type, str, str]]:
+    from gupb.logger import core as logger_core
+    from gupb.model import arenas
+    from gupb.model import characters
+    from gupb.model import games
+    from gupb.model import grids
+    points = [
+        (games.Game, 'run_to_completion', ENGINE),
+        (games.Game, 'on_enter_actions_done', ENGINE),
+        (games.Game, 'on_enter_instants_triggered', ENGINE),
+        (arenas.Arena, 'visible_coords', ENGINE),
+        (arenas.Arena, 'visible_tiles', ENGINE),
+        (arenas.Arena, 'increase_mist', ENGINE),
+        (arenas.Arena, 'trigger_instants', ENGINE),
+        (grids.TerrainGrid, 'descriptions', ENGINE),
+        (characters.Champion, 'decide', CONTROLLERS),
+        (characters.Champion, 'pick_action', CONTROLLERS),
+        (logger_core.LoggingMixin, 'log', LOGGING),
+    ]
+    try:
+        from gupb.view import render
+    except ImportError:
+        return points
+    return points + [(render.Renderer, '_render', RENDERING)]
+
+
+def install_timers() -> None:
+    """ Instruments the hot paths of the engine, so their times are profiled and summed per game in `BREAKDOWN`.
+
+    Nothing is measured until the timers are installed, and `uninstall_timers` restores the original methods.
+    Decisions are timed in `Champion.decide` and reported as `Controller.decide`. Waiting for decisions made on other
+    threads is timed in `Champion.pick_action` and counted as time of controllers, instead of the decisions themselves.
+    """
+    if _ORIGINALS:
+        return
+    for owner, attribute, category in _timer_points():
+        original = owner.__dict__[attribute]
+        _ORIGINALS[(owner, attribute)] = original
+        key = 'Controller.decide' if attribute == 'decide' else original.__qualname__
+        setattr(owner, attribute, timer(original, key, category))
+
+
+def uninstall_timers() -> None:
+    for (owner, attribute), original in _ORIGINALS.items():
+        setattr(owner, attribute, original)
+    _ORIGINALS.clear()
+
+
+def timers_installed() -> bool:
+    return bool(_ORIGINALS)
+
+
+def take_breakdown() -> dict[Optional[int], dict[str, int]]:
+    with _RESULTS_LOCK:
+        breakdown = dict(BREAKDOWN)
+        BREAKDOWN.clear()
+    return breakdown
+
+
+def merge_breakdown(breakdown: dict[Optional[int], dict[str, int]]) -> None:
+    with _RESULTS_LOCK:
+        for game_no, categories in breakdown.items():
+            game_breakdown = BREAKDOWN.setdefault(game_no, dict.fromkeys(CATEGORIES, 0))
+            for category, elapsed_time in categories.items():
+                game_breakdown[category] += elapsed_time
+
+
+def export_stats() -> dict[str, Any]:
+    with _RESULTS_LOCK:
+        return {key: stats.to_dict() for key, stats in sorted(PROFILE_RESULTS.items())}
+
+
+def merge_stats(exported: dict[str, Any]) -> None:
+    with _RESULTS_LOCK:
+        for key, data in exported.items():
+            PROFILE_RESULTS.setdefault(key, FunctionStats()).merge(FunctionStats.from_dict(data))
+
+
+def take_stats() -> dict[str, Any]:
+    with _RESULTS_LOCK:
+        exported = export_stats()
+        PROFILE_RESULTS.clear()
+    return exported
+
+
+def save_stats(path: str) -> None:
+    with open(path, 'w') as file:
+        json.dump(export_stats(), file, indent=2)
+
+
+def load_stats(path: str) -> None:
+    with open(path) as file:
+        merge_stats(json.load(file))
+
+
 def humanize_time(time_diff_secs):
     intervals = [('s', 1000), ('m', 60), ('h', 60)]
 
@@ -35,18 +357,61 @@ def humanize_time(time_diff_secs):
     return '{:.2f} {}'.format(shown_num, unit)
 
 
+def humanize_ns(time_diff_ns):
+    if abs(time_diff_ns) < 1_000_000:
+        return '{:.2f} us'.format(time_diff_ns / 1000)
+    return humanize_time(time_diff_ns / 1e9)
+
+
+def describe_histogram(histogram: Histogram) -> str:
+    percentiles = ', '.join(
+        'p{:g}: {}'.format(q * 100, humanize_ns(histogram.percentile(q))) for q in PERCENTILES
+    )
+    return '{} runs, {}, max: {}'.format(histogram.count, percentiles, humanize_ns(histogram.maximum))
+
+
 # noinspection PyShadowingBuiltins
-def print_stats(function_name, all=False, total=True, avg=True):
+def print_stats(function_name, all=False, total=True, avg=True, percentiles=False, controllers=False, games=False):
     if function_name not in PROFILE_RESULTS:
         print("{!r} wasn't profiled, nothing to display.".format(function_name))
     else:
-        runtimes = PROFILE_RESULTS[function_name]
-        total_runtime = sum(runtimes)
-        average = total_runtime / len(runtimes)
+        stats = PROFILE_RESULTS[function_name]
         print('Stats for function: {!r}'.format(function_name))
         if all:
-            print('  run times: {}'.format([humanize_time(run_time) for run_time in runtimes]))
+            print('  run time distribution: {}'.format({
+                '<= {}'.format(humanize_ns(bucket_upper_bound(bucket))): count
+                for bucket, count in enumerate(stats.overall.buckets) if count
+            }))
         if total:
-            print('  total run time: {}'.format(humanize_time(total_runtime)))
+            print('  total run time: {}'.format(humanize_ns(stats.overall.total)))
         if avg:
-            print('  average run time: {}'.format(humanize_time(average)))
+            print('  average run time: {}'.format(humanize_ns(stats.overall.average)))
+        if percentiles or all:
+            print('  {}'.format(describe_histogram(stats.overall)))
+        if controllers or all:
+            for controller_name, histogram in sorted(stats.controllers.items()):
+                print('  controller {}: {}'.format(controller_name, describe_histogram(histogram)))
+        if games or all:
+            for game_no, totals in sorted(stats.games.items()):
+                print('  game {}: {} runs, total run time: {}, max: {}'.format(
+                    game_no, totals.count, humanize_ns(totals.total), humanize_ns(totals.maximum)))
+
+
+def describe_breakdown(categories: dict[str, int]) -> str:
+    total = sum(categories.values())
+    return '{} in total, '.format(humanize_ns(total)) + ', '.join(
+        '{}: {} ({:.1f}%)'.format(category, humanize_ns(categories[category]),
+                                  100 * categories[category] / total if total else 0.0)
+        for category in CATEGORIES
+    )
+
+
+def print_breakdown():
+    print('Time breakdown:')
+    overall = dict.fromkeys(CATEGORIES, 0)
+    for game_no, categories in sorted(BREAKDOWN.items(), key=lambda item: -1 if item[0] is None else item[0]):
+        for category in CATEGORIES:
+            overall[category] += categories[category]
+        print('  {}: {}'.format('outside games' if game_no is None else 'game {}'.format(game_no),
+                                describe_breakdown(categories)))
+    print('  all games: {}'.format(describe_breakdown(overall)))
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import contextlib
+import contextvars
+import functools
+import random
+import threading
+from types import ModuleType
+from typing import Any, Callable, Iterator, Optional
+
+import numpy as np
+
+# generators of the decision being made, replacing the global ones of `random` and `np.random`
+GENERATORS: contextvars.ContextVar[Optional[tuple[random.Random, np.random.RandomState]]] = contextvars.ContextVar(
+    'decision_generators', default=None
+)
+
+_lock = threading.Lock()
+_installations: int = 0
+_originals: list[tuple[ModuleType, dict[str, Callable]]] = []
+_dispatchers: list[tuple[ModuleType, dict[str, Callable]]] = []
+
+
+def install() -> None:
+    """ Makes the module-level functions of `random` and `np.random` draw from the generators of the current decision.
+
+    Outside of decisions they keep drawing from the global generators. The functions are restored once `uninstall` is
+    called as many times, functions imported by name are never replaced.
+    """
+    global _installations
+    with _lock:
+        if _installations == 0:
+            if not _dispatchers:
+                _prepare()
+            for module, dispatchers in _dispatchers:
+                vars(module).update(dispatchers)
+        _installations += 1
+
+
+def uninstall() -> None:
+    global _installations
+    with _lock:
+        _installations -= 1
+        if _installations == 0:
+            for module, originals in _originals:
+                vars(module).update(originals)
+
+
+def _prepare() -> None:
+    for position, module in enumerate((random, np.random)):
+        default = module.random.__self__
+        originals = {
+            name: value for name, value in vars(module).items() if getattr(value, '__self__', None) is default
+        }
+        _originals.append((module, originals))
+        _dispatchers.append((module, {name: _dispatching(value, position, name) for name, value in originals.items()}))
+
+
+def _dispatching(function: Callable, position: int, name: str) -> Callable:
+    @functools.wraps(function)
+    def draw(*args: Any, **kwargs: Any) -> Any:
+        generators = GENERATORS.get()
+        return function(*args, **kwargs) if generators is None else getattr(generators[position], name)(*args, **kwargs)
+
+    return draw
+
+
+@contextlib.contextmanager
+def seeded(seed: int) -> Iterator[None]:
+    """ Runs a decision with its own generators, so its draws do not depend on decisions made concurrently. """
+    install()
+    token = GENERATORS.set((random.Random(seed), np.random.RandomState(seed)))
+    try:
+        yield
+    finally:
+        GENERATORS.reset(token)
+        uninstall()
@@ -2,7 +2,7 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 import logging
-from typing import NamedTuple, Optional, List
+from typing import NamedTuple, Optional
 
 import sortedcontainers
 
@@ -10,6 +10,8 @@ from gupb.logger import core as logger_core
 from gupb.model import effects
 from gupb.model import characters
 from gupb.model import consumables
+from gupb.model import coordinates
+from gupb.model import grids
 from gupb.model import weapons
 
 verbose_logger = logging.getLogger('verbose')
@@ -20,28 +22,77 @@ class TileDescription(NamedTuple):
     loot: Optional[weapons.WeaponDescription]
     character: Optional[characters.ChampionDescription]
     consumable: Optional[consumables.ConsumableDescription]
-    effects: List[effects.EffectDescription]
+    effects: tuple[effects.EffectDescription, ...]
+
+
+def describe(
+        tile_type: str,
+        loot: Optional[weapons.Weapon],
+        character: Optional[characters.Champion],
+        consumable: Optional[consumables.Consumable],
+        tile_effects: Optional[sortedcontainers.SortedList[effects.Effect]],
+) -> TileDescription:
+    return TileDescription(
+        tile_type,
+        loot.description() if loot else None,
+        character.description() if character else None,
+        consumable.description() if consumable else None,
+        tuple(effect.description() for effect in tile_effects) if tile_effects else (),
+    )
 
 
 class Tile(ABC):
-    def __init__(self):
-        self.loot: Optional[weapons.Weapon] = None
-        self.consumable: Optional[consumables.Consumable] = None
-        self.character: Optional[characters.Champion] = None
-        self.effects: sortedcontainers.SortedList[effects.Effect] = sortedcontainers.SortedList()
+    __slots__ = ('grid', 'position')
+
+    def __init__(self, grid: Optional[grids.TerrainGrid] = None, position: Optional[coordinates.Coords] = None):
+        if grid is None:
+            grid, position = grids.TerrainGrid.detached(type(self)), coordinates.Coords(0, 0)
+        self.grid: grids.TerrainGrid = grid
+        self.position: coordinates.Coords = position
+
+    def attach(self, grid: grids.TerrainGrid, position: coordinates.Coords) -> None:
+        if self.grid is not grid and self.grid._tiles.get(self.position) is self:
+            del self.grid._tiles[self.position]
+        self.grid, self.position = grid, position
+
+    @property
+    def loot(self) -> Optional[weapons.Weapon]:
+        return self.grid.loot[self.position]
+
+    @loot.setter
+    def loot(self, loot: Optional[weapons.Weapon]) -> None:
+        self.grid.set_loot(*self.position, loot)
+
+    @property
+    def consumable(self) -> Optional[consumables.Consumable]:
+        return self.grid.consumables[self.position]
+
+    @consumable.setter
+    def consumable(self, consumable: Optional[consumables.Consumable]) -> None:
+        self.grid.set_consumable(*self.position, consumable)
+
+    @property
+    def character(self) -> Optional[characters.Champion]:
+        return self.grid.characters[self.position]
+
+    @character.setter
+    def character(self, character: Optional[characters.Champion]) -> None:
+        self.grid.set_character(*self.position, character)
+
+    @property
+    def effects(self) -> sortedcontainers.SortedList[effects.Effect]:
+        return self.grid.cell_effects(*self.position)
+
+    @effects.setter
+    def effects(self, tile_effects: sortedcontainers.SortedList[effects.Effect]) -> None:
+        self.grid.set_effects(*self.position, tile_effects)
 
     def description(self) -> TileDescription:
-        return TileDescription(
-            self.__class__.__name__.lower(),
-            self.loot.description() if self.loot else None,
-            self.character.description() if self.character else None,
-            self.consumable.description() if self.consumable else None,
-            [effect.description() for effect in self.effects],
-        )
+        return self.grid.description(*self.position)
 
     @property
     def passable(self) -> bool:
-        return self.terrain_passable() and not self.character
+        return bool(self.grid.passable[self.position])
 
     @staticmethod
     @abstractmethod
@@ -50,7 +101,7 @@ class Tile(ABC):
 
     @property
     def transparent(self) -> bool:
-        return self.terrain_transparent() and not self.character
+        return bool(self.grid.transparent[self.position])
 
     @staticmethod
     @abstractmethod
@@ -71,12 +122,12 @@ class Tile(ABC):
         if self.loot:
             champion.weapon, self.loot = self.loot, champion.weapon if champion.weapon.droppable() else None
             verbose_logger.debug(
-                f"Champion {champion.controller.name} picked up a {champion.weapon.description().name}.")
+                "Champion %s picked up a %s.", champion.controller.name, champion.weapon.description().name)
             ChampionPickedWeaponReport(champion.controller.name, champion.weapon.description().name).log(logging.DEBUG)
         if self.consumable:
             self.consumable.apply_to(champion)
             verbose_logger.debug(
-                f"Champion {champion.controller.name} consumed a {self.consumable.description().name}.")
+                "Champion %s consumed a %s.", champion.controller.name, self.consumable.description().name)
             ChampionConsumableReport(champion.controller.name, self.consumable.description().name).log(logging.DEBUG)
             self.consumable = None
 
@@ -95,12 +146,15 @@ class Tile(ABC):
 
     def _activate_effects(self, activation: str) -> None:
         if self.character:
-            if self.effects:
-                for effect in self.effects:
+            tile_effects = self.grid.effects[self.position]
+            if tile_effects:
+                for effect in tile_effects:
                     getattr(effect, activation)(self.character)
 
 
 class Land(Tile):
+    __slots__ = ()
+
     @staticmethod
     def terrain_passable() -> bool:
         return True
@@ -115,6 +169,8 @@ class Land(Tile):
 
 
 class Sea(Tile):
+    __slots__ = ()
+
     @staticmethod
     def terrain_passable() -> bool:
         return False
@@ -129,6 +185,8 @@ class Sea(Tile):
 
 
 class Wall(Tile):
+    __slots__ = ()
+
     @staticmethod
     def terrain_passable() -> bool:
         return False
@@ -143,6 +201,8 @@ class Wall(Tile):
 
 
 class Forest(Tile):
+    __slots__ = ()
+
     @staticmethod
     def terrain_passable() -> bool:
         return True
@@ -157,6 +217,8 @@ class Forest(Tile):
 
 
 class Menhir(Tile):
+    __slots__ = ()
+
     @staticmethod
     def terrain_passable() -> bool:
         return True
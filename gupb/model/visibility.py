@@ -0,0 +1,185 @@
+from __future__ import annotations
+from typing import NamedTuple
+
+import numpy as np
+
+from gupb.model import characters
+from gupb.model import coordinates
+from gupb.model import grids
+
+VISIBILITY_CACHE_SIZE: int = 8192
+
+
+class Cone(NamedTuple):
+    """ Bresenham rays cast from a common origin, one per target.
+
+    The minor axis offset after `k` steps along the major axis of a ray equals `(2 * minor * k + major) // (2 * major)`,
+    which is the closed form of the error term used by `bresenham.bresenham`, so all rays can be traced at once.
+    """
+    origin: coordinates.Coords
+    x_sign: np.ndarray
+    y_sign: np.ndarray
+    steep: np.ndarray
+    major: np.ndarray
+    minor: np.ndarray
+
+    @staticmethod
+    def towards(origin: coordinates.Coords, target_xs: np.ndarray, target_ys: np.ndarray) -> Cone:
+        dx, dy = target_xs - origin.x, target_ys - origin.y
+        return Cone(
+            origin,
+            np.where(dx > 0, 1, -1)[:, None],
+            np.where(dy > 0, 1, -1)[:, None],
+            (np.abs(dx) <= np.abs(dy))[:, None],
+            np.maximum(np.abs(dx), np.abs(dy))[:, None],
+            np.minimum(np.abs(dx), np.abs(dy))[:, None],
+        )
+
+    def offsets(self, steps: np.ndarray) -> np.ndarray:
+        return (2 * self.minor * steps + self.major) // np.maximum(2 * self.major, 1)
+
+    def trace(self, max_steps: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        steps = np.arange(1, max_steps + 1)[None, :]
+        offsets = self.offsets(steps)
+        xs = self.origin.x + np.where(self.steep, offsets, steps) * self.x_sign
+        ys = self.origin.y + np.where(self.steep, steps, offsets) * self.y_sign
+        return xs, ys, np.broadcast_to(steps, xs.shape)
+
+    def steps_to(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        rel_xs, rel_ys = (xs - self.origin.x)[None, :], (ys - self.origin.y)[None, :]
+        steps = np.where(self.steep, rel_ys * self.y_sign, rel_xs * self.x_sign)
+        offsets = np.where(self.steep, rel_xs * self.x_sign, rel_ys * self.y_sign)
+        on_ray = (steps >= 1) & (steps <= self.major) & (self.offsets(steps) == offsets)
+        return np.where(on_ray, steps, 0)
+
+
+class FieldOfView(NamedTuple):
+    xs: np.ndarray
+    ys: np.ndarray
+    ray_cells: int
+    reach: np.ndarray
+
+
+def sight_cone(size: tuple[int, int], position: coordinates.Coords, facing: characters.Facing) -> Cone:
+    if facing == characters.Facing.UP:
+        border, distance = coordinates.Coords(position.x, 0), position.y
+    elif facing == characters.Facing.RIGHT:
+        border, distance = coordinates.Coords(size[0] - 1, position.y), size[0] - position.x
+    elif facing == characters.Facing.DOWN:
+        border, distance = coordinates.Coords(position.x, size[1] - 1), size[1] - position.y
+    else:
+        border, distance = coordinates.Coords(0, position.y), position.x
+    left = facing.turn_left().value
+    shifts = np.arange(-distance, distance + 1)
+    return Cone.towards(position, border.x + shifts * left.x, border.y + shifts * left.y)
+
+
+def peripheral_cells(position: coordinates.Coords, facing: characters.Facing) -> list[coordinates.Coords]:
+    if facing == characters.Facing.UP or facing == characters.Facing.DOWN:
+        return [
+            position,
+            coordinates.interned(position.x + 1, position.y),
+            coordinates.interned(position.x - 1, position.y),
+        ]
+    else:
+        return [
+            position,
+            coordinates.interned(position.x, position.y + 1),
+            coordinates.interned(position.x, position.y - 1),
+        ]
+
+
+class VisibilityCache:
+    """ Fields of view over the static terrain, memoized per `(position, facing)`.
+
+    Champions block sight, so a cached field is corrected on every query: rays passing through a visible champion
+    are cut short at its cell. The cache is dropped whenever the transparency of the terrain changes.
+    """
+
+    def __init__(self, terrain: grids.TerrainGrid) -> None:
+        self.terrain: grids.TerrainGrid = terrain
+        self.hits: int = 0
+        self.misses: int = 0
+        self._fields: dict[tuple[coordinates.Coords, characters.Facing], FieldOfView] = {}
+        self._transparency_version: int = terrain.transparency_version
+
+    def fork(self, terrain: grids.TerrainGrid) -> VisibilityCache:
+        forked = VisibilityCache(terrain)
+        forked._fields, forked._transparency_version = self._fields, self._transparency_version
+        return forked
+
+    def invalidate(self) -> None:
+        self._fields = {}
+        self._transparency_version = self.terrain.transparency_version
+
+    def visible_cells(
+            self,
+            position: coordinates.Coords,
+            facing: characters.Facing,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if self._transparency_version != self.terrain.transparency_version:
+            self.invalidate()
+        field = self._fields.get((position, facing))
+        if field is None:
+            self.misses += 1
+            field = self._cast(position, facing)
+            if len(self._fields) >= VISIBILITY_CACHE_SIZE:
+                del self._fields[next(iter(self._fields))]
+            self._fields[(position, facing)] = field
+        else:
+            self.hits += 1
+        return self._correct(field, position, facing)
+
+    def _cast(self, position: coordinates.Coords, facing: characters.Facing) -> FieldOfView:
+        cone = sight_cone(self.terrain.size, position, facing)
+        xs, ys, steps = cone.trace(int(cone.major.max(initial=0)))
+        width, height = self.terrain.size
+        inside = (steps <= cone.major) & (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        clipped_xs, clipped_ys = np.clip(xs, 0, width - 1), np.clip(ys, 0, height - 1)
+        present = inside & self.terrain.present[clipped_xs, clipped_ys]
+        see_through = present & self.terrain.terrain_transparent[clipped_xs, clipped_ys]
+        unobstructed = np.ones_like(see_through)
+        unobstructed[:, 1:] = np.logical_and.accumulate(see_through, axis=1)[:, :-1]
+        visible = present & unobstructed
+        return self._field(xs[visible], ys[visible], visible.sum(axis=1), position, facing)
+
+    def _correct(
+            self,
+            field: FieldOfView,
+            position: coordinates.Coords,
+            facing: characters.Facing,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        ray_xs, ray_ys = field.xs[:field.ray_cells], field.ys[:field.ray_cells]
+        blocked = ~self.terrain.transparent[ray_xs, ray_ys] & self.terrain.terrain_transparent[ray_xs, ray_ys]
+        if not blocked.any():
+            return field.xs, field.ys
+        cone = sight_cone(self.terrain.size, position, facing)
+        steps_to_blockers = cone.steps_to(ray_xs[blocked], ray_ys[blocked])
+        reach = field.reach[:, None]
+        cut = np.where((steps_to_blockers > 0) & (steps_to_blockers < reach), steps_to_blockers, reach).min(axis=1)
+        if (cut == field.reach).all():
+            return field.xs, field.ys
+        xs, ys, steps = cone.trace(int(cut.max(initial=0)))
+        visible = steps <= cut[:, None]
+        corrected = self._field(xs[visible], ys[visible], cut, position, facing)
+        return corrected.xs, corrected.ys
+
+    def _field(
+            self,
+            xs: np.ndarray,
+            ys: np.ndarray,
+            reach: np.ndarray,
+            position: coordinates.Coords,
+            facing: characters.Facing,
+    ) -> FieldOfView:
+        height = self.terrain.size[1]
+        _, unique = np.unique(xs * height + ys, return_index=True)
+        xs, ys = xs[unique], ys[unique]
+        ray_cells = set(zip(xs.tolist(), ys.tolist()))
+        peripheral = [coords for coords in peripheral_cells(position, facing) if coords not in ray_cells]
+        return FieldOfView(
+            np.concatenate((xs, [coords.x for coords in peripheral])).astype(np.int16),
+            np.concatenate((ys, [coords.y for coords in peripheral])).astype(np.int16),
+            len(xs),
+            reach.astype(np.int16),
+        )
@@ -0,0 +1,188 @@
+from __future__ import annotations
+from concurrent import futures
+import contextvars
+from dataclasses import dataclass, field
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from gupb import controller
+from gupb.logger import core as logger_core
+from gupb.model import characters
+from gupb.model import profiling
+
+verbose_logger = logging.getLogger('verbose')
+
+LATENCY_BUCKETS: int = 40
+
+DECISION_BUDGET_EXCEEDED: str = 'decision budget exceeded'
+GAME_BUDGET_EXHAUSTED: str = 'game budget exhausted'
+STILL_DECIDING: str = 'previous decision still running'
+
+
+@dataclass
+class LatencyStatistics:
+    """ Decision latencies of a controller, kept in power-of-two buckets of microseconds. """
+    decisions: int = 0
+    timeouts: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * LATENCY_BUCKETS)
+
+    def record(self, seconds: float) -> None:
+        self.decisions += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        self.buckets[min(int(seconds * 1e6).bit_length(), LATENCY_BUCKETS - 1)] += 1
+
+    def merge(self, other: LatencyStatistics) -> None:
+        self.decisions += other.decisions
+        self.timeouts += other.timeouts
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+
+    def percentile(self, q: float) -> float:
+        rank, seen = q * self.decisions, 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return (1 << bucket) / 1e6
+        return self.maximum
+
+    def __str__(self) -> str:
+        mean = self.total / self.decisions if self.decisions else 0.0
+        return (
+            f"{self.decisions} decisions, mean {mean * 1e3:.3f} ms, p50 < {self.percentile(0.5) * 1e3:.3f} ms, "
+            f"p99 < {self.percentile(0.99) * 1e3:.3f} ms, max {self.maximum * 1e3:.3f} ms, {self.timeouts} timeouts"
+        )
+
+
+class DecisionThread:
+    """ Daemon thread running the decisions of a single controller, so a decision that never ends cannot block exit. """
+
+    def __init__(self, name: str) -> None:
+        self._tasks: queue.SimpleQueue = queue.SimpleQueue()
+        self.name: str = name
+        self._thread = threading.Thread(target=self._run, name=f'decisions-{name}', daemon=True)
+        self._thread.start()
+        self.pending: Optional[futures.Future] = None
+
+    def submit(self, decide: Callable[[characters.ChampionKnowledge], characters.Action],
+               knowledge: characters.ChampionKnowledge) -> futures.Future:
+        self.pending = futures.Future()
+        # the decision runs in the context of the caller, with its seeded generators of simultaneous decisions
+        context = contextvars.copy_context()
+        context.run(profiling.WAITED_FOR.set, True)
+        self._tasks.put((self.pending, context, decide, knowledge))
+        return self.pending
+
+    @property
+    def busy(self) -> bool:
+        return self.pending is not None and not self.pending.done()
+
+    def stop(self) -> None:
+        """ Ends the thread, at once if it is idle, or as soon as its decision still running returns. """
+        self._tasks.put(None)
+        if not self.busy:
+            self._thread.join()
+
+    def _run(self) -> None:
+        profiling.CONTROLLER.set(self.name)
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, context, decide, knowledge = task
+            try:
+                future.set_result(context.run(decide, knowledge))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class DecisionWatchdog:
+    """ Times the decisions of controllers and enforces per-decision and per-game time budgets, given in seconds.
+
+    Without budgets decisions run on the calling thread, so games stay deterministic. With a budget each controller
+    decides on its own thread, and `Action.DO_NOTHING` is played instead of a decision that does not arrive in time.
+    A controller whose previous decision is still running does nothing until it finishes.
+    """
+
+    def __init__(self, decision_budget: Optional[float] = None, game_budget: Optional[float] = None) -> None:
+        self.decision_budget: Optional[float] = decision_budget
+        self.game_budget: Optional[float] = game_budget
+        self.latencies: dict[str, LatencyStatistics] = {}
+        self._threads: dict[str, DecisionThread] = {}
+        self._spent: dict[str, float] = {}
+
+    @property
+    def enforcing(self) -> bool:
+        return self.decision_budget is not None or self.game_budget is not None
+
+    def start_game(self) -> None:
+        self._spent = {}
+
+    def decide(
+            self,
+            decider: controller.Controller,
+            knowledge: characters.ChampionKnowledge,
+    ) -> characters.Action:
+        name = decider.name
+        statistics = self.latencies.get(name)
+        if statistics is None:
+            statistics = self.latencies[name] = LatencyStatistics()
+        if not self.enforcing:
+            start = time.perf_counter()
+            try:
+                return decider.decide(knowledge)
+            finally:
+                statistics.record(time.perf_counter() - start)
+        spent = self._spent.get(name, 0.0)
+        budget = self._budget(spent)
+        thread = self._threads.get(name)
+        if thread is None:
+            thread = self._threads[name] = DecisionThread(name)
+        if budget <= 0.0:
+            return self._time_out(name, GAME_BUDGET_EXHAUSTED, 0.0)
+        if thread.busy:
+            return self._time_out(name, STILL_DECIDING, 0.0)
+        start = time.perf_counter()
+        pending = thread.submit(decider.decide, knowledge)
+        try:
+            return pending.result(timeout=budget)
+        except futures.TimeoutError:
+            return self._time_out(name, DECISION_BUDGET_EXCEEDED, time.perf_counter() - start)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._spent[name] = spent + elapsed
+            statistics.record(elapsed)
+
+    def close(self) -> None:
+        for thread in self._threads.values():
+            thread.stop()
+        self._threads = {}
+
+    def merge(self, latencies: dict[str, LatencyStatistics]) -> None:
+        for name, statistics in latencies.items():
+            self.latencies.setdefault(name, LatencyStatistics()).merge(statistics)
+
+    def _budget(self, spent: float) -> float:
+        budgets = [self.decision_budget] if self.decision_budget is not None else []
+        if self.game_budget is not None:
+            budgets.append(self.game_budget - spent)
+        return min(budgets)
+
+    def _time_out(self, name: str, reason: str, elapsed: float) -> characters.Action:
+        self.latencies[name].timeouts += 1
+        verbose_logger.warning("Controller %s timed out: %s after %.3f s.", name, reason, elapsed)
+        ControllerTimeoutReport(name, reason, int(elapsed * 1e6)).log(logging.WARN)
+        return characters.Action.DO_NOTHING
+
+
+@dataclass(frozen=True)
+class ControllerTimeoutReport(logger_core.LoggingMixin):
+    controller_name: str
+    reason: str
+    elapsed_us: int
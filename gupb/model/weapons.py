@@ -87,7 +87,7 @@ class PropheticWeapon(Weapon, ABC):
         for x in range(position.x - radius, position.x + radius + 1):
             for y in range(position.y - radius, position.y + radius + 1):
                 if math.sqrt((x - position.x) ** 2 + (y - position.y) ** 2) <= radius:
-                    visible_coordinates.append(coordinates.Coords(x, y))
+                    visible_coordinates.append(coordinates.interned(x, y))
         return visible_coordinates
 
     @staticmethod
@@ -170,14 +170,14 @@ class Amulet(PropheticWeapon, Weapon):
             facing: characters.Facing
     ) -> List[coordinates.Coords]:
         return [
-            coordinates.Coords(*position + (1, 1)),
-            coordinates.Coords(*position + (-1, 1)),
-            coordinates.Coords(*position + (1, -1)),
-            coordinates.Coords(*position + (-1, -1)),
-            coordinates.Coords(*position + (2, 2)),
-            coordinates.Coords(*position + (-2, 2)),
-            coordinates.Coords(*position + (2, -2)),
-            coordinates.Coords(*position + (-2, -2)),
+            coordinates.interned(position[0] + 1, position[1] + 1),
+            coordinates.interned(position[0] - 1, position[1] + 1),
+            coordinates.interned(position[0] + 1, position[1] - 1),
+            coordinates.interned(position[0] - 1, position[1] - 1),
+            coordinates.interned(position[0] + 2, position[1] + 2),
+            coordinates.interned(position[0] - 2, position[1] + 2),
+            coordinates.interned(position[0] + 2, position[1] - 2),
+            coordinates.interned(position[0] - 2, position[1] - 2),
         ]
 
     def cut(self, arena: arenas.Arena, position: coordinates.Coords, facing: characters.Facing) -> None:
@@ -0,0 +1,312 @@
+from __future__ import annotations
+import collections
+import contextlib
+import cProfile
+import inspect
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, Union
+
+# games go first, as characters cannot be imported before the controller protocol they depend on
+from gupb.model import games
+from gupb.model import characters
+from gupb.model import profiling
+
+PROFILERS: tuple[str, ...] = ('cprofile', 'sampling')
+SPLITS: tuple[str, ...] = ('game', 'controller')
+
+PSTATS_SUFFIX: str = '.pstats'
+COLLAPSED_SUFFIX: str = '.collapsed'
+DEFAULT_SAMPLING_INTERVAL: float = 0.001
+SWITCHES_PER_SAMPLE: int = 10
+MAX_STACK_DEPTH: int = 256
+MIN_COLLAPSED_TIME: float = 1e-6
+
+FunctionKey = tuple[str, int, str]
+PStats = dict[FunctionKey, tuple[int, int, float, float, dict[FunctionKey, tuple[int, int, float, float]]]]
+
+_UNSET = object()
+
+
+def split_key(
+        split: Optional[str],
+        game_no: Optional[int] = None,
+        controller_name: Optional[str] = None,
+) -> Optional[str]:
+    if split == 'game' and game_no is not None:
+        return f'game_{game_no}'
+    if split == 'controller' and controller_name is not None:
+        return re.sub(r'[^\w.-]', '_', controller_name)
+    return None
+
+
+def function_label(key: FunctionKey) -> str:
+    file_name, line, name = key
+    label = name if file_name == '~' else f'{name} ({os.path.basename(file_name)}:{line})'
+    return label.replace(';', ',')
+
+
+class CallProfiler:
+    """ Runs `cProfile` on the thread playing games, with a separate profile per game or per deciding controller.
+
+    Profiles are switched by wrapping `Game.__init__` or `Champion.decide`; decisions running on other threads are
+    profiled only when split per controller.
+    """
+
+    def __init__(self, split: Optional[str] = None) -> None:
+        self.split: Optional[str] = split
+        self.profiles: dict[Optional[str], cProfile.Profile] = {}
+        self._active = threading.local()
+        self._originals: dict[tuple[type, str], Any] = {}
+
+    def start(self) -> None:
+        if self.split == 'game':
+            self._wrap(games.Game, '__init__', self._switching_init)
+        elif self.split == 'controller':
+            self._wrap(characters.Champion, 'decide', self._switching_decide)
+        self._activate(None)
+
+    def stop(self) -> None:
+        self._deactivate(_UNSET)
+        for (owner, attribute), original in self._originals.items():
+            setattr(owner, attribute, original)
+        self._originals.clear()
+
+    def stats(self) -> dict[Optional[str], PStats]:
+        results = {}
+        for key, profile in self.profiles.items():
+            profile.create_stats()
+            results[key] = profile.stats
+        return results
+
+    def _wrap(self, owner: type, attribute: str, wrapper: Callable[[Callable], Callable]) -> None:
+        original = owner.__dict__[attribute]
+        self._originals[(owner, attribute)] = original
+        setattr(owner, attribute, wrapper(original))
+
+    def _switching_init(self, original: Callable) -> Callable:
+        def init(game: games.Game, *args, **kwargs) -> None:
+            original(game, *args, **kwargs)
+            self._deactivate(_UNSET)
+            self._activate(split_key(self.split, game_no=game.game_no))
+
+        return init
+
+    def _switching_decide(self, original: Callable) -> Callable:
+        def decide(champion: characters.Champion, knowledge: characters.ChampionKnowledge) -> characters.Action:
+            previous = self._activate(split_key(self.split, controller_name=champion.controller.name))
+            try:
+                return original(champion, knowledge)
+            finally:
+                self._deactivate(previous)
+
+        return decide
+
+    def _activate(self, key: Optional[str]) -> Any:
+        previous = getattr(self._active, 'key', _UNSET)
+        if previous is not _UNSET:
+            self.profiles[previous].disable()
+        profile = self.profiles.get(key)
+        if profile is None:
+            profile = self.profiles[key] = cProfile.Profile()
+        self._active.key = key
+        profile.enable()
+        return previous
+
+    def _deactivate(self, previous: Any) -> None:
+        current = getattr(self._active, 'key', _UNSET)
+        if current is not _UNSET:
+            self.profiles[current].disable()
+        if previous is _UNSET:
+            self._active.__dict__.pop('key', None)
+        else:
+            self._active.key = previous
+            self.profiles[previous].enable()
+
+
+class SamplingProfiler:
+    """ Samples the stacks of the thread playing games and of threads running decisions from a background thread.
+
+    Every sample is weighted by the wall time since the previous one, so the results stay in seconds even when the
+    sampling thread waits for the interpreter lock longer than the interval. While sampling, the switch interval of
+    the interpreter is shortened, otherwise samples would be taken only where the sampled threads release the lock.
+    """
+
+    def __init__(self, split: Optional[str] = None, interval: float = DEFAULT_SAMPLING_INTERVAL) -> None:
+        self.split: Optional[str] = split
+        self.interval: float = interval
+        self.samples: dict[Optional[str], collections.Counter] = collections.defaultdict(collections.Counter)
+        self._decide_code = inspect.unwrap(characters.Champion.decide).__code__
+        self._target: Optional[int] = None
+        self._switch_interval: float = sys.getswitchinterval()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self) -> None:
+        self._target = threading.get_ident()
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval / SWITCHES_PER_SAMPLE))
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def stats(self) -> dict[Optional[str], PStats]:
+        return {key: sampled_stats(samples) for key, samples in self.samples.items()}
+
+    def collapsed(self) -> dict[Optional[str], dict[str, float]]:
+        return {
+            key: {
+                ';'.join(function_label(code_key(code)) for code in stack): seconds
+                for stack, seconds in samples.items()
+            }
+            for key, samples in self.samples.items()
+        }
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter_ns()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter_ns()
+            weight, last = (now - last) / 1e9, now
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(ident, frame, weight)
+
+    def _sample(self, ident: int, frame: Any, weight: float) -> None:
+        stack, controller_name = [], None
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append(frame.f_code)
+            if frame.f_code is self._decide_code and controller_name is None:
+                champion = frame.f_locals.get('self')
+                controller_name = champion.controller.name if champion is not None else None
+            frame = frame.f_back
+        if ident != self._target and controller_name is None:
+            return
+        key = split_key(self.split, profiling.CURRENT_GAME, controller_name)
+        self.samples[key][tuple(reversed(stack))] += weight
+
+
+def code_key(code: Any) -> FunctionKey:
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def sampled_stats(samples: collections.Counter) -> PStats:
+    """ Converts weighted stacks to the layout of `pstats`, counting each distinct stack of a function as a call. """
+    calls: dict[FunctionKey, list] = {}
+    for stack, seconds in samples.items():
+        keys = [code_key(code) for code in stack]
+        seen, edges = set(), set()
+        for depth, key in enumerate(keys):
+            entry = calls.get(key)
+            if entry is None:
+                entry = calls[key] = [0, 0, 0.0, 0.0, {}]
+            if key not in seen:
+                seen.add(key)
+                entry[0] += 1
+                entry[1] += 1
+                entry[3] += seconds
+            if depth + 1 == len(keys):
+                entry[2] += seconds
+            if depth and (keys[depth - 1], key) not in edges:
+                edges.add((keys[depth - 1], key))
+                nc, cc, tt, ct = entry[4].get(keys[depth - 1], (0, 0, 0.0, 0.0))
+                entry[4][keys[depth - 1]] = (
+                    nc + 1, cc + 1, tt + (seconds if depth + 1 == len(keys) else 0.0), ct + seconds
+                )
+    return {key: (cc, nc, tt, ct, callers) for key, (cc, nc, tt, ct, callers) in calls.items()}
+
+
+def collapsed_stacks(stats: PStats) -> dict[str, float]:
+    """ Approximates full stacks from the caller graph of `pstats`.
+
+    The time of a function is split between the paths leading to it in proportion to the time spent under each caller.
+    Time of functions profiled without their callers, like ones running when profiles were switched, starts new stacks.
+    """
+    callees: dict[FunctionKey, list[tuple[FunctionKey, float]]] = collections.defaultdict(list)
+    for key, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, caller_ct) in callers.items():
+            if caller in stats:
+                callees[caller].append((key, caller_ct))
+    stacks: dict[str, float] = collections.defaultdict(float)
+
+    def visit(key: FunctionKey, path: list[FunctionKey], seconds: float) -> None:
+        _, _, tt, ct, _ = stats[key]
+        path = path + [key]
+        share = seconds / ct if ct else 0.0
+        if tt * share >= MIN_COLLAPSED_TIME:
+            stacks[';'.join(function_label(function) for function in path)] += tt * share
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, callee_ct in callees[key]:
+            if callee not in path and callee_ct * share >= MIN_COLLAPSED_TIME:
+                visit(callee, path, callee_ct * share)
+
+    for key, (_, _, _, ct, callers) in stats.items():
+        unattributed = ct - sum(caller_ct for caller, (_, _, _, caller_ct) in callers.items() if caller in stats)
+        if unattributed >= MIN_COLLAPSED_TIME:
+            visit(key, [], unattributed)
+    return stacks
+
+
+def write_pstats(stats: PStats, path: str) -> None:
+    with open(path, 'wb') as file:
+        marshal.dump(stats, file)
+
+
+def write_collapsed(stacks: dict[str, float], path: str) -> None:
+    """ Writes stacks in the collapsed format of flame graph tools, with times in microseconds as sample counts. """
+    with open(path, 'w') as file:
+        for stack, seconds in sorted(stacks.items()):
+            microseconds = int(round(seconds * 1e6))
+            if microseconds:
+                file.write(f'{stack} {microseconds}\n')
+
+
+def output_paths(out: str, key: Optional[str]) -> tuple[str, str]:
+    base = out if key is None else f'{out}.{key}'
+    return base + PSTATS_SUFFIX, base + COLLAPSED_SUFFIX
+
+
+@contextlib.contextmanager
+def profiled(
+        profiler_name: str,
+        out: str,
+        split: Optional[str] = None,
+        interval: float = DEFAULT_SAMPLING_INTERVAL,
+) -> Iterator[list[str]]:
+    """ Profiles the enclosed code and writes a `.pstats` and a `.collapsed` file per part of the split.
+
+    The yielded list is filled with the paths of written files once the block is left.
+    """
+    if profiler_name not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler_name!r}, expected one of {PROFILERS}.")
+    if split is not None and split not in SPLITS:
+        raise ValueError(f"Unknown profile split {split!r}, expected one of {SPLITS}.")
+    profiler: Union[CallProfiler, SamplingProfiler] = (
+        CallProfiler(split) if profiler_name == 'cprofile' else SamplingProfiler(split, interval)
+    )
+    written: list[str] = []
+    directory = os.path.dirname(out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    profiler.start()
+    try:
+        yield written
+    finally:
+        profiler.stop()
+        all_stats = profiler.stats()
+        all_stacks = profiler.collapsed() if isinstance(profiler, SamplingProfiler) else {
+            key: collapsed_stacks(stats) for key, stats in all_stats.items()
+        }
+        for key, stats in all_stats.items():
+            pstats_path, collapsed_path = output_paths(out, key)
+            write_pstats(stats, pstats_path)
+            write_collapsed(all_stacks[key], collapsed_path)
+            written.extend((pstats_path, collapsed_path))
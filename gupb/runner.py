@@ -1,22 +1,50 @@
 from __future__ import annotations
 import collections
+from concurrent import futures
+import copy
 from dataclasses import dataclass
 import logging
+import multiprocessing
 import random
-from typing import Any, List, Optional
+from typing import Any, List, NamedTuple, Optional
 
-from tqdm import trange
+import numpy as np
+from tqdm import tqdm, trange
 
 from gupb import controller
 from gupb.controller import keyboard
-from gupb.model.profiling import PROFILE_RESULTS, print_stats
+from gupb.logger import binary
 from gupb.logger import core as logger_core
+from gupb.logger import sinks
+from gupb.model import arenas
 from gupb.model import coordinates
 from gupb.model import games
+from gupb.model import profiling
+from gupb.model import watchdogs
 from gupb.view import render
 
 verbose_logger = logging.getLogger('verbose')
 
+CAPTURED_LOGGERS: tuple[str, ...] = ('verbose', 'json')
+
+
+class GameBatch(NamedTuple):
+    first_game_no: int
+    arenas: list[str]
+    seeds: list[np.random.SeedSequence]
+    decision_budget: Optional[float]
+    game_budget: Optional[float]
+
+
+class BatchResult(NamedTuple):
+    scores: list[dict[str, int]]
+    records: list[logging.LogRecord]
+    events: list[binary.CapturedEvent]
+    latencies: dict[str, watchdogs.LatencyStatistics]
+    profile: dict[str, Any]
+    breakdown: dict[Optional[int], dict[str, int]]
+
+
 class Runner:
     def __init__(self, config: dict[str, Any]) -> None:
         self.arenas: list[str] = config['arenas']
@@ -30,27 +58,49 @@ class Runner:
         self.start_balancing: bool = config['start_balancing']
         self.scores: dict[str, int] = collections.defaultdict(int)
         self.profiling_metrics = config['profiling_metrics'] if 'profiling_metrics' in config else None
+        self.profiling_output: Optional[str] = config['profiling_output'] if 'profiling_output' in config else None
+        if self.profiling_metrics and profiling.BREAKDOWN_METRIC in self.profiling_metrics:
+            profiling.install_timers()
+        self.workers: int = config['workers'] if 'workers' in config else 1
+        self.seed: Optional[int] = config['seed'] if 'seed' in config else None
+        self.watchdog: watchdogs.DecisionWatchdog = watchdogs.DecisionWatchdog(
+            config['decision_budget'] if 'decision_budget' in config else None,
+            config['game_budget'] if 'game_budget' in config else None,
+        )
+        self.simultaneous_decisions: bool = (
+            config['simultaneous_decisions'] if 'simultaneous_decisions' in config else False
+        )
+        self.decision_threads: Optional[int] = config['decision_threads'] if 'decision_threads' in config else None
+        self.decision_executor: Optional[futures.Executor] = (
+            futures.ThreadPoolExecutor(self.decision_threads, thread_name_prefix='decisions')
+            if self.simultaneous_decisions else None
+        )
         self._last_arena: Optional[str] = None
         self._last_menhir_position: Optional[coordinates.Coords] = None
         self._last_initial_positions: Optional[list[coordinates.Coords]] = None
 
     def run(self) -> None:
+        if not self.renderer and (self.workers > 1 or self.seed is not None):
+            self.run_batches()
+            return
         for i in trange(self.runs_no, desc="Playing games"):
             verbose_logger.info(f"Starting game number {i + 1}.")
             GameStartReport(i + 1).log(logging.INFO)
             self.run_game(i)
+        self.watchdog.close()
 
-    # noinspection PyBroadException
     def run_game(self, game_no: int) -> None:
-        arena = random.choice(self.arenas)
-        verbose_logger.debug(f"Randomly picked arena: {arena}.")
-        RandomArenaPickReport(arena).log(logging.DEBUG)
         if not self.start_balancing or game_no % len(self.controllers) == 0:
+            arena = random.choice(self.arenas)
+            verbose_logger.debug(f"Randomly picked arena: {arena}.")
+            RandomArenaPickReport(arena).log(logging.DEBUG)
             random.shuffle(self.controllers)
             game = games.Game(
                 game_no=game_no,
                 arena_name=arena,
                 to_spawn=self.controllers,
+                watchdog=self.watchdog,
+                decision_executor=self.decision_executor,
             )
         else:
             self.controllers = self.controllers[1:] + [self.controllers[0]]
@@ -60,6 +110,8 @@ class Runner:
                 to_spawn=self.controllers,
                 menhir_position=self._last_menhir_position,
                 initial_champion_positions=self._last_initial_positions,
+                watchdog=self.watchdog,
+                decision_executor=self.decision_executor,
             )
         self._last_arena = game.arena.name
         self._last_menhir_position = game.arena.menhir_position
@@ -69,15 +121,71 @@ class Runner:
             self.renderer.run(game, show_sight, self.keyboard_controller)
         else:
             self.run_in_memory(game)
-        for dead_controller, score in game.score().items():
-            verbose_logger.info(f"Controller {dead_controller.name} scored {score} points.")
-            ControllerScoreReport(dead_controller.name, score).log(logging.INFO)
-            try:
-                dead_controller.praise(score)
-            except Exception as e:
-                verbose_logger.warning(f"Controller {dead_controller.name} throw an unexpected exception: {repr(e)}.")
-                controller.ControllerExceptionReport(dead_controller.name, repr(e)).log(logging.WARN)
-            self.scores[dead_controller.name] += score
+        for name, score in score_game(game).items():
+            self.scores[name] += score
+        sinks.request_flush()
+
+    def run_batches(self) -> None:
+        master_seed = np.random.SeedSequence(self.seed)
+        verbose_logger.info(f"Playing {self.runs_no} games with master seed {master_seed.entropy}.")
+        arenas.preload(self.arenas)
+        batches = self._plan_batches(master_seed.spawn(self.runs_no))
+        with tqdm(total=self.runs_no, desc="Playing games") as progress:
+            if self.workers > 1:
+                levels = {name: logging.getLogger(name).level for name in CAPTURED_LOGGERS}
+                json_events = logger_core.EVENT_BUS.subscribed(logger_core.log_json)
+                binary_events = len(sinks.binary_writers()) > 0
+                sinks.flush()
+                with multiprocessing.Pool(
+                        self.workers,
+                        initializer=init_worker,
+                        initargs=(
+                            self.arenas,
+                            self.controllers,
+                            self.simultaneous_decisions,
+                            self.decision_threads,
+                            levels,
+                            json_events,
+                            binary_events,
+                            profiling.timers_installed(),
+                        ),
+                ) as pool:
+                    for batch, result in zip(batches, pool.imap(play_batch, batches)):
+                        self._merge_batch(result)
+                        progress.update(len(batch.seeds))
+                    pool.close()
+                    pool.join()
+            else:
+                for batch in batches:
+                    self._merge_batch(play_batch(batch, self.controllers, self.decision_executor))
+                    progress.update(len(batch.seeds))
+
+    def _plan_batches(self, seeds: list[np.random.SeedSequence]) -> list[GameBatch]:
+        batch_size = len(self.controllers) if self.start_balancing else 1
+        return [
+            GameBatch(
+                first_game_no,
+                self.arenas,
+                seeds[first_game_no:first_game_no + batch_size],
+                self.watchdog.decision_budget,
+                self.watchdog.game_budget,
+            )
+            for first_game_no in range(0, self.runs_no, batch_size)
+        ]
+
+    def _merge_batch(self, result: BatchResult) -> None:
+        for record in result.records:
+            logging.getLogger(record.name).handle(record)
+        for writer in sinks.binary_writers():
+            for event in result.events:
+                writer.write(*event)
+        for game_scores in result.scores:
+            for name, score in game_scores.items():
+                self.scores[name] += score
+        self.watchdog.merge(result.latencies)
+        profiling.merge_stats(result.profile)
+        profiling.merge_breakdown(result.breakdown)
+        sinks.request_flush()
 
     def print_scores(self) -> None:
         verbose_logger.info(f"Final scores.")
@@ -89,14 +197,144 @@ class Runner:
             print(score_line)
         FinalScoresReport(scores_to_log).log(logging.INFO)
 
+        for name, statistics in sorted(self.watchdog.latencies.items()):
+            verbose_logger.info(f"Controller {name} latency: {statistics}.")
+            print(f"Latency of {name}: {statistics}.")
+
+        sinks.flush()
+        for handler in sinks.batched_handlers():
+            print(f"Log writer {handler.statistics()}.")
+
         if self.profiling_metrics:
-            for func in PROFILE_RESULTS.keys():
-                print_stats(func, **{m: True for m in self.profiling_metrics})
+            metrics = {m: True for m in self.profiling_metrics if m != profiling.BREAKDOWN_METRIC}
+            for func in profiling.PROFILE_RESULTS.keys():
+                profiling.print_stats(func, **metrics)
+            if profiling.BREAKDOWN_METRIC in self.profiling_metrics:
+                profiling.print_breakdown()
+        if self.profiling_output:
+            profiling.save_stats(self.profiling_output)
 
     @staticmethod
     def run_in_memory(game: games.Game) -> None:
-        while not game.finished:
-            game.cycle()
+        game.run_to_completion()
+
+
+class CapturingHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        record.msg, record.args = record.getMessage(), None
+        record.exc_info = None
+        self.records.append(record)
+
+
+CAPTURING_HANDLER: Optional[CapturingHandler] = None
+EVENT_CAPTURE: Optional[binary.EventCapture] = None
+
+# controllers as configured, every batch plays with fresh copies of them, so seeded results do not depend on workers
+WORKER_CONTROLLERS: list[controller.Controller] = []
+WORKER_DECISION_EXECUTOR: Optional[futures.Executor] = None
+
+
+def init_worker(
+        arena_names: list[str],
+        controllers: list[controller.Controller],
+        simultaneous_decisions: bool,
+        decision_threads: Optional[int],
+        levels: dict[str, int],
+        json_events: bool,
+        binary_events: bool,
+        timers: bool,
+) -> None:
+    global CAPTURING_HANDLER, EVENT_CAPTURE, WORKER_CONTROLLERS, WORKER_DECISION_EXECUTOR
+    WORKER_CONTROLLERS = controllers
+    if simultaneous_decisions:
+        WORKER_DECISION_EXECUTOR = futures.ThreadPoolExecutor(decision_threads, thread_name_prefix='decisions')
+    CAPTURING_HANDLER = CapturingHandler()
+    for name in CAPTURED_LOGGERS:
+        captured_logger = logging.getLogger(name)
+        captured_logger.propagate = False
+        captured_logger.handlers = [CAPTURING_HANDLER]
+        captured_logger.setLevel(levels[name])
+    logger_core.EVENT_BUS.clear()
+    if json_events:
+        logger_core.EVENT_BUS.subscribe(logger_core.log_json)
+    if binary_events:
+        EVENT_CAPTURE = binary.EventCapture()
+        logger_core.EVENT_BUS.subscribe(EVENT_CAPTURE)
+    if timers:
+        profiling.install_timers()
+    arenas.preload(arena_names)
+
+
+def play_batch(
+        batch: GameBatch,
+        controllers: Optional[list[controller.Controller]] = None,
+        decision_executor: Optional[futures.Executor] = None,
+) -> BatchResult:
+    if controllers is None:
+        controllers, decision_executor = WORKER_CONTROLLERS, WORKER_DECISION_EXECUTOR
+    controllers = copy.deepcopy(controllers)
+    watchdog = watchdogs.DecisionWatchdog(batch.decision_budget, batch.game_budget)
+    scores = []
+    game = None
+    try:
+        for game_no, seed in enumerate(batch.seeds, start=batch.first_game_no):
+            game_seed = int(seed.generate_state(1)[0])
+            random.seed(game_seed)
+            np.random.seed(game_seed)
+            verbose_logger.info(f"Starting game number {game_no + 1}.")
+            GameStartReport(game_no + 1).log(logging.INFO)
+            if game is None:
+                arena = random.choice(batch.arenas)
+                verbose_logger.debug(f"Randomly picked arena: {arena}.")
+                RandomArenaPickReport(arena).log(logging.DEBUG)
+                random.shuffle(controllers)
+                game = games.Game(
+                    game_no=game_no,
+                    arena_name=arena,
+                    to_spawn=controllers,
+                    watchdog=watchdog,
+                    decision_executor=decision_executor,
+                )
+            else:
+                controllers = controllers[1:] + [controllers[0]]
+                game = games.Game(
+                    game_no=game_no,
+                    arena_name=game.arena.name,
+                    to_spawn=controllers,
+                    menhir_position=game.arena.menhir_position,
+                    initial_champion_positions=game.initial_champion_positions,
+                    watchdog=watchdog,
+                    decision_executor=decision_executor,
+                )
+            game.run_to_completion()
+            scores.append(score_game(game))
+    finally:
+        watchdog.close()
+    records, events = [], []
+    if CAPTURING_HANDLER is not None:
+        records, CAPTURING_HANDLER.records = CAPTURING_HANDLER.records, []
+    if EVENT_CAPTURE is not None:
+        events, EVENT_CAPTURE.events = EVENT_CAPTURE.events, []
+    return BatchResult(scores, records, events, watchdog.latencies, profiling.take_stats(), profiling.take_breakdown())
+
+
+# noinspection PyBroadException
+def score_game(game: games.Game) -> dict[str, int]:
+    game_scores = {}
+    for dead_controller, score in game.score().items():
+        verbose_logger.info(f"Controller {dead_controller.name} scored {score} points.")
+        ControllerScoreReport(dead_controller.name, score).log(logging.INFO)
+        try:
+            dead_controller.praise(score)
+        except Exception as e:
+            verbose_logger.warning(f"Controller {dead_controller.name} throw an unexpected exception: {repr(e)}.")
+            controller.ControllerExceptionReport(dead_controller.name, repr(e)).log(logging.WARN)
+        game_scores[dead_controller.name] = score
+    return game_scores
 
 
 @dataclass(frozen=True)
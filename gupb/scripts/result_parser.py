@@ -1,13 +1,181 @@
+from __future__ import annotations
 import collections
+from dataclasses import dataclass, field
+import glob
 import json
+import multiprocessing
+import os
+from typing import Any, Iterator, Optional
+
+import click
+import numpy as np
+
+from gupb.logger import binary
+
+LOG_DIRECTORY = "../../results/together"
+DEFAULT_LOG_DIRECTORY = "results"
+LOG_PATTERNS: tuple[str, ...] = ('gupb__*.json', 'gupb__*.bin')
+
+DEATH_CAUSES: dict[str, str] = {
+    'ChampionDamagedByMistReport': 'mist',
+    'ChampionDamagedByWeaponCutReport': 'weapon cut',
+    'ChampionDamagedByFireReport': 'fire',
+    'IdlePenaltyReport': 'idle penalty',
+}
+SURVIVED: str = 'survived'
+UNKNOWN_CAUSE: str = 'unknown'
+
+Distribution = collections.Counter
+
+
+def log_path(log: str) -> str:
+    binary_path = f"{LOG_DIRECTORY}/{log}.bin"
+    return binary_path if os.path.exists(binary_path) else f"{LOG_DIRECTORY}/{log}.json"
+
+
+def read_log(path: str) -> Iterator[dict[str, Any]]:
+    """ Streams log entries, stopping quietly at a partially written tail of a log from a run still in progress. """
+    if path.endswith('.bin'):
+        yield from binary.read_entries(path)
+    else:
+        with open(path) as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+
+
+def distributions_to_dict(distributions: dict[Any, Distribution]) -> dict[str, dict[str, int]]:
+    return {
+        str(key): {str(value): count for value, count in sorted(distribution.items())}
+        for key, distribution in sorted(distributions.items(), key=lambda item: str(item[0]))
+    }
+
+
+def merge_distributions(into: dict[Any, Distribution], other: dict[Any, Distribution]) -> None:
+    for key, distribution in other.items():
+        into.setdefault(key, Distribution()).update(distribution)
+
+
+@dataclass
+class Aggregate:
+    """ Distributions of game outcomes, whose size does not depend on the number of games aggregated. """
+    games: int = 0
+    incomplete_games: int = 0
+    scores: dict[str, Distribution] = field(default_factory=dict)
+    arena_scores: dict[tuple[str, str], Distribution] = field(default_factory=dict)
+    position_scores: dict[tuple[int, str], Distribution] = field(default_factory=dict)
+    survival: dict[str, Distribution] = field(default_factory=dict)
+    death_causes: dict[str, Distribution] = field(default_factory=dict)
+
+    def add_game(self, game: GameRecord) -> None:
+        self.games += 1
+        for name, score in game.scores.items():
+            self.scores.setdefault(name, Distribution())[score] += 1
+            self.arena_scores.setdefault((game.arena, name), Distribution())[score] += 1
+            if name in game.positions:
+                self.position_scores.setdefault((game.positions[name], name), Distribution())[score] += 1
+            episode, cause = game.deaths[name] if name in game.deaths else (game.episode, SURVIVED)
+            self.survival.setdefault(name, Distribution())[episode] += 1
+            self.death_causes.setdefault(name, Distribution())[cause] += 1
+
+    def merge(self, other: Aggregate) -> None:
+        self.games += other.games
+        self.incomplete_games += other.incomplete_games
+        merge_distributions(self.scores, other.scores)
+        merge_distributions(self.arena_scores, other.arena_scores)
+        merge_distributions(self.position_scores, other.position_scores)
+        merge_distributions(self.survival, other.survival)
+        merge_distributions(self.death_causes, other.death_causes)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'games': self.games,
+            'incomplete_games': self.incomplete_games,
+            'scores': distributions_to_dict(self.scores),
+            'arena_scores': distributions_to_dict({f"{a}/{c}": d for (a, c), d in self.arena_scores.items()}),
+            'position_scores': distributions_to_dict({f"{p}/{c}": d for (p, c), d in self.position_scores.items()}),
+            'survival': distributions_to_dict(self.survival),
+            'death_causes': distributions_to_dict(self.death_causes),
+        }
+
+
+@dataclass
+class GameRecord:
+    arena: Optional[str]
+    episode: int = 0
+    positions: dict[str, int] = field(default_factory=dict)
+    last_damage: dict[str, str] = field(default_factory=dict)
+    deaths: dict[str, tuple[int, str]] = field(default_factory=dict)
+    scores: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return len(self.scores) > 0 and all(name in self.scores for name in self.positions)
+
+
+def aggregate_file(path: str, max_games_no: Optional[int] = None) -> Aggregate:
+    aggregate = Aggregate()
+    game: Optional[GameRecord] = None
+    arena: Optional[str] = None
+
+    def close_game() -> None:
+        if game is not None:
+            if game.complete:
+                aggregate.add_game(game)
+            else:
+                aggregate.incomplete_games += 1
+
+    for entry in read_log(path):
+        event_type, value = entry['type'], entry['value']
+        if event_type == 'GameStartReport':
+            close_game()
+            game = None
+            if max_games_no is not None and aggregate.games + aggregate.incomplete_games >= max_games_no:
+                break
+            game = GameRecord(arena)
+        elif game is None:
+            continue
+        elif event_type == 'RandomArenaPickReport':
+            arena = game.arena = value['arena_name']
+        elif event_type == 'ChampionSpawnedReport':
+            game.positions[value['controller_name']] = len(game.positions)
+        elif event_type == 'EpisodeStartReport':
+            game.episode = value['episode_number']
+        elif event_type in DEATH_CAUSES:
+            game.last_damage[value['controller_name']] = DEATH_CAUSES[event_type]
+        elif event_type == 'ChampionDeathReport':
+            name = value['controller_name']
+            game.deaths[name] = (game.episode, game.last_damage[name] if name in game.last_damage else UNKNOWN_CAUSE)
+        elif event_type == 'ControllerScoreReport':
+            game.scores[value['controller_name']] = value['score']
+    close_game()
+    return aggregate
+
+
+def aggregate_files(paths: list[str], workers: int = 1, max_games_no: Optional[int] = None) -> Aggregate:
+    aggregate = Aggregate()
+    if workers > 1 and len(paths) > 1:
+        with multiprocessing.Pool(min(workers, len(paths))) as pool:
+            for file_aggregate in pool.starmap(aggregate_file, [(path, max_games_no) for path in paths]):
+                aggregate.merge(file_aggregate)
+            pool.close()
+            pool.join()
+    else:
+        for path in paths:
+            aggregate.merge(aggregate_file(path, max_games_no))
+    return aggregate
 
 
 def aggregate_scores(log: str, max_games_no: int) -> dict[str, int]:
-    i = 0
-    scores = collections.defaultdict(int)
-    with open(f"../../results/together/{log}.json") as file:
-        for line in file.readlines():
-            data = json.loads(line)
+    path = log_path(log)
+    if path.endswith('.bin'):
+        scores = aggregate_binary_scores(path, max_games_no)
+    else:
+        i = 0
+        scores = collections.defaultdict(int)
+        for data in read_log(path):
             if data['type'] == 'GameStartReport':
                 i += 1
                 if i > max_games_no:
@@ -17,10 +185,90 @@ def aggregate_scores(log: str, max_games_no: int) -> dict[str, int]:
     return dict(sorted(scores.items(), key=lambda x: x[1]))
 
 
-def main() -> None:
-    result = aggregate_scores("gupb__2022_01_09_01_46_55", 365)
-    print(result)
+def aggregate_binary_scores(path: str, max_games_no: int) -> dict[str, int]:
+    tables = binary.NameTables.load(path)
+    records = binary.read_records(path)
+    type_ids = {event_type.name: i for i, event_type in enumerate(tables.types)}
+    if 'ControllerScoreReport' not in type_ids:
+        return {}
+    top_level = records['level'] & binary.CHILD_RECORD == 0
+    games_started = np.cumsum(top_level & (records['type'] == type_ids.get('GameStartReport', -1)))
+    scored = top_level & (records['type'] == type_ids['ControllerScoreReport']) & (games_started <= max_games_no)
+    name_ids, points = records['values'][scored, 0], records['values'][scored, 1]
+    totals = np.bincount(name_ids, weights=points, minlength=len(tables.names))
+    return {tables.names[i]: int(totals[i]) for i in np.unique(name_ids).tolist()}
+
+
+def expand_paths(log_paths: tuple[str, ...]) -> list[str]:
+    paths = []
+    for log_path_or_directory in log_paths:
+        if os.path.isdir(log_path_or_directory):
+            for pattern in LOG_PATTERNS:
+                paths.extend(sorted(glob.glob(os.path.join(log_path_or_directory, pattern))))
+        else:
+            paths.append(log_path_or_directory)
+    return paths
+
+
+def total_score(distribution: Distribution) -> int:
+    return sum(value * count for value, count in distribution.items())
+
+
+def quantile(distribution: Distribution, q: float) -> int:
+    rank, seen = q * sum(distribution.values()), 0
+    for value, count in sorted(distribution.items()):
+        seen += count
+        if seen >= rank:
+            return value
+    return max(distribution)
+
+
+def describe(distribution: Distribution) -> str:
+    total = sum(distribution.values())
+    if not total:
+        return "-"
+    mean = sum(value * count for value, count in distribution.items()) / total
+    sd = (sum((value - mean) ** 2 * count for value, count in distribution.items()) / total) ** 0.5
+    return (
+        f"mean {mean:7.2f}  sd {sd:6.2f}  min {min(distribution):4}  q1 {quantile(distribution, 0.25):4}  "
+        f"median {quantile(distribution, 0.5):4}  q3 {quantile(distribution, 0.75):4}  max {max(distribution):4}"
+    )
+
+
+def print_report(aggregate: Aggregate) -> None:
+    print(f"Games: {aggregate.games} complete, {aggregate.incomplete_games} incomplete.")
+    controllers = sorted(aggregate.scores, key=lambda name: -total_score(aggregate.scores[name]))
+    print("\nScores:")
+    for name in controllers:
+        print(f"  {name:30} total {total_score(aggregate.scores[name]):7}  {describe(aggregate.scores[name])}")
+    print("\nScores per arena:")
+    for arena_name, name in sorted(aggregate.arena_scores, key=lambda key: (str(key[0]), key[1])):
+        print(f"  {str(arena_name):20} {name:30} {describe(aggregate.arena_scores[(arena_name, name)])}")
+    print("\nScores per starting position:")
+    for position, name in sorted(aggregate.position_scores):
+        print(f"  {position:3} {name:30} {describe(aggregate.position_scores[(position, name)])}")
+    print("\nEpisodes survived:")
+    for name in controllers:
+        print(f"  {name:30} {describe(aggregate.survival[name])}")
+    print("\nDeath causes:")
+    for name in controllers:
+        causes = ', '.join(f"{cause}: {count}" for cause, count in aggregate.death_causes[name].most_common())
+        print(f"  {name:30} {causes}")
+
+
+@click.command()
+@click.argument('log_paths', nargs=-1, type=click.Path(exists=True))
+@click.option('-w', '--workers', default=os.cpu_count(), type=int, help="The number of processes reading log files.")
+@click.option('-n', '--max_games_no', default=None, type=int, help="The number of games to read from each log.")
+@click.option('-o', '--output', default=None, type=click.Path(), help="The path to write the distributions to.")
+def main(log_paths: tuple[str, ...], workers: int, max_games_no: Optional[int], output: Optional[str]) -> None:
+    paths = expand_paths(log_paths if log_paths else (DEFAULT_LOG_DIRECTORY,))
+    aggregate = aggregate_files(paths, workers, max_games_no)
+    print_report(aggregate)
+    if output:
+        with open(output, 'w') as file:
+            json.dump(aggregate.to_dict(), file, indent=2)
 
 
 if __name__ == '__main__':
-    main()
+    main(prog_name='python -m gupb.scripts.result_parser')
@@ -1,8 +1,9 @@
 from __future__ import annotations
 import os
 import itertools
-from typing import Any, Optional, TypeVar, Tuple
+from typing import Any, Iterator, Optional, TypeVar, Tuple
 
+import numpy as np
 import pygame
 import pygame.freetype
 
@@ -11,6 +12,7 @@ from gupb.model import characters
 from gupb.model import consumables
 from gupb.model import effects
 from gupb.model import games
+from gupb.model import grids
 from gupb.model import tiles
 from gupb.model import weapons
 
@@ -207,21 +209,23 @@ class Renderer:
         pygame.display.flip()
 
     def _render_arena(self, game: games.Game, background: pygame.Surface) -> None:
-        def render_character() -> None:
-            def prepare_heath_bar_rect(health: int) -> pygame.Rect:
+        def blit_destination(x: int, y: int) -> tuple[int, int]:
+            return x * self.sprite_repository.size[0], y * self.sprite_repository.size[1]
+
+        def render_health_bar(x: int, y: int, health: int) -> None:
+            def prepare_heath_bar_rect(bar_health: int) -> pygame.Rect:
                 return pygame.Rect(
-                    blit_destination[0],
-                    blit_destination[1] - HEALTH_BAR_HEIGHT - 1,
-                    health * HEALTH_BAR_UNIT_WIDTH,
+                    destination[0],
+                    destination[1] - HEALTH_BAR_HEIGHT - 1,
+                    bar_health * HEALTH_BAR_UNIT_WIDTH,
                     HEALTH_BAR_HEIGHT
                 )
 
-            character_sprite = self.sprite_repository.match_sprite(tile.character)
-            background.blit(character_sprite, blit_destination)
+            destination = blit_destination(x, y)
             pygame.draw.rect(
                 background,
                 HEALTH_BAR_OVERFILL_COLOR,
-                prepare_heath_bar_rect(tile.character.health)
+                prepare_heath_bar_rect(health)
             )
             pygame.draw.rect(
                 background,
@@ -231,34 +235,38 @@ class Renderer:
             pygame.draw.rect(
                 background,
                 HEALTH_BAR_FULL_COLOR,
-                prepare_heath_bar_rect(min(characters.CHAMPION_STARTING_HP, tile.character.health))
+                prepare_heath_bar_rect(min(characters.CHAMPION_STARTING_HP, health))
             )
 
-        for i, j in game.arena.terrain:
-            blit_destination = (i * self.sprite_repository.size[0], j * self.sprite_repository.size[1])
-            tile = game.arena.terrain[i, j]
-            tile_sprite = self.sprite_repository.match_sprite(tile)
-            background.blit(tile_sprite, blit_destination)
-            if tile.loot:
-                loot_sprite = self.sprite_repository.match_sprite(tile.loot)
-                background.blit(loot_sprite, blit_destination)
-            if tile.consumable:
-                consumable_sprite = self.sprite_repository.match_sprite(tile.consumable)
-                background.blit(consumable_sprite, blit_destination)
-            if tile.character:
-                render_character()
-            if tile.effects:
-                for effect in tile.effects:
-                    effect_sprite = self.sprite_repository.match_sprite(effect)
-                    background.blit(effect_sprite, blit_destination)
+        def occupied_cells(layer: np.ndarray) -> Iterator[tuple[int, int, Any]]:
+            xs, ys = np.nonzero(layer)
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                yield x, y, layer[x, y]
+
+        terrain = game.arena.terrain
+        for code in np.unique(terrain.types[terrain.present]).tolist():
+            tile_sprite = self.sprite_repository.sprites[grids.TILE_TYPES[code]]
+            xs, ys = np.nonzero(terrain.types == code)
+            background.blits([(tile_sprite, blit_destination(x, y)) for x, y in zip(xs.tolist(), ys.tolist())], False)
+        for layer in (terrain.loot, terrain.consumables, terrain.characters):
+            for x, y, element in occupied_cells(layer):
+                background.blit(self.sprite_repository.match_sprite(element), blit_destination(x, y))
+        for x, y, tile_effects in occupied_cells(terrain.effects):
+            for effect in tile_effects:
+                background.blit(self.sprite_repository.match_sprite(effect), blit_destination(x, y))
+        for x, y, character in occupied_cells(terrain.characters):
+            render_health_bar(x, y, character.health)
 
     def _render_sight(self, game: games.Game, show_sight: characters.Champion, background: pygame.Surface) -> None:
         if show_sight in game.champions:
             darken_percent = 0.5
             dark = pygame.Surface(self.sprite_repository.size, pygame.SRCALPHA)
             dark.fill((0, 0, 0, int(darken_percent * 255)))
-            visible = game.arena.visible_coords(show_sight)
-            for i, j in game.arena.terrain:
-                if (i, j) not in visible:
-                    blit_destination = (i * self.sprite_repository.size[0], j * self.sprite_repository.size[1])
-                    background.blit(dark, blit_destination)
+            hidden = game.arena.terrain.present.copy()
+            for x, y in game.arena.visible_coords(show_sight):
+                if (x, y) in game.arena.terrain:
+                    hidden[x, y] = False
+            xs, ys = np.nonzero(hidden)
+            for i, j in zip(xs.tolist(), ys.tolist()):
+                blit_destination = (i * self.sprite_repository.size[0], j * self.sprite_repository.size[1])
+                background.blit(dark, blit_destination)
@@ -0,0 +1,25 @@
+import pathlib
+
+import pytest
+
+from gupb.logger import core as logger_core
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(autouse=True)
+def in_repository_root(monkeypatch: pytest.MonkeyPatch) -> None:
+    # arenas are read from `resources/arenas` relative to the working directory
+    monkeypatch.chdir(ROOT)
+
+
+def arena_names() -> list[str]:
+    return sorted(path.stem for path in (ROOT / 'resources' / 'arenas').glob('*.gupb'))
+
+
+class ReportRecorder:
+    def __init__(self) -> None:
+        self.reports: list[tuple[int, str, dict]] = []
+
+    def __call__(self, report: logger_core.LoggingMixin, level: int) -> None:
+        self.reports.append((level, report.__class__.__name__, report.to_dict()))
@@ -0,0 +1,70 @@
+from concurrent import futures
+import pathlib
+
+import pytest
+
+from gupb.controller import random as random_controller
+from gupb.model import games
+from gupb.model import arenas
+from gupb.model import coordinates
+from gupb.model import encoders
+from gupb.model import weapons
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def cache(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path) -> pathlib.Path:
+    monkeypatch.setenv(arenas.CACHE_DIRECTORY_VARIABLE, tmp_path.as_posix())
+    return tmp_path
+
+
+def test_compiled_arenas_are_written_to_the_cache(cache: pathlib.Path) -> None:
+    resources = sorted((ROOT / 'resources' / 'arenas').iterdir())
+    compiled = arenas.load_compiled('mini')
+    assert sorted((ROOT / 'resources' / 'arenas').iterdir()) == resources
+    assert pathlib.Path(arenas.compiled_arena_path('mini')).is_relative_to(cache)
+    assert (arenas.load_compiled('mini') == compiled).all()
+    assert (arenas.compile_source(arenas.read_arena_source('mini')) == compiled).all()
+
+
+def test_unwritable_cache_compiles_in_memory(cache: pathlib.Path) -> None:
+    (cache / 'arenas').write_text('not a directory')
+    compiled = arenas.load_compiled('mini')
+    assert (arenas.compile_source(arenas.read_arena_source('mini')) == compiled).all()
+
+
+def test_concurrent_writers_never_mix_their_files(tmp_path: pathlib.Path) -> None:
+    path = (tmp_path / 'mini.gupbc').as_posix()
+    contents = [bytes([writer]) * 100_000 for writer in range(8)]
+
+    def write(content: bytes) -> None:
+        for _ in range(20):
+            arenas.write_atomically(path, content)
+
+    with futures.ThreadPoolExecutor(len(contents)) as executor:
+        for pending in [executor.submit(write, content) for content in contents]:
+            pending.result()
+    assert pathlib.Path(path).read_bytes() in contents
+    assert [file.name for file in tmp_path.iterdir()] == ['mini.gupbc']
+
+
+def test_invalidated_arenas_drop_their_templates_and_encoders() -> None:
+    template = arenas.template('mini')
+    encoder = encoders.KnowledgeEncoder.for_arena('mini')
+    arenas.invalidate(['mini'])
+    assert arenas.template('mini') is not template
+    assert encoders.KnowledgeEncoder.for_arena('mini') is not encoder
+
+
+@pytest.mark.parametrize('weapon', [weapons.Knife, weapons.Amulet])
+def test_visible_cells_are_keyed_by_coords(weapon: type) -> None:
+    game = games.Game(0, 'mini', [random_controller.RandomController(name) for name in 'AB'])
+    champion = game.champions[0]
+    champion.weapon = weapon()
+    step = coordinates.Coords(1, 0)
+    visible_tiles = champion.knowledge().visible_tiles
+    for cells in (visible_tiles.keys(), game.arena.visible_coords(champion)):
+        assert all(type(coords) is coordinates.Coords for coords in cells)
+        assert all((coords + step).x == coords.x + 1 for coords in cells)
+    assert champion.position in visible_tiles
@@ -0,0 +1,28 @@
+import threading
+
+from gupb.model import coordinates
+
+
+def test_interned_coordinates_stay_correct_while_the_table_grows() -> None:
+    first = coordinates.interned(1, 2)
+    stop = threading.Event()
+    wrong = []
+
+    def read() -> None:
+        while not stop.is_set():
+            for x, y in ((0, 0), (3, 1), (1, 7), (30, 20)):
+                added = coordinates.Coords(x, 0) + coordinates.Coords(0, y)
+                if coordinates.interned(x, y) != (x, y) or added != (x, y):
+                    wrong.append((x, y))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for extent in range(8, coordinates.MAX_INTERNED_EXTENT + 1, 8):
+            coordinates.reserve((extent, extent))
+    finally:
+        stop.set()
+        reader.join()
+    assert not wrong
+    assert coordinates.interned(1, 2) == first
+    assert coordinates.interned(1, 2) is coordinates.Coords(1, 0) + coordinates.Coords(0, 2)
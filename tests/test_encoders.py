@@ -0,0 +1,15 @@
+import pytest
+
+from gupb.model import games  # noqa: F401, imported before characters to resolve their circular import
+from gupb.model import characters
+from gupb.model import encoders
+from gupb.model import tiles
+from gupb.model import weapons
+
+
+@pytest.mark.parametrize('health', [-1, 0, 4, characters.CHAMPION_STARTING_HP, 13])
+def test_health_stays_within_observation_space(health: int) -> None:
+    champion = characters.ChampionDescription('A', health, weapons.WeaponDescription('knife'), characters.Facing.UP)
+    features = encoders.tile_features(tiles.TileDescription('land', None, champion, None, ()))
+    assert 0.0 <= features[encoders.CHANNEL_INDEX['health']] <= 1.0
+    assert features.min() >= 0.0 and features.max() <= 1.0
@@ -0,0 +1,177 @@
+from concurrent import futures
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from gupb.controller import random as random_controller
+from gupb.model import arenas
+from gupb.model import characters
+from gupb.logger import core as logger_core
+from gupb.model import games
+
+from conftest import ReportRecorder, arena_names
+
+
+class JitteryController(random_controller.RandomController):
+    def decide(self, knowledge: characters.ChampionKnowledge) -> characters.Action:
+        # decisions finish in an order varying with their random durations
+        time.sleep(random.random() / 1000)
+        return super().decide(knowledge)
+
+
+def play(arena_name: str, seed: int, headless: bool) -> tuple[dict[str, int], list[tuple[int, str, dict]]]:
+    random.seed(seed)
+    np.random.seed(seed)
+    recorder = ReportRecorder()
+    logger_core.EVENT_BUS.subscribe(recorder)
+    try:
+        game = games.Game(0, arena_name, [random_controller.RandomController(name) for name in 'ABCD'])
+        if headless:
+            game.run_to_completion()
+        else:
+            while not game.finished:
+                game.cycle()
+    finally:
+        logger_core.EVENT_BUS.unsubscribe(recorder)
+    return {dead_controller.name: score for dead_controller, score in game.score().items()}, recorder.reports
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('arena_name', arena_names())
+def test_headless_loop_matches_state_machine(arena_name: str, seed: int) -> None:
+    scores, reports = play(arena_name, seed, headless=False)
+    headless_scores, headless_reports = play(arena_name, seed, headless=True)
+    assert headless_scores == scores
+    assert headless_reports == reports
+    assert reports
+
+
+def play_simultaneously(seed: int, decision_threads: int) -> tuple[dict[str, int], list[tuple[int, str, dict]]]:
+    random.seed(seed)
+    np.random.seed(seed)
+    recorder = ReportRecorder()
+    logger_core.EVENT_BUS.subscribe(recorder)
+    try:
+        with futures.ThreadPoolExecutor(decision_threads) as decision_executor:
+            game = games.Game(
+                0,
+                'mini',
+                [JitteryController(name) for name in 'ABCD'],
+                decision_executor=decision_executor,
+            )
+            game.run_to_completion()
+    finally:
+        logger_core.EVENT_BUS.unsubscribe(recorder)
+    return {dead_controller.name: score for dead_controller, score in game.score().items()}, recorder.reports
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_simultaneous_decisions_do_not_depend_on_threads(seed: int) -> None:
+    scores, reports = play_simultaneously(seed, decision_threads=1)
+    threaded_scores, threaded_reports = play_simultaneously(seed, decision_threads=4)
+    assert threaded_scores == scores
+    assert threaded_reports == reports
+
+
+def test_simultaneous_decisions_leave_global_generators_alone() -> None:
+    functions = {module: dict(vars(module)) for module in (random, np.random)}
+    play_simultaneously(0, decision_threads=4)
+    for module, originals in functions.items():
+        assert all(vars(module)[name] is function for name, function in originals.items())
+
+
+def play_recorded(game: games.Game, seed: int) -> tuple[dict[str, int], list[tuple[int, str, dict]]]:
+    random.seed(seed)
+    recorder = ReportRecorder()
+    logger_core.EVENT_BUS.subscribe(recorder)
+    try:
+        game.run_to_completion()
+    finally:
+        logger_core.EVENT_BUS.unsubscribe(recorder)
+    return {dead_controller.name: score for dead_controller, score in game.score().items()}, recorder.reports
+
+
+def started_game(seed: int, cycles: int = 40) -> games.Game:
+    random.seed(seed)
+    game = games.Game(0, 'ordinary_chaos', [random_controller.RandomController(name) for name in 'ABCD'])
+    for _ in range(cycles):
+        game.cycle()
+    return game
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_restored_game_replays_the_same_rest(seed: int) -> None:
+    game = started_game(seed)
+    snapshot = game.snapshot()
+    scores, reports = play_recorded(game, seed)
+    game.restore(snapshot)
+    assert not game.finished
+    restored_scores, restored_reports = play_recorded(game, seed)
+    assert restored_scores == scores
+    assert restored_reports == reports
+    assert reports
+
+
+def test_forked_game_is_muted_and_independent() -> None:
+    game = started_game(0)
+    positions = [champion.position for champion in game.champions]
+    forked = game.fork({name: lambda knowledge: characters.Action.STEP_FORWARD for name in 'ABCD'})
+    recorder = ReportRecorder()
+    logger_core.EVENT_BUS.subscribe(recorder)
+    try:
+        forked.run_to_completion()
+    finally:
+        logger_core.EVENT_BUS.unsubscribe(recorder)
+    assert forked.finished and not game.finished
+    assert recorder.reports == []
+    assert [champion.position for champion in game.champions] == positions
+
+
+def test_muting_on_another_thread_does_not_silence_the_game() -> None:
+    scores, reports = play_recorded(started_game(0), 1)
+    game = started_game(0)
+    muting, release = threading.Event(), threading.Event()
+
+    def hold_muted() -> None:
+        with game.fork()._logging():
+            muting.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_muted)
+    thread.start()
+    try:
+        muting.wait()
+        muted_scores, muted_reports = play_recorded(game, 1)
+    finally:
+        release.set()
+        thread.join()
+    assert muted_scores == scores
+    assert muted_reports == reports
+
+
+def test_reports_nobody_handles_are_not_built(monkeypatch: pytest.MonkeyPatch) -> None:
+    built = []
+    for module, name in (
+            (characters, 'ChampionPickedActionReport'),
+            (characters, 'ChampionFacingReport'),
+            (characters, 'ChampionAttackReport'),
+            (characters, 'ChampionWoundsReport'),
+            (arenas, 'ChampionEnteredTileReport'),
+    ):
+        def counting_init(self, *args, report_type=getattr(module, name)) -> None:
+            built.append(report_type.__name__)
+            report_type.__init__(self, *args)
+
+        monkeypatch.setattr(module, name, type(name, (getattr(module, name),), {'__init__': counting_init}))
+    monkeypatch.setattr(logger_core, 'EVENT_BUS', logger_core.EventBus())
+    recorder = ReportRecorder()
+    logger_core.EVENT_BUS.subscribe(recorder, games.EpisodeStartReport)
+    started_game(0, cycles=0).run_to_completion()
+    assert built == []
+    assert recorder.reports
+    logger_core.EVENT_BUS.subscribe(recorder)
+    started_game(0, cycles=0).run_to_completion()
+    assert len(built) > 0
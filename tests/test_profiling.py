@@ -0,0 +1,60 @@
+from concurrent import futures
+import time
+
+from gupb.controller import random as random_controller
+from gupb.model import games
+from gupb.model import characters
+from gupb.model import profiling
+
+THREADS = 8
+CALLS = 2000
+
+
+def test_timings_from_many_threads_are_all_recorded() -> None:
+    profiling.take_stats()
+    profiling.take_breakdown()
+
+    @profiling.profile(name='profiled')
+    def profiled() -> None:
+        pass
+
+    timed = profiling.timer(lambda: None, 'timed', profiling.ENGINE)
+
+    def work() -> None:
+        for _ in range(CALLS):
+            profiled()
+            timed()
+
+    with futures.ThreadPoolExecutor(THREADS) as executor:
+        for pending in [executor.submit(work) for _ in range(THREADS)]:
+            pending.result()
+    stats = profiling.take_stats()
+    breakdown = profiling.take_breakdown()
+    assert stats['profiled']['overall']['count'] == THREADS * CALLS
+    assert stats['timed']['overall']['count'] == THREADS * CALLS
+    assert sum(stats['timed']['overall']['buckets'].values()) == THREADS * CALLS
+    assert breakdown[profiling.CURRENT_GAME][profiling.ENGINE] == stats['timed']['overall']['total_ns']
+
+
+class SleepyController(random_controller.RandomController):
+    def decide(self, knowledge: characters.ChampionKnowledge) -> characters.Action:
+        time.sleep(0.002)
+        return super().decide(knowledge)
+
+
+def test_breakdown_of_simultaneous_decisions_adds_up_to_game_time() -> None:
+    profiling.take_stats()
+    profiling.take_breakdown()
+    profiling.install_timers()
+    try:
+        with futures.ThreadPoolExecutor(4) as decision_executor:
+            start_time = time.perf_counter_ns()
+            game = games.Game(0, 'mini', [SleepyController(name) for name in 'ABCD'], decision_executor=decision_executor)
+            game.run_to_completion()
+            elapsed_time = time.perf_counter_ns() - start_time
+    finally:
+        profiling.uninstall_timers()
+    stats = profiling.take_stats()
+    breakdown = profiling.take_breakdown()[0]
+    assert sum(breakdown.values()) <= elapsed_time
+    assert breakdown[profiling.CONTROLLERS] < stats['Controller.decide']['overall']['total_ns']
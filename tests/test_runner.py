@@ -0,0 +1,129 @@
+import collections
+import json
+import pathlib
+import random
+
+import numpy as np
+import pytest
+
+from gupb import runner
+from gupb.controller import random as random_controller
+from gupb.logger import core as logger_core
+from gupb.logger import index
+from gupb.model import characters
+from gupb.scripts import result_parser
+
+from conftest import ReportRecorder
+
+ARENAS = ['mini', 'ordinary_chaos', 'isolated_shrine']
+CONTROLLER_NAMES = 'ABC'
+RUNS_NO = 12
+
+PRAISES: list[tuple[str, int]] = []
+
+
+class LearningController(random_controller.RandomController):
+    """ Plays differently depending on the decisions it made and the points it was praised with so far. """
+
+    def __init__(self, first_name: str) -> None:
+        super().__init__(first_name)
+        self.decisions: int = 0
+        self.points: int = 0
+
+    def decide(self, knowledge: characters.ChampionKnowledge) -> characters.Action:
+        self.decisions += 1
+        if (self.decisions + self.points) % 3 == 0:
+            return characters.Action.STEP_FORWARD
+        return super().decide(knowledge)
+
+    def praise(self, score: int) -> None:
+        self.points += score
+        PRAISES.append((self.name, score))
+
+
+def run_balanced(monkeypatch: pytest.MonkeyPatch) -> tuple[list[str], list[tuple[int, str, dict]]]:
+    played = []
+
+    class RecordingGame(runner.games.Game):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            played.append(self.arena.name)
+
+    monkeypatch.setattr(runner.games, 'Game', RecordingGame)
+    random.seed(0)
+    recorder = ReportRecorder()
+    logger_core.EVENT_BUS.subscribe(recorder)
+    try:
+        runner.Runner({
+            'arenas': ARENAS,
+            'controllers': [random_controller.RandomController(name) for name in CONTROLLER_NAMES],
+            'start_balancing': True,
+            'visualise': False,
+            'runs_no': RUNS_NO,
+        }).run()
+    finally:
+        logger_core.EVENT_BUS.unsubscribe(recorder)
+    return played, recorder.reports
+
+
+def write_log(reports: list[tuple[int, str, dict]], log_path: pathlib.Path) -> str:
+    with open(log_path, 'w') as file:
+        for _, event_type, value in reports:
+            file.write(json.dumps({'type': event_type, 'value': value}) + '\n')
+    return log_path.as_posix()
+
+
+def test_arena_is_picked_once_per_rotation(monkeypatch: pytest.MonkeyPatch) -> None:
+    played, reports = run_balanced(monkeypatch)
+    picked = [value['arena_name'] for _, event_type, value in reports if event_type == 'RandomArenaPickReport']
+    assert picked == played[::len(CONTROLLER_NAMES)]
+    assert len(played) == RUNS_NO
+
+
+def test_result_parser_attributes_games_to_played_arenas(
+        monkeypatch: pytest.MonkeyPatch,
+        tmp_path: pathlib.Path,
+) -> None:
+    played, reports = run_balanced(monkeypatch)
+    aggregate = result_parser.aggregate_file(write_log(reports, tmp_path / 'gupb__test.json'))
+    games_per_arena = {
+        arena: sum(distribution.values())
+        for (arena, name), distribution in aggregate.arena_scores.items()
+        if name == f'RandomController{CONTROLLER_NAMES[0]}'
+    }
+    assert aggregate.games == RUNS_NO
+    assert games_per_arena == collections.Counter(played)
+
+
+def test_log_index_attributes_games_to_played_arenas(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path) -> None:
+    played, reports = run_balanced(monkeypatch)
+    entries = index.load_index(write_log(reports, tmp_path / 'gupb__test.json'))
+    assert [entry.arena for entry in entries] == played
+
+
+@pytest.mark.parametrize('start_balancing', [False, True])
+def test_seeded_results_do_not_depend_on_workers(start_balancing: bool) -> None:
+    scores = []
+    for workers in (1, 2, 3):
+        seeded_runner = runner.Runner({
+            'arenas': ARENAS,
+            'controllers': [LearningController(name) for name in CONTROLLER_NAMES],
+            'start_balancing': start_balancing,
+            'visualise': False,
+            'runs_no': RUNS_NO,
+            'workers': workers,
+            'seed': 7,
+        })
+        seeded_runner.run()
+        scores.append(dict(seeded_runner.scores))
+    assert scores[1] == scores[0]
+    assert scores[2] == scores[0]
+
+
+def test_controllers_that_played_are_praised_after_every_game() -> None:
+    PRAISES.clear()
+    controllers = [LearningController(name) for name in CONTROLLER_NAMES]
+    batch = runner.GameBatch(0, ARENAS, np.random.SeedSequence(7).spawn(len(controllers)), None, None)
+    result = runner.play_batch(batch, controllers)
+    assert PRAISES == [(name, score) for game_scores in result.scores for name, score in game_scores.items()]
+    assert all(c.points == 0 and c.decisions == 0 for c in controllers)
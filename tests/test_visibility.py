@@ -0,0 +1,108 @@
+import functools
+import random
+
+import bresenham
+import numpy as np
+import pytest
+
+# games go first, as characters cannot be imported before the controller protocol they depend on
+from gupb.model import games  # noqa: F401
+from gupb.model import arenas
+from gupb.model import characters
+from gupb.model import coordinates
+from gupb.model import visibility
+
+from conftest import arena_names
+
+SAMPLED_POSITIONS = 100
+OCCUPIED_TRIALS = 40
+BLOCKERS = 8
+
+
+@functools.lru_cache(maxsize=None)
+def ray(dx: int, dy: int) -> tuple[tuple[int, int], ...]:
+    # rays cast by `bresenham` do not depend on their origin, so they are traced once per offset
+    return tuple(bresenham.bresenham(0, 0, dx, dy))[1:]
+
+
+def ray_cast_coords(
+        arena: arenas.Arena,
+        champion: characters.Champion,
+        present: list[list[bool]],
+        transparent: list[list[bool]],
+) -> set[tuple[int, int]]:
+    """ Field of view cast ray by ray with `bresenham`, as before it was memoized, through the given transparency. """
+    position, facing, size = champion.position, champion.facing, arena.size
+    if facing == characters.Facing.UP:
+        border, distance = (position.x, 0), position.y
+    elif facing == characters.Facing.RIGHT:
+        border, distance = (size[0] - 1, position.y), size[0] - position.x
+    elif facing == characters.Facing.DOWN:
+        border, distance = (position.x, size[1] - 1), size[1] - position.y
+    else:
+        border, distance = (0, position.y), position.x
+    left = facing.turn_left().value
+    visible = {tuple(position)}
+    for i in range(-distance, distance + 1):
+        target_x, target_y = border[0] + i * left.x, border[1] + i * left.y
+        for dx, dy in ray(target_x - position.x, target_y - position.y):
+            x, y = position.x + dx, position.y + dy
+            if not (0 <= x < size[0] and 0 <= y < size[1] and present[x][y]):
+                break
+            visible.add((x, y))
+            if not transparent[x][y]:
+                break
+    if facing == characters.Facing.UP or facing == characters.Facing.DOWN:
+        visible.update({(position.x + 1, position.y), (position.x - 1, position.y)})
+    else:
+        visible.update({(position.x, position.y + 1), (position.x, position.y - 1)})
+    return visible
+
+
+def passable_cells(arena: arenas.Arena) -> list[coordinates.Coords]:
+    xs, ys = np.nonzero(arena.terrain.terrain_passable)
+    return [coordinates.Coords(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+
+
+def sample(rng: random.Random, cells: list[coordinates.Coords], count: int) -> list[coordinates.Coords]:
+    # casting every ray of every cell of the largest arenas takes minutes, a seeded sample keeps failures reproducible
+    return rng.sample(cells, min(count, len(cells)))
+
+
+@pytest.mark.parametrize('arena_name', arena_names())
+def test_memoized_fields_of_view_match_ray_casting(arena_name: str) -> None:
+    arena = arenas.Arena.load(arena_name)
+    arena.visibility = visibility.VisibilityCache(arena.terrain)
+    present, transparent = arena.terrain.present.tolist(), arena.terrain.transparent.tolist()
+    queries = 0
+    for position in sample(random.Random(arena_name), passable_cells(arena), SAMPLED_POSITIONS):
+        champion = characters.Champion(position, arena)
+        for facing in characters.Facing:
+            champion.facing = facing
+            expected = ray_cast_coords(arena, champion, present, transparent)
+            assert arena.visible_coords(champion) == expected, (champion.position, facing)
+            assert arena.visible_coords(champion) == expected, (champion.position, facing)
+            queries += 1
+    assert arena.visibility.misses == queries
+    assert arena.visibility.hits == queries
+
+
+@pytest.mark.parametrize('arena_name', arena_names())
+def test_champions_block_memoized_fields_of_view(arena_name: str) -> None:
+    rng = random.Random(arena_name)
+    corrected = 0
+    for _ in range(OCCUPIED_TRIALS):
+        arena = arenas.Arena.load(arena_name)
+        cells = sample(rng, passable_cells(arena), BLOCKERS + 1)
+        champion = arena.spawn_champion_at(cells[0])
+        for cell in cells[1:]:
+            arena.spawn_champion_at(cell)
+        present = arena.terrain.present.tolist()
+        transparent = arena.terrain.transparent.tolist()
+        terrain_transparent = arena.terrain.terrain_transparent.tolist()
+        for facing in characters.Facing:
+            champion.facing = facing
+            expected = ray_cast_coords(arena, champion, present, transparent)
+            assert arena.visible_coords(champion) == expected, (cells, facing)
+            corrected += expected != ray_cast_coords(arena, champion, present, terrain_transparent)
+    assert corrected > 0
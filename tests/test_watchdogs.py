@@ -0,0 +1,41 @@
+import threading
+import time
+
+from gupb import runner
+from gupb.controller import random as random_controller
+from gupb.model import characters
+from gupb.model import watchdogs
+
+
+def decision_threads() -> set[threading.Thread]:
+    return {thread for thread in threading.enumerate() if thread.name.startswith('decisions-')}
+
+
+class SlowController(random_controller.RandomController):
+    def decide(self, knowledge: characters.ChampionKnowledge) -> characters.Action:
+        time.sleep(0.2)
+        return super().decide(knowledge)
+
+
+def test_budgeted_batches_leave_no_decision_threads() -> None:
+    before = decision_threads()
+    runner.Runner({
+        'arenas': ['mini'],
+        'controllers': [random_controller.RandomController(name) for name in 'ABC'],
+        'start_balancing': False,
+        'visualise': False,
+        'runs_no': 12,
+        'seed': 3,
+        'decision_budget': 1.0,
+    }).run()
+    assert decision_threads() == before
+
+
+def test_closing_lets_a_running_decision_finish() -> None:
+    before = decision_threads()
+    watchdog = watchdogs.DecisionWatchdog(decision_budget=0.01)
+    assert watchdog.decide(SlowController('A'), None) == characters.Action.DO_NOTHING
+    [thread] = decision_threads() - before
+    watchdog.close()
+    thread.join(timeout=5.0)
+    assert not thread.is_alive()